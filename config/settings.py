@@ -97,6 +97,17 @@ DATABASES = {
     )
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Several circulation desks and kiosks write at once. WAL lets readers
+    # carry on during a write; IMMEDIATE takes the write lock when a
+    # transaction starts, so writers queue for up to `timeout` seconds
+    # instead of failing with "database is locked" halfway through.
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -157,6 +168,49 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Background report jobs
+# Worker processes that generate report files (0 = generate inline, e.g. in tests)
+REPORT_JOB_WORKERS = int(os.environ.get('REPORT_JOB_WORKERS', 2))
+REPORT_ARTIFACT_DIR = Path(os.environ.get('REPORT_ARTIFACT_DIR', BASE_DIR / 'report_artifacts'))
+# A finished report is reused for identical filters for this many seconds
+# unless the underlying tables change first
+REPORT_JOB_MAX_AGE = int(os.environ.get('REPORT_JOB_MAX_AGE', 15 * 60))
+# A job not finished after this many seconds is given up on (its worker died)
+REPORT_JOB_TIMEOUT = int(os.environ.get('REPORT_JOB_TIMEOUT', 10 * 60))
+
+# Books per page on the public search page
+BOOK_SEARCH_PAGE_SIZE = int(os.environ.get('BOOK_SEARCH_PAGE_SIZE', 50))
+# Seconds a cached search results page is kept. Writes to the catalogue make
+# cached pages stale immediately; this only bounds how long unused ones linger.
+BOOK_SEARCH_CACHE_TTL = int(os.environ.get('BOOK_SEARCH_CACHE_TTL', 10 * 60))
+
+# Typeahead (/api/books/suggest/): memory budget of the in-process prefix
+# index, and how many changed books it collects before rebuilding itself
+SUGGEST_INDEX_MAX_MB = int(os.environ.get('SUGGEST_INDEX_MAX_MB', 64))
+SUGGEST_DELTA_MAX = int(os.environ.get('SUGGEST_DELTA_MAX', 1000))
+
+# Renewal requests approved by the scheduler without staff (renewal_rules.py),
+# unless the loan is overdue, the student has another overdue book, or the
+# loan has been renewed this many times already
+RENEWAL_AUTO_APPROVE = os.environ.get('RENEWAL_AUTO_APPROVE', 'True').lower() == 'true'
+RENEWAL_AUTO_APPROVE_MAX_RENEWALS = int(os.environ.get('RENEWAL_AUTO_APPROVE_MAX_RENEWALS', 2))
+
+# Kiosk scan API (/api/kiosk/scan/): the device tokens a kiosk may send in
+# its X-Kiosk-Token header (comma-separated; none set means no kiosk is
+# let in), and how many seconds old a buffered scan may be when it arrives
+KIOSK_API_TOKENS = [token.strip() for token in os.environ.get('KIOSK_API_TOKENS', '').split(',') if token.strip()]
+KIOSK_OFFLINE_WINDOW = int(os.environ.get('KIOSK_OFFLINE_WINDOW', 24 * 60 * 60))
+
+# Live dashboard feed (Server-Sent Events). Every open stream occupies one
+# of waitress's 8 threads, so keep this well below the thread count.
+LIVE_FEED_MAX_STREAMS = int(os.environ.get('LIVE_FEED_MAX_STREAMS', 4))
+# A stream is closed after this many seconds and the browser reconnects
+LIVE_FEED_STREAM_SECONDS = int(os.environ.get('LIVE_FEED_STREAM_SECONDS', 5 * 60))
+
+# Conditional (partial) indexes and unique constraints aren't supported by
+# MySQL; migration 0013 emulates them there with generated columns.
+SILENCED_SYSTEM_CHECKS = ['models.W036', 'models.W037']
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -170,6 +224,11 @@ EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True').lower() == 'true'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+# Seconds before a stalled SMTP server is given up on (Django waits forever by default)
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 30))
+# Reminder emails sent over one SMTP connection before it is reopened;
+# Gmail allows about 100 messages per session
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 50))
 
 # Security headers
 SECURE_BROWSER_XSS_FILTER = True
@@ -186,6 +245,14 @@ CSRF_TRUSTED_ORIGINS = [
 # Session security
 SESSION_COOKIE_HTTPONLY = True
 
+# Sessions are only needed for admin logins. They are served from the cache
+# and written through to django_session, so most requests skip the table.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+# Flash messages on the public pages (kiosk, renew, issue) travel in a signed
+# cookie only, so an anonymous scan never creates a django_session row.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -1,25 +1,18 @@
 from django.contrib import admin
 from django.contrib.auth.models import User, Group
 from .models import Student, Book, LibraryLog, Transaction
-from django.utils import timezone
-from datetime import timedelta
+from .stats import get_stats
+from .isbn import normalize_isbn
+from . import circulation
+from django.db import transaction as db_transaction
 
 
 # ── Inject live stats into the admin index context ──────────────
 _original_index = admin.AdminSite.index
 
 def _index_with_stats(self, request, extra_context=None):
-    from .models import Student, Book, LibraryLog, Transaction, RenewRequest
     extra_context = extra_context or {}
-    extra_context['stats'] = {
-        'total_students':   Student.objects.count(),
-        'total_books':      Book.objects.count(),
-        'books_available':  Book.objects.filter(status='Available').count(),
-        'books_issued':     Book.objects.filter(status='Issued').count(),
-        'inside_now':       LibraryLog.objects.filter(exit_time__isnull=True).count(),
-        'overdue':          Transaction.objects.filter(returned=False, due_date__lt=timezone.now()).count(),
-        'pending_renewals': RenewRequest.objects.filter(status='Pending').count(),
-    }
+    extra_context['stats'] = get_stats()
     return _original_index(self, request, extra_context=extra_context)
 
 admin.AdminSite.index = _index_with_stats
@@ -46,8 +39,17 @@ class BookAdmin(admin.ModelAdmin):
     list_display = ('access_code', 'title', 'isbn_no', 'author', 'edition', 'allocated_department', 'status', 'current_holder')
     list_filter = ('status', 'allocated_department', 'shelf_location')
     search_fields = ('access_code', 'title', 'author', 'isbn_no')
+    # Follow the book's open loan; changed through Transactions only
+    readonly_fields = ('status', 'current_holder')
     list_per_page = 25
 
+    def get_search_results(self, request, queryset, search_term):
+        # An ISBN in any spelling is one exact match on the indexed isbn13
+        isbn13 = normalize_isbn(search_term)
+        if isbn13:
+            return queryset.filter(isbn13=isbn13), False
+        return super().get_search_results(request, queryset, search_term)
+
 
 # ── Library Log Admin ───────────────────────────────────────
 @admin.register(LibraryLog)
@@ -87,45 +89,61 @@ class TransactionAdmin(admin.ModelAdmin):
 
     def get_changeform_initial_data(self, request):
         """Pre-fill due_date with 15 days from now."""
-        from django.utils import timezone
-        from datetime import timedelta
         initial = super().get_changeform_initial_data(request)
-        initial['due_date'] = timezone.now() + timedelta(days=15)
+        initial['due_date'] = circulation.default_due_date()
         return initial
 
     @admin.display(boolean=True, description='Overdue')
     def is_overdue_display(self, obj):
         return obj.is_overdue
 
+    # Direct edits of loans: bring the books' status along in the same transaction
+    def save_model(self, request, obj, form, change):
+        books = {obj.book_id, form.initial.get('book')} - {None}
+        with db_transaction.atomic():
+            super().save_model(request, obj, form, change)
+            circulation.sync_books(Book.objects.filter(pk__in=books))
+
+    def delete_model(self, request, obj):
+        with db_transaction.atomic():
+            super().delete_model(request, obj)
+            circulation.sync_books(Book.objects.filter(pk=obj.book_id))
+
+    def delete_queryset(self, request, queryset):
+        books = list(queryset.values_list('book_id', flat=True).distinct())
+        with db_transaction.atomic():
+            super().delete_queryset(request, queryset)
+            circulation.sync_books(Book.objects.filter(pk__in=books))
+
     @admin.action(description='✅ Mark selected as returned')
     def mark_returned(self, request, queryset):
-        updated = queryset.filter(returned=False).update(returned=True)
+        updated = circulation.return_loans(queryset)
         self.message_user(request, f'{updated} transaction(s) marked as returned.')
 
 from .models import RenewRequest
-from django.utils import timezone
-from datetime import timedelta
 
 @admin.register(RenewRequest)
 class RenewRequestAdmin(admin.ModelAdmin):
     list_display = ('transaction', 'request_date', 'status', 'current_due_date')
     list_filter = ('status', 'request_date')
     search_fields = ('transaction__student__enrollment_id', 'transaction__book__access_code')
-    actions = ['approve_requests']
+    list_select_related = ('transaction__student', 'transaction__book')
+    actions = ['approve_requests', 'reject_requests']
 
     def current_due_date(self, obj):
         return obj.transaction.due_date
 
     @admin.action(description='👍 Approve selected renew requests (+15 days)')
     def approve_requests(self, request, queryset):
-        for req in queryset.filter(status='Pending'):
-            # Update the underlying transaction due_date
-            req.transaction.due_date = timezone.now() + timedelta(days=15)
-            req.transaction.save()
-            # Update the request status
-            req.status = 'Approved'
-            req.save()
-        self.message_user(request, 'Selected requests have been approved and due dates extended.')
+        approved, extended = circulation.approve_renewals(queryset)
+        self.message_user(
+            request, f'{approved} request(s) approved; {extended} loan(s) now due in {circulation.LOAN_DAYS} days.'
+        )
+
+    @admin.action(description='👎 Reject selected renew requests')
+    def reject_requests(self, request, queryset):
+        rejected = circulation.reject_renewals(queryset)
+        self.message_user(request, f'{rejected} request(s) rejected.')
 
 from django.http import HttpResponseRedirect
 from django.urls import reverse
@@ -137,3 +155,41 @@ class ManualReminderProxyAdmin(admin.ModelAdmin):
         # Redirect directly to our custom manual reminder view
         return HttpResponseRedirect(reverse('admin_manual_reminder'))
 
+
+
+from .models import ReportJob, KioskScanEvent, VisitCounter
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('report_type', 'file_format', 'status', 'params', 'created_at', 'finished_at')
+    list_filter = ('report_type', 'status')
+    readonly_fields = ('report_type', 'file_format', 'params', 'params_key', 'data_version',
+                       'status', 'file_path', 'error', 'created_at', 'finished_at')
+    list_per_page = 25
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(KioskScanEvent)
+class KioskScanEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'barcode', 'result', 'scanned_at', 'received_at')
+    list_filter = ('result',)
+    search_fields = ('event_id', 'barcode')
+    readonly_fields = ('event_id', 'barcode', 'result', 'scanned_at', 'received_at')
+    list_per_page = 25
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(VisitCounter)
+class VisitCounterAdmin(admin.ModelAdmin):
+    list_display = ('day', 'department', 'visits')
+    list_filter = ('department',)
+    date_hierarchy = 'day'
+    readonly_fields = ('day', 'department', 'visits')
+    list_per_page = 25
+
+    def has_add_permission(self, request):
+        return False
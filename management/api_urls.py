@@ -1,7 +1,9 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
 from .api_views import (
-    CustomTokenObtainPairView, api_sitemap, RegisterView, LogoutView, ChangePasswordView, DeleteUserView
+    CustomTokenObtainPairView, api_sitemap, RegisterView, LogoutView, ChangePasswordView, DeleteUserView,
+    kiosk_scan, occupancy_analytics, book_suggest, book_by_isbn,
+    search_cache_stats, bulk_circulation
 )
 
 urlpatterns = [
@@ -19,4 +21,18 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(), name='api_logout'),
     path('update-password/', ChangePasswordView.as_view(), name='api_update_password'),
     path('delete/', DeleteUserView.as_view(), name='api_delete_user'),
+
+    # Kiosk
+    path('kiosk/scan/', kiosk_scan, name='api_kiosk_scan'),
+
+    # Analytics
+    path('analytics/occupancy/', occupancy_analytics, name='api_occupancy_analytics'),
+
+    # Books
+    path('books/suggest/', book_suggest, name='api_book_suggest'),
+    path('books/isbn/<str:isbn>/', book_by_isbn, name='api_book_by_isbn'),
+    path('search/cache-stats/', search_cache_stats, name='api_search_cache_stats'),
+
+    # Circulation
+    path('circulation/bulk/', bulk_circulation, name='api_bulk_circulation'),
 ]
@@ -1,10 +1,14 @@
+import hmac
+from django.conf import settings
+from django.db import IntegrityError
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from .serializers import CustomTokenObtainPairSerializer
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from .serializers import CustomTokenObtainPairSerializer, KioskScanSerializer
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.permissions import AllowAny, BasePermission
+from .kiosk import process_scan_batch, MAX_SCAN_BATCH
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     """
@@ -48,11 +52,18 @@ def api_sitemap(request):
             "token_obtain": "/api/token/",
             "token_refresh": "/api/token/refresh/",
             "token_verify": "/api/token/verify/",
-            "sitemap": "/api/sitemap/"
+            "sitemap": "/api/sitemap/",
+            "kiosk_scan": "/api/kiosk/scan/",
+            "occupancy_analytics": "/api/analytics/occupancy/",
+            "book_suggest": "/api/books/suggest/",
+            "book_by_isbn": "/api/books/isbn/<isbn>/",
+            "search_cache_stats": "/api/search/cache-stats/",
+            "bulk_circulation": "/api/circulation/bulk/"
         },
         "Admin & Staff Endpoints": {
             "api_admin": "/admin/",
             "live_dashboard": "/dashboard/",
+            "bulk_issue_return": "/issue-book/bulk/",
             "reports_dashboard": "/admin/reports/",
             "entry_exit_report": "/admin/reports/entry-exit/",
             "book_issues_report": "/admin/reports/book-issues/",
@@ -109,3 +120,235 @@ class DeleteUserView(APIView):
         user = request.user
         user.delete()
         return Response({"message": "User account deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
+
+
+class HasKioskToken(BasePermission):
+    """The request carries one of the KIOSK_API_TOKENS in its X-Kiosk-Token header."""
+    message = "A valid kiosk device token is required."
+
+    def has_permission(self, request, view):
+        token = request.headers.get('X-Kiosk-Token', '').encode()
+        return any(hmac.compare_digest(token, known.encode()) for known in settings.KIOSK_API_TOKENS)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([HasKioskToken])
+def kiosk_scan(request):
+    """
+    Check students in/out from a kiosk. Accepts a single scan object or
+    {"scans": [...]} with up to MAX_SCAN_BATCH scans; replayed event ids
+    are reported as duplicates and not applied twice.
+    """
+    data = request.data
+    scans = data.get('scans') if isinstance(data, dict) and 'scans' in data else [data]
+    if not isinstance(scans, list) or not scans:
+        return Response({"error": "Send a scan object or a non-empty 'scans' list."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(scans) > MAX_SCAN_BATCH:
+        return Response({"error": f"At most {MAX_SCAN_BATCH} scans per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = KioskScanSerializer(data=scans, many=True)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        results = process_scan_batch(serializer.validated_data)
+    except IntegrityError:
+        # The same events are being processed by a parallel request
+        return Response(
+            {"error": "Batch conflicts with one being processed. Please retry."},
+            status=status.HTTP_409_CONFLICT
+        )
+    return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+# ── Occupancy analytics ─────────────────────────────────────
+from datetime import date, timedelta
+from django.db.models import F, Sum
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from .date_ranges import _as_date, date_range_filter
+from .models import HourlyOccupancy, RollupWatermark
+from .occupancy_rollup import ROLLUP_NAME
+
+OCCUPANCY_GROUPS = {
+    'hour': F('hour'),
+    'day': TruncDate('hour'),
+    'hour_of_day': ExtractHour('hour'),
+}
+# Longest date range one request may ask for
+OCCUPANCY_MAX_DAYS = 366
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def occupancy_analytics(request):
+    """
+    Library occupancy by hour, day or hour of day and department, served from
+    the hourly rollup (never the raw logs). Query params: `from`, `to`
+    (YYYY-MM-DD, default the last 7 days), `department`, `group`.
+    """
+    today = timezone.localdate()
+    date_from = request.query_params.get('from') or today - timedelta(days=6)
+    date_to = request.query_params.get('to') or today
+    group = request.query_params.get('group', 'hour')
+    department = request.query_params.get('department', '').strip()
+
+    start, end = _as_date(date_from), _as_date(date_to)
+    if not start or not end or start > end:
+        return Response({"error": "`from` and `to` must be dates (YYYY-MM-DD) with from <= to."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if (end - start).days >= OCCUPANCY_MAX_DAYS:
+        return Response({"error": f"Ask for at most {OCCUPANCY_MAX_DAYS} days at a time."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if group not in OCCUPANCY_GROUPS:
+        return Response({"error": f"`group` must be one of: {', '.join(OCCUPANCY_GROUPS)}."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    rows = HourlyOccupancy.objects.filter(**date_range_filter('hour', start, end))
+    if department:
+        rows = rows.filter(department=department)
+    rows = (
+        rows.annotate(bucket=OCCUPANCY_GROUPS[group])
+        .values('bucket', 'department')
+        .annotate(visits=Sum('visits'), dwell=Sum('dwell_seconds'), occupied=Sum('occupied_seconds'))
+        .order_by('bucket', 'department')
+    )
+
+    results = []
+    for row in rows:
+        bucket = row['bucket']
+        if group == 'hour':
+            bucket = timezone.localtime(bucket).isoformat()
+        elif isinstance(bucket, date):
+            bucket = bucket.isoformat()
+        results.append({
+            "bucket": bucket,
+            "department": row['department'],
+            "visits": row['visits'],
+            # For hourly buckets this is the average number of students inside
+            "student_hours": round(row['occupied'] / 3600, 2),
+            "avg_dwell_minutes": round(row['dwell'] / row['visits'] / 60, 1) if row['visits'] else None,
+        })
+
+    watermark = RollupWatermark.objects.filter(name=ROLLUP_NAME).first()
+    return Response({
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "group": group,
+        "rolled_up_at": watermark.updated_at.isoformat() if watermark else None,
+        "results": results,
+    }, status=status.HTTP_200_OK)
+
+
+# ── Book typeahead ──────────────────────────────────────────
+from .suggest_index import suggest_index
+from .search_index import search_books
+
+SUGGEST_MAX_LIMIT = 20
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def book_suggest(request):
+    """
+    Search-as-you-type: books whose title, author words or access code start
+    with `q`, answered from the in-memory prefix index.
+    """
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), SUGGEST_MAX_LIMIT)
+    except ValueError:
+        limit = 10
+    if not query:
+        return Response({"query": query, "results": []}, status=status.HTTP_200_OK)
+
+    if suggest_index.available:
+        results = suggest_index.suggest(query, limit=limit)
+    else:
+        # The catalogue doesn't fit the index's memory budget
+        results = [
+            {"access_code": code, "title": title, "author": author or ''}
+            for code, title, author in search_books(query)[:limit].values_list('access_code', 'title', 'author')
+        ]
+    return Response({"query": query, "results": results}, status=status.HTTP_200_OK)
+
+
+# ── Book lookup by ISBN ─────────────────────────────────────
+from .isbn import normalize_isbn
+from .models import Book
+from .serializers import BookSerializer
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def book_by_isbn(request, isbn):
+    """
+    Every copy of the book with this ISBN. ISBN-10 and ISBN-13 are accepted,
+    with or without hyphens, and matched exactly on the normalised column.
+    """
+    isbn13 = normalize_isbn(isbn)
+    if isbn13 is None:
+        return Response({"error": "Invalid ISBN", "message": "Not a valid ISBN-10 or ISBN-13."}, status=status.HTTP_400_BAD_REQUEST)
+    books = Book.objects.filter(isbn13=isbn13).order_by('access_code')
+    if not books:
+        return Response({"error": "Not Found", "message": "No book with this ISBN.", "isbn13": isbn13}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"isbn13": isbn13, "results": BookSerializer(books, many=True).data}, status=status.HTTP_200_OK)
+
+
+# ── Search cache statistics ─────────────────────────────────
+from .search_cache import cache_stats, catalogue_version
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def search_cache_stats(request):
+    """Hit/miss counts of the book search result cache in this server process."""
+    stats = cache_stats.snapshot()
+    stats['catalogue_version'] = catalogue_version()
+    return Response(stats, status=status.HTTP_200_OK)
+
+
+# ── Bulk issue and return ───────────────────────────────────
+from .circulation import BookUnavailable, issue_books, return_books
+from .models import Student
+from .serializers import BulkCirculationSerializer
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_circulation(request):
+    """
+    Issue or return several books for one student. Books are looked up
+    together and changed in one database transaction; every access code
+    gets its own result.
+    """
+    serializer = BulkCirculationSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+
+    student = Student.objects.filter(enrollment_id=data['enrollment_id']).first()
+    if student is None:
+        return Response(
+            {"error": "Not Found", "message": f"Student with Enrollment No. '{data['enrollment_id']}' not found."},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    try:
+        if data['action'] == 'issue':
+            results = issue_books(student, data['access_codes'])
+        else:
+            results = return_books(student, data['access_codes'])
+    except BookUnavailable:
+        return Response(
+            {"error": "Conflict", "message": "A book was issued at another desk meanwhile. Nothing was issued; please retry."},
+            status=status.HTTP_409_CONFLICT
+        )
+    return Response({
+        "enrollment_id": student.enrollment_id,
+        "action": data['action'],
+        "results": results,
+    }, status=status.HTTP_200_OK)
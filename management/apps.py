@@ -7,6 +7,8 @@ class ManagementConfig(AppConfig):
     name = 'management'
 
     def ready(self):
+        from . import signals  # noqa: F401  (connects the model signal receivers)
+
         # Hide APScheduler models from admin (they clutter the panel)
         from django.contrib import admin
         from django_apscheduler.models import DjangoJob, DjangoJobExecution
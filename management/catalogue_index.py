@@ -0,0 +1,81 @@
+"""
+Shared plumbing of the in-process indexes built from the book table
+(suggest_index, fuzzy_search).
+
+An index is built on first use and kept up to date by its own signal
+handlers for books saved in this process. Books imported or deleted by
+other processes, such as `import_data`, are noticed by comparing the book
+count with the database at most every STALE_CHECK_SECONDS; the index is
+then rebuilt in a background thread while queries keep using the old one.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger('management')
+
+STALE_CHECK_SECONDS = 30
+
+
+class CatalogueIndex:
+    """
+    Base of an in-process book index. Subclasses implement `reload()`,
+    which builds the index and calls `_loaded_with(book count)` under
+    the lock, and `reset()`, which clears it and `_loaded`.
+    """
+    # Used in log messages and the rebuild thread's name
+    label = 'Catalogue index'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._book_count = 0
+        self._checked_at = 0.0
+        self._rebuilding = False
+
+    def reload(self):
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+    def _loaded_with(self, book_count):
+        """Record a finished build. Call with the lock held."""
+        self._book_count = book_count
+        self._checked_at = time.monotonic()
+        self._loaded = True
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            from django.db import connection
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("%s rebuild failed.", self.label)
+            finally:
+                # This thread's own database connection
+                connection.close()
+                with self._lock:
+                    self._rebuilding = False
+
+        name = f"{self.label.lower().replace(' ', '-')}-rebuild"
+        threading.Thread(target=run, name=name, daemon=True).start()
+
+    def _ensure_fresh(self):
+        """Build the index if it isn't yet, or start a rebuild if the book count moved. Call with the lock held."""
+        if not self._loaded:
+            self.reload()
+            return
+        now = time.monotonic()
+        if now - self._checked_at < STALE_CHECK_SECONDS:
+            return
+        from .models import Book
+        self._checked_at = now
+        if Book.objects.count() != self._book_count:
+            # Books were added or removed by another process (e.g. import_data)
+            self._rebuild_in_background()
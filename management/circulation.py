@@ -0,0 +1,239 @@
+"""
+Circulation: issuing, returning and renewing books.
+
+A book's `status` and `current_holder` repeat what its open Transaction
+says, so the search page, the admin stats and the issue desk can read a
+book's availability from the book row alone. Every issue, return and
+renewal goes through this module, which changes the Transaction and the
+Book in one database transaction; they can never be seen out of step.
+
+`issue_books` and `return_books` handle a pile of books for one student
+(semester start) with one lookup and one write per table, reporting a
+result for every access code.
+
+`sync_books` recomputes the two fields from the Transactions for any set
+of books. The admin uses it after direct edits of Transactions, and
+`manage.py repair_circulation` runs it over the whole catalogue.
+"""
+import logging
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery
+from django.db.models.functions import Now
+from django.utils import timezone
+from . import data_versions
+from .models import Book, RenewRequest, Transaction
+
+logger = logging.getLogger('management')
+
+LOAN_DAYS = 15
+# Most books the bulk issue/return form and API take at once
+MAX_BULK_BOOKS = 20
+
+
+class BookUnavailable(Exception):
+    """The book is on loan to someone already."""
+
+
+def default_due_date():
+    return timezone.now() + timedelta(days=LOAN_DAYS)
+
+
+def _books_changed(*also):
+    # Book rows changed with .update(), which sends no post_save. Only
+    # status and holder change here, so cached search pages stay valid.
+    # Other changed tables in `also` are bumped with the same UPDATE.
+    data_versions.bump_version(data_versions.BOOKS, *also)
+
+
+def issue_book(student, book, due_date=None):
+    """Lend `book` to `student`. Returns the new Transaction; raises BookUnavailable."""
+    try:
+        with transaction.atomic():
+            # Claim the book first: a conditional UPDATE locks the row (MySQL)
+            # or the database (SQLite) until commit, and matches nothing if
+            # another desk got there first, so the check and the issue can't
+            # be split by a concurrent issue.
+            claimed = Book.objects.filter(pk=book.pk, status='Available').update(
+                status='Issued', current_holder=student
+            )
+            if not claimed:
+                raise BookUnavailable(f"Book '{book.access_code}' is already issued.")
+            loan = Transaction.objects.create(student=student, book=book, due_date=due_date or default_due_date())
+            _books_changed()
+    except IntegrityError:
+        # The one-open-loan-per-book constraint, should the status ever be out of step
+        raise BookUnavailable(f"Book '{book.access_code}' is already issued.")
+    book.status, book.current_holder = 'Issued', student
+    return loan
+
+
+def return_loans(loans):
+    """Close the open loans among `loans` (a Transaction queryset). Returns how many were closed."""
+    with transaction.atomic():
+        book_ids = list(loans.filter(returned=False).select_for_update().values_list('book_id', flat=True))
+        if not book_ids:
+            return 0
+        closed = Transaction.objects.filter(book_id__in=book_ids, returned=False).update(returned=True)
+        Book.objects.filter(pk__in=book_ids).update(status='Available', current_holder=None)
+        _books_changed(data_versions.TRANSACTIONS)
+    return closed
+
+
+def return_book(loan):
+    """Close one loan. Returns False if it was already closed."""
+    returned = return_loans(Transaction.objects.filter(pk=loan.pk)) == 1
+    loan.returned = True
+    return returned
+
+
+def _result(access_code, result, message, **extra):
+    return {'access_code': access_code, 'result': result, 'message': message, **extra}
+
+
+def _bulk_results(access_codes, handle):
+    """One result per access code in the order given; `handle` answers each distinct one."""
+    results, seen = [], set()
+    for code in access_codes:
+        if code in seen:
+            results.append(_result(code, 'duplicate', "Listed more than once."))
+        else:
+            seen.add(code)
+            results.append(handle(code))
+    return results
+
+
+def issue_books(student, access_codes, due_date=None):
+    """
+    Lend several books to `student` at once. The free ones are issued
+    together in one database transaction; the rest are reported. Returns
+    one result dict per access code; raises BookUnavailable if a book was
+    taken by another desk while this ran (nothing is issued then).
+    """
+    codes = list(dict.fromkeys(access_codes))
+    due_date = due_date or default_due_date()
+    try:
+        with transaction.atomic():
+            # Locked until commit, so the availability read here stays true
+            books = Book.objects.select_for_update().in_bulk(codes)
+            free = [code for code in codes if code in books and books[code].status == 'Available']
+            if free:
+                claimed = Book.objects.filter(pk__in=free, status='Available').update(
+                    status='Issued', current_holder=student
+                )
+                if claimed != len(free):
+                    raise BookUnavailable("A book was issued at another desk meanwhile.")
+                Transaction.objects.bulk_create([
+                    Transaction(student=student, book=books[code], due_date=due_date) for code in free
+                ])
+                # bulk_create and update() send no signals
+                _books_changed(data_versions.TRANSACTIONS)
+    except IntegrityError:
+        raise BookUnavailable("A book was issued at another desk meanwhile.")
+    issued = set(free)
+
+    def handle(code):
+        book = books.get(code)
+        if book is None:
+            return _result(code, 'not_found', f"Book with Accession Code '{code}' not found.")
+        if code in issued:
+            book.status, book.current_holder = 'Issued', student
+            return _result(code, 'issued', f"Issued '{book.title}'.", title=book.title, due_date=due_date)
+        if book.current_holder_id == student.pk:
+            return _result(code, 'already_held', "Already issued to this student; request a renewal instead.",
+                           title=book.title)
+        return _result(code, 'unavailable', "Issued to another student; it must be returned first.",
+                       title=book.title)
+
+    return _bulk_results(access_codes, handle)
+
+
+def return_books(student, access_codes):
+    """
+    Take back several books from `student` in one database transaction.
+    Returns one result dict per access code.
+    """
+    codes = list(dict.fromkeys(access_codes))
+    with transaction.atomic():
+        books = Book.objects.select_for_update().in_bulk(codes)
+        held = {code for code in codes if code in books and books[code].current_holder_id == student.pk}
+        if held:
+            return_loans(Transaction.objects.filter(student=student, book_id__in=held))
+
+    def handle(code):
+        book = books.get(code)
+        if book is None:
+            return _result(code, 'not_found', f"Book with Accession Code '{code}' not found.")
+        if code in held:
+            book.status, book.current_holder = 'Available', None
+            return _result(code, 'returned', f"Returned '{book.title}'.", title=book.title)
+        return _result(code, 'not_issued', "Not on loan to this student.", title=book.title)
+
+    return _bulk_results(access_codes, handle)
+
+
+def _pending_requests(requests):
+    """The still pending ones among `requests` (a queryset or a list of ids), locked until commit."""
+    ids = requests if isinstance(requests, list) else list(requests.values_list('pk', flat=True))
+    return RenewRequest.objects.select_for_update().filter(pk__in=ids, status='Pending')
+
+
+def approve_renewals(requests, days=LOAN_DAYS):
+    """
+    Approve the pending requests among `requests` (a RenewRequest queryset
+    or a list of ids) and extend their open loans to `days` from now. Two UPDATEs in one
+    transaction, the new due date computed by the database. Returns
+    (requests approved, loans extended); a loan asked for twice is
+    extended once and a returned one not at all.
+    """
+    with transaction.atomic():
+        # Ids first: MySQL can't UPDATE a table filtered by a subquery on itself
+        pending = list(_pending_requests(requests).values_list('pk', 'transaction_id'))
+        request_ids = [pk for pk, _ in pending]
+        if not request_ids:
+            return 0, 0
+        extended = Transaction.objects.filter(
+            pk__in={loan_id for _, loan_id in pending}, returned=False
+        ).update(due_date=Now() + timedelta(days=days))
+        approved = RenewRequest.objects.filter(pk__in=request_ids).update(status='Approved')
+        changed = [data_versions.RENEW_REQUESTS] + ([data_versions.TRANSACTIONS] if extended else [])
+        data_versions.bump_version(*changed)
+    return approved, extended
+
+
+def reject_renewals(requests):
+    """Reject the pending requests among `requests`. Returns how many were rejected."""
+    with transaction.atomic():
+        request_ids = list(_pending_requests(requests).values_list('pk', flat=True))
+        if not request_ids:
+            return 0
+        rejected = RenewRequest.objects.filter(pk__in=request_ids).update(status='Rejected')
+        data_versions.bump_version(data_versions.RENEW_REQUESTS)
+    return rejected
+
+
+def sync_books(books=None):
+    """
+    Set status and current_holder of `books` (a Book queryset; default all)
+    from their open loans. Returns the number of books that were out of step.
+    """
+    books = Book.objects.all() if books is None else books
+    open_loans = Transaction.objects.filter(book=OuterRef('pk'), returned=False)
+    holder = Subquery(open_loans.order_by().values('student')[:1])
+    wrong_issued = books.annotate(loan_holder=holder).filter(loan_holder__isnull=False).filter(
+        ~Q(status='Issued') | Q(current_holder__isnull=True) | ~Q(current_holder=F('loan_holder'))
+    )
+    wrong_available = books.filter(~Exists(open_loans)).filter(
+        ~Q(status='Available') | Q(current_holder__isnull=False)
+    )
+    with transaction.atomic():
+        # Ids first: MySQL can't UPDATE a table filtered by a subquery on itself
+        wrong_issued = list(wrong_issued.values_list('pk', flat=True))
+        wrong_available = list(wrong_available.values_list('pk', flat=True))
+        fixed = Book.objects.filter(pk__in=wrong_issued).update(status='Issued', current_holder=holder)
+        fixed += Book.objects.filter(pk__in=wrong_available).update(status='Available', current_holder=None)
+        if fixed:
+            _books_changed()
+    if fixed:
+        logger.info("Circulation sync corrected %d book(s).", fixed)
+    return fixed
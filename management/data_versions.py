@@ -0,0 +1,47 @@
+"""
+Version tokens for the library tables, kept in the database (DataVersion).
+
+Anything derived from a table (a cached report file, a stats snapshot, ...)
+records the token it was built against; a write to the table replaces the
+token, which makes every derived result stale at once. The tokens live in
+the database, next to the data, so writes from every process count: the
+server, `import_data`, cron jobs and the report workers. Call
+`bump_version` inside the writing transaction.
+
+Tokens are random rather than counters so that a database restored from a
+backup can never hand out a token that a later result was built against.
+"""
+import uuid
+from .models import DataVersion
+
+LIBRARY_LOGS = 'library_logs'
+TRANSACTIONS = 'transactions'
+STUDENTS = 'students'
+BOOKS = 'books'
+RENEW_REQUESTS = 'renew_requests'
+
+
+def get_version(name):
+    """Current version token for `name`, creating one if there is none."""
+    return get_versions(name)
+
+
+def get_versions(*names):
+    """Version tokens for several tables joined into one string, read in one query."""
+    versions = dict(DataVersion.objects.filter(name__in=names).values_list('name', 'version'))
+    missing = [name for name in names if name not in versions]
+    if missing:
+        DataVersion.objects.bulk_create(
+            [DataVersion(name=name, version=uuid.uuid4().hex) for name in missing], ignore_conflicts=True
+        )
+        versions = dict(DataVersion.objects.filter(name__in=names).values_list('name', 'version'))
+    return '.'.join(versions[name] for name in names)
+
+
+def bump_version(*names):
+    """Mark everything derived from the given tables as stale."""
+    version = uuid.uuid4().hex
+    if DataVersion.objects.filter(name__in=names).update(version=version) < len(set(names)):
+        DataVersion.objects.bulk_create(
+            [DataVersion(name=name, version=version) for name in set(names)], ignore_conflicts=True
+        )
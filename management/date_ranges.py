@@ -0,0 +1,56 @@
+"""
+Date-range filters that keep the indexed datetime columns usable.
+
+Lookups such as `entry_time__date__gte` make the database convert every
+stored value to the local timezone before comparing it, so the index on the
+column can't be used. The helpers here turn local calendar dates into a
+half-open range of aware datetimes instead:
+
+    date_range_filter('entry_time', '2024-01-01', '2024-01-31')
+    -> {'entry_time__gte': 2024-01-01 00:00 IST, 'entry_time__lt': 2024-02-01 00:00 IST}
+
+which the database answers with an index range scan.
+"""
+from datetime import date, datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def _as_date(value):
+    """Accept a `date` or a 'YYYY-MM-DD' string; anything else gives None."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return parse_date(str(value).strip())
+    except ValueError:
+        return None
+
+
+def local_day_start(day):
+    """Midnight at the start of `day` in the current (local) timezone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def date_range_filter(field, date_from=None, date_to=None):
+    """
+    Filter kwargs selecting rows whose `field` falls on a local calendar day
+    between `date_from` and `date_to` (both inclusive). Either bound may be
+    empty; invalid dates are ignored just like empty ones.
+    """
+    filters = {}
+    start = _as_date(date_from)
+    end = _as_date(date_to)
+    if start:
+        filters[f'{field}__gte'] = local_day_start(start)
+    if end:
+        filters[f'{field}__lt'] = local_day_start(end + timedelta(days=1))
+    return filters
+
+
+def day_filter(field, day):
+    """Filter kwargs selecting rows whose `field` falls on the local `day`."""
+    return date_range_filter(field, day, day)
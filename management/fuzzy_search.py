@@ -0,0 +1,177 @@
+"""
+Typo-tolerant book search.
+
+When a search finds nothing, `correct_query` swaps each word the catalogue
+doesn't contain ("thermodynamcis") for the closest word that it does
+("thermodynamics"), and the search is run again with the corrected words.
+
+Closeness is trigram similarity, as in PostgreSQL's pg_trgm: the share of
+the two words' 3-letter pieces they have in common. The index covers the
+vocabulary of titles and authors (distinct words, not whole titles, so it
+stays small) as posting lists, trigram -> array of word numbers. A lookup
+counts overlaps only along the posting lists of the misspelt word's own
+trigrams, never touching the rest of the vocabulary.
+
+Words from books saved in this process are added as they commit. Books
+imported or deleted elsewhere are noticed as described in
+catalogue_index.py, which rebuilds the vocabulary.
+"""
+import bisect
+import logging
+from array import array
+from collections import Counter, defaultdict
+from .catalogue_index import CatalogueIndex
+from .search_index import search_terms
+
+logger = logging.getLogger('management')
+
+# Least similarity for a correction; pg_trgm's default threshold
+SIMILARITY_THRESHOLD = 0.3
+# Shorter words are too ambiguous to correct
+MIN_FUZZY_LENGTH = 4
+# Words added since the last build before the vocabulary is rebuilt
+MAX_ADDED_WORDS = 1000
+
+
+def trigrams(word):
+    """Trigrams of a word, padded like pg_trgm so its start weighs more."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(grams, other_grams):
+    shared = len(grams & other_grams)
+    return shared / (len(grams) + len(other_grams) - shared)
+
+
+class TrigramIndex:
+    """Immutable trigram posting lists over a vocabulary with word frequencies."""
+
+    def __init__(self, word_counts):
+        self.words = sorted(word_counts)
+        self.frequencies = array('I', (word_counts[word] for word in self.words))
+        self.sizes = array('B')
+        postings = defaultdict(lambda: array('I'))
+        for number, word in enumerate(self.words):
+            grams = trigrams(word)
+            self.sizes.append(min(len(grams), 255))
+            for gram in grams:
+                postings[gram].append(number)
+        self.postings = dict(postings)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        i = bisect.bisect_left(self.words, word)
+        return i < len(self.words) and self.words[i] == word
+
+    def similar(self, word, threshold=SIMILARITY_THRESHOLD):
+        """[(similarity, frequency, word)] for vocabulary words at least `threshold` similar."""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is not None:
+                shared.update(posting)
+        found = []
+        for number, overlap in shared.items():
+            score = overlap / (len(grams) + self.sizes[number] - overlap)
+            if score >= threshold:
+                found.append((score, self.frequencies[number], self.words[number]))
+        return found
+
+
+class FuzzyIndex(CatalogueIndex):
+    """The trigram index plus the words of books saved since it was built."""
+    label = 'Fuzzy search vocabulary'
+
+    def __init__(self):
+        super().__init__()
+        self._index = None
+        self._added = {}         # word -> trigrams, for words not in the index
+
+    @staticmethod
+    def _book_rows():
+        from .models import Book
+        return Book.objects.order_by().values_list('title', 'author').iterator(chunk_size=5000)
+
+    def reload(self):
+        """Build the vocabulary from the book table."""
+        word_counts = Counter()
+        books = 0
+        for title, author in self._book_rows():
+            word_counts.update(search_terms(f'{title} {author or ""}'))
+            books += 1
+        index = TrigramIndex(word_counts)
+        with self._lock:
+            self._index = index
+            self._added = {}
+            self._loaded_with(books)
+        logger.info("Fuzzy search vocabulary built: %d words from %d books.", len(index), books)
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._added = {}
+            self._loaded = False
+
+    def add_book(self, title, author, created=False):
+        """Take in the words of a saved book."""
+        with self._lock:
+            if not self._loaded:
+                return
+            if created:
+                self._book_count += 1
+            new_words = {
+                word: trigrams(word) for word in search_terms(f'{title} {author or ""}')
+                if word not in self._index and word not in self._added
+            }
+            if new_words:
+                # A new dict, so lookups reading the old one outside the lock are safe
+                self._added = {**self._added, **new_words}
+            rebuild = len(self._added) > MAX_ADDED_WORDS
+        if rebuild:
+            self._rebuild_in_background()
+
+    def remove_book(self):
+        # The book's words stay until the next rebuild: a correction to a word
+        # no longer in the catalogue just finds nothing, like the original query
+        with self._lock:
+            self._book_count -= 1
+
+    def knows(self, word):
+        with self._lock:
+            self._ensure_fresh()
+            return word in self._index or word in self._added
+
+    def closest(self, word):
+        """The catalogue word most similar to `word`, or None."""
+        with self._lock:
+            self._ensure_fresh()
+            index, added = self._index, self._added
+        found = index.similar(word)
+        grams = trigrams(word)
+        for other, other_grams in added.items():
+            score = similarity(grams, other_grams)
+            if score >= SIMILARITY_THRESHOLD:
+                found.append((score, 1, other))
+        if not found:
+            return None
+        # Most similar, then the more common word, then alphabetical
+        return min(found, key=lambda match: (-match[0], -match[1], match[2]))[2]
+
+
+fuzzy_index = FuzzyIndex()
+
+
+def correct_query(query):
+    """`query` with unknown words replaced by their closest catalogue words, or None if none were."""
+    corrected, changed = [], False
+    for term in search_terms(query):
+        if len(term) >= MIN_FUZZY_LENGTH and not term.isdigit() and not fuzzy_index.knows(term):
+            replacement = fuzzy_index.closest(term)
+            if replacement:
+                term, changed = replacement, True
+        corrected.append(term)
+    return ' '.join(corrected) if changed else None
@@ -0,0 +1,42 @@
+"""
+ISBN normalisation.
+
+`Book.isbn_no` holds whatever was typed or imported ("81-203-4010-5",
+"978 81 203 4010 3", ...). `normalize_isbn` turns any valid ISBN-10 or
+ISBN-13 into the canonical 13 digits stored in the indexed `Book.isbn13`,
+so both spellings of the same book find each other with one exact match.
+"""
+import re
+
+_SEPARATORS_RE = re.compile(r'[\s\-‐‑‒–—.]+')
+_ISBN10_RE = re.compile(r'^\d{9}[\dX]$')
+_ISBN13_RE = re.compile(r'^97[89]\d{10}$')
+
+
+def _compact(value):
+    """The value without separators, prefix ("ISBN", "ISBN-13:") and case."""
+    value = _SEPARATORS_RE.sub('', (value or '').upper())
+    return re.sub(r'^ISBN(?:10|13)?:?', '', value)
+
+
+def _isbn13_check_digit(first12):
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def _isbn10_is_valid(isbn):
+    digits = [10 if ch == 'X' else int(ch) for ch in isbn]
+    return sum(weight * digit for weight, digit in zip(range(10, 0, -1), digits)) % 11 == 0
+
+
+def normalize_isbn(value):
+    """Canonical ISBN-13 for `value`, or None if it isn't a valid ISBN-10/13."""
+    isbn = _compact(value)
+    if _ISBN10_RE.match(isbn):
+        if not _isbn10_is_valid(isbn):
+            return None
+        first12 = '978' + isbn[:9]
+        return first12 + _isbn13_check_digit(first12)
+    if _ISBN13_RE.match(isbn) and _isbn13_check_digit(isbn[:12]) == isbn[12]:
+        return isbn
+    return None
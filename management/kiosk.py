@@ -0,0 +1,118 @@
+"""
+Kiosk scan handling shared by the kiosk page and the JSON scan API.
+
+The API accepts batches of scans that a kiosk may have buffered while the
+campus Wi-Fi was down. Every scan carries a client-generated event id;
+ids already recorded in KioskScanEvent are reported back as duplicates and
+not applied again, so a kiosk can safely resend a batch it is unsure about.
+Scans older than KIOSK_OFFLINE_WINDOW are recorded as `expired` and not
+applied, so the visit history can't be rewritten with made-up dates.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Student, KioskScanEvent
+from .occupancy import occupancy_index
+
+logger = logging.getLogger('management')
+
+# Largest batch the scan API accepts in one request
+MAX_SCAN_BATCH = 500
+
+
+def is_valid_barcode(barcode):
+    """Only alphanumeric characters, hyphens and underscores are allowed."""
+    return bool(barcode) and barcode.replace('-', '').replace('_', '').isalnum()
+
+
+def _message(result, student=None, barcode=''):
+    if result == 'in':
+        return f"Welcome, {student.name}! Access Granted."
+    if result == 'out':
+        return f"Goodbye, {student.name}! See you next time."
+    if result == 'unknown':
+        return f"Access Denied: Student ID '{barcode}' not found or not registered."
+    if result == 'expired':
+        return "Scan is older than the kiosk offline window; not applied."
+    return "Invalid barcode format. Only alphanumeric characters allowed."
+
+
+def process_scan_batch(scans):
+    """
+    Apply a batch of scans (dicts with `event_id`, `barcode` and optional
+    `scanned_at`) in one database transaction, in device-time order.
+    Returns one result dict per scan, in the order they were given.
+    """
+    now = timezone.now()
+    oldest = now - timedelta(seconds=settings.KIOSK_OFFLINE_WINDOW)
+    for scan in scans:
+        # A device clock running ahead must not create logs in the future;
+        # one running behind can't close a session before it began (toggle)
+        scan['scanned_at'] = min(scan.get('scanned_at') or now, now)
+
+    event_ids = [scan['event_id'] for scan in scans]
+    recorded = dict(
+        KioskScanEvent.objects.filter(event_id__in=event_ids).values_list('event_id', 'result')
+    )
+    barcodes = {scan['barcode'] for scan in scans if is_valid_barcode(scan['barcode'])}
+    students = Student.objects.only('enrollment_id', 'name', 'department').in_bulk(list(barcodes))
+
+    results = {}
+    events = []
+    try:
+        with transaction.atomic():
+            for scan in sorted(scans, key=lambda s: s['scanned_at']):
+                event_id, barcode = scan['event_id'], scan['barcode']
+                if event_id in recorded:
+                    results[event_id] = {
+                        'event_id': event_id,
+                        'result': recorded[event_id],
+                        'duplicate': True,
+                        'message': 'Already processed.',
+                    }
+                    continue
+                if event_id in results:
+                    # Repeated inside the same batch: the first copy counts
+                    continue
+
+                student = students.get(barcode)
+                if scan['scanned_at'] < oldest:
+                    result = 'expired'
+                    logger.warning("Kiosk scan %s from %s is too old; not applied.", event_id, scan['scanned_at'])
+                elif not is_valid_barcode(barcode):
+                    result = 'invalid'
+                elif student is None:
+                    result = 'unknown'
+                    logger.warning("Unknown barcode scanned: %s", barcode)
+                else:
+                    result = occupancy_index.toggle(student, at=scan['scanned_at'])
+                    logger.info("Student %s checked %s", barcode, result.upper())
+
+                results[event_id] = {
+                    'event_id': event_id,
+                    'result': result,
+                    'duplicate': False,
+                    'message': _message(result, student, barcode),
+                }
+                events.append(KioskScanEvent(
+                    event_id=event_id, barcode=barcode, scanned_at=scan['scanned_at'], result=result
+                ))
+            KioskScanEvent.objects.bulk_create(events)
+    except Exception:
+        # The index may hold toggles that were just rolled back
+        occupancy_index.reset()
+        raise
+
+    return [results[event_id] for event_id in event_ids]
+
+
+def purge_scan_events(older_than=timedelta(days=30)):
+    """
+    Forget processed scan ids. Kiosks only replay recent batches, so old
+    events are no longer needed for deduplication.
+    """
+    cutoff = timezone.now() - older_than
+    deleted, _ = KioskScanEvent.objects.filter(received_at__lt=cutoff).delete()
+    logger.info("Purged %d kiosk scan event(s).", deleted)
@@ -0,0 +1,162 @@
+"""
+Live occupancy feed for the dashboard (Server-Sent Events).
+
+Check-ins and check-outs are published here once their transaction
+commits; /dashboard/feed/ streams them to the open dashboards, which patch
+their table in place instead of reloading the page.
+
+Events are kept in a ring buffer so a display that reconnects (EventSource
+does this by itself, sending Last-Event-ID) receives what it missed. Event
+ids carry a per-process epoch: after a server restart, or when a display
+has fallen further behind than the buffer reaches, it is told to reload.
+
+Each open stream holds one waitress thread, so the number of streams is
+capped by LIVE_FEED_MAX_STREAMS and every stream ends after
+LIVE_FEED_STREAM_SECONDS (the browser then reconnects).
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateformat import format as format_date
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+
+
+class OccupancyFeed:
+    """Ring buffer of occupancy events that streams can wait on."""
+
+    def __init__(self, size=1000):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=size)
+        self._last_seq = 0
+        self._streams = 0
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def _token(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    def last_event_id(self):
+        with self._cond:
+            return self._token(self._last_seq)
+
+    def publish(self, kind, data):
+        with self._cond:
+            self._last_seq += 1
+            self._events.append((self._last_seq, kind, data))
+            self._cond.notify_all()
+
+    def _parse(self, token):
+        """Sequence number for `token`, or None if it can't be resumed from."""
+        epoch, _, seq = (token or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        oldest = self._events[0][0] if self._events else self._last_seq + 1
+        if seq > self._last_seq or seq < oldest - 1:
+            return None
+        return seq
+
+    def events_after(self, token, timeout):
+        """
+        Events newer than `token`, waiting up to `timeout` seconds for one.
+        Returns [] on timeout and None when the client has to resync.
+        """
+        with self._cond:
+            seq = self._parse(token)
+            if seq is None:
+                return None
+            self._cond.wait_for(lambda: self._last_seq > seq, timeout=timeout)
+            if self._parse(token) is None:
+                return None
+            return [
+                (self._token(event_seq), kind, data)
+                for event_seq, kind, data in self._events
+                if event_seq > seq
+            ]
+
+    def open_stream(self):
+        """Reserve a stream slot; False when all LIVE_FEED_MAX_STREAMS are taken."""
+        with self._cond:
+            if self._streams >= settings.LIVE_FEED_MAX_STREAMS:
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self):
+        with self._cond:
+            self._streams -= 1
+
+
+occupancy_feed = OccupancyFeed()
+
+
+def publish_check_in(log, new_visit=False):
+    """Announce an open log (after commit). `new_visit` when the log was just created today."""
+    student = log.student
+    data = {
+        'log_id': log.pk,
+        'enrollment_id': student.enrollment_id,
+        'name': student.name,
+        'department': student.department,
+        'entry_time': format_date(timezone.localtime(log.entry_time), 'd M, Y H:i'),
+        'new_visit': new_visit,
+    }
+    transaction.on_commit(partial(occupancy_feed.publish, 'in', data))
+
+
+def publish_check_out(log_id, enrollment_id):
+    """Announce a closed or deleted log (after commit)."""
+    data = {'log_id': log_id, 'enrollment_id': enrollment_id}
+    transaction.on_commit(partial(occupancy_feed.publish, 'out', data))
+
+
+def sse_message(kind, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {kind}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class FeedStream:
+    """
+    Response body of one SSE connection. Django calls close() when the
+    response is finished, even if iteration never started, which releases
+    the stream slot taken by the view.
+    """
+
+    def __init__(self, feed, token, duration):
+        self.feed = feed
+        # No id at all: a new listener that only wants what happens from now on
+        self.token = token or feed.last_event_id()
+        self.duration = duration
+        self._closed = False
+
+    def __iter__(self):
+        deadline = time.monotonic() + self.duration
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            wait = min(HEARTBEAT_SECONDS, max(deadline - time.monotonic(), 0))
+            events = self.feed.events_after(self.token, timeout=wait)
+            if events is None:
+                yield sse_message('reload', {})
+                return
+            if not events:
+                yield ': ping\n\n'
+                continue
+            for event_id, kind, data in events:
+                yield sse_message(kind, data, event_id)
+            self.token = events[-1][0]
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.feed.close_stream()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from management.renewal_rules import auto_approve_renewals
+
+REASONS = {
+    'returned': 'loan already returned',
+    'overdue': 'loan overdue',
+    'other_overdue': 'student has another overdue book',
+    'renewal_limit': 'renewal limit reached',
+}
+
+
+class Command(BaseCommand):
+    help = 'Approve routine pending renewal requests, leaving the exceptions for staff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be approved')
+
+    def handle(self, *args, **options):
+        summary = auto_approve_renewals(dry_run=options['dry_run'])
+        verb = 'Would approve' if options['dry_run'] else 'Approved'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['approved']} of {summary['pending']} pending request(s), "
+            f"extending {summary['extended']} loan(s)."
+        ))
+        for reason, label in REASONS.items():
+            if summary[reason]:
+                self.stdout.write(f"  Left for staff, {label}: {summary[reason]}")
@@ -0,0 +1,506 @@
+import itertools
+import random
+import socketserver
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from management.models import Student, Book, LibraryLog, Transaction
+from management import circulation
+from management.date_ranges import date_range_filter
+from management import reminders, reports
+from management.suggest_index import SuggestIndex
+from management.fuzzy_search import FuzzyIndex
+
+# Lookup latency the typeahead endpoint is expected to stay under
+SUGGEST_P99_TARGET_MS = 2.0
+# Per misspelt word; only paid when a search found nothing
+FUZZY_P99_TARGET_MS = 10.0
+
+
+class Command(BaseCommand):
+    help = 'Run performance benchmarks and query-plan checks against the configured database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', type=str, choices=['date-filters', 'row-formatting', 'kiosk-sessions', 'suggest', 'fuzzy', 'issue-desks', 'smtp'], help='Benchmark to run')
+        parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000],
+                            help='Row counts for the row-formatting benchmark')
+        parser.add_argument('--scans', type=int, default=200, help='Kiosk scans for the kiosk-sessions benchmark')
+        parser.add_argument('--books', type=int, default=200_000, help='Synthetic catalogue size for the suggest and fuzzy benchmarks')
+        parser.add_argument('--queries', type=int, default=20_000, help='Lookups for the suggest and fuzzy benchmarks')
+        parser.add_argument('--desks', type=int, nargs='+', default=[8, 32],
+                            help='Concurrent circulation desks for the issue-desks benchmark')
+        parser.add_argument('--attempts', type=int, default=100, help='Issue attempts per desk for issue-desks')
+        parser.add_argument('--emails', type=int, default=200, help='Reminder emails for the smtp benchmark')
+        parser.add_argument('--connect-ms', type=float, nargs='+', default=[0, 50],
+                            help='Delay before the local SMTP sink greets a new connection, standing in '
+                                 'for the TCP and TLS handshakes with a real server')
+
+    def handle(self, *args, **options):
+        target = options['target']
+        self.stdout.write(f'Database backend: {connection.vendor}')
+
+        if target == 'date-filters':
+            self.bench_date_filters()
+        elif target == 'row-formatting':
+            self.bench_row_formatting(options['rows'])
+        elif target == 'kiosk-sessions':
+            self.bench_kiosk_sessions(options['scans'])
+        elif target == 'suggest':
+            self.bench_suggest(options['books'], options['queries'])
+        elif target == 'fuzzy':
+            self.bench_fuzzy(options['books'], options['queries'])
+        elif target == 'issue-desks':
+            self.bench_issue_desks(options['desks'], options['attempts'])
+        elif target == 'smtp':
+            self.bench_smtp(options['emails'], options['connect_ms'])
+
+    def explain(self, label, queryset):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(queryset.explain())
+        self.stdout.write('')
+
+    def bench_date_filters(self):
+        """
+        Print the query plans of the old `__date` lookups next to the
+        half-open datetime ranges used by the reports and reminder task.
+        """
+        today = timezone.localdate()
+        week_ago = today - timedelta(days=7)
+
+        self.explain(
+            'LibraryLog: entry_time__date range (old)',
+            LibraryLog.objects.filter(entry_time__date__gte=week_ago, entry_time__date__lte=today),
+        )
+        self.explain(
+            'LibraryLog: entry_time datetime range (new)',
+            LibraryLog.objects.filter(**date_range_filter('entry_time', week_ago, today)),
+        )
+        self.explain(
+            'Transaction: issue_date__date equality (old)',
+            Transaction.objects.filter(issue_date__date=week_ago, returned=False),
+        )
+        self.explain(
+            'Transaction: issue_date datetime range (new)',
+            Transaction.objects.filter(**date_range_filter('issue_date', week_ago, week_ago), returned=False),
+        )
+
+    def bench_row_formatting(self, row_counts):
+        """
+        Time the Entry-Exit row formatting: the old per-row strftime/divmod
+        loop against the vectorised chunk formatter, on synthetic rows
+        (no database involved) fed in EXPORT_CHUNK_SIZE chunks.
+        """
+        rng = random.Random(42)
+        start = datetime(2024, 1, 1, 3, 30, tzinfo=dt_timezone.utc)
+        chunks = []
+        for _ in range(10):
+            chunk = []
+            for i in range(reports.EXPORT_CHUNK_SIZE):
+                entry = start + timedelta(seconds=rng.randrange(180 * 86400), microseconds=rng.randrange(10 ** 6))
+                exit_ = None if rng.random() < 0.05 else entry + timedelta(seconds=rng.randrange(6 * 3600))
+                chunk.append((f'2301801070{i:02d}', f'Student {i}', 'Computer', '9876543210', entry, exit_))
+            chunks.append(chunk)
+
+        for rows in row_counts:
+            batches = [chunks[i % len(chunks)] for i in range(-(-rows // reports.EXPORT_CHUNK_SIZE))]
+
+            began = time.perf_counter()
+            legacy = 0
+            for chunk in batches:
+                for row in _legacy_entry_exit_rows(chunk):
+                    legacy += 1
+            legacy_time = time.perf_counter() - began
+
+            began = time.perf_counter()
+            vectorised = 0
+            for chunk in batches:
+                for row in reports.format_entry_exit_chunk(chunk):
+                    vectorised += 1
+            vectorised_time = time.perf_counter() - began
+
+            mismatches = sum(
+                list(new) != old
+                for chunk in chunks
+                for new, old in zip(reports.format_entry_exit_chunk(chunk), _legacy_entry_exit_rows(chunk))
+            )
+            self.stdout.write(
+                f'{legacy:>9,} rows | per-row loop {legacy_time:7.2f}s | '
+                f'vectorised {vectorised_time:7.2f}s | speedup {legacy_time / vectorised_time:4.1f}x | '
+                f'mismatched rows {mismatches}'
+            )
+
+    def bench_kiosk_sessions(self, scans):
+        """
+        Count database writes per kiosk scan (POST plus the redirected GET
+        that shows the message), with session-backed flash messages and with
+        the configured message storage. Everything is rolled back afterwards.
+        """
+        setups = [
+            ('session-backed messages', {
+                'MESSAGE_STORAGE': 'django.contrib.messages.storage.session.SessionStorage',
+                'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+            }),
+            ('configured', {}),
+        ]
+        for label, overrides in setups:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver'], **overrides):
+                student = Student.objects.create(
+                    enrollment_id='BENCH-KIOSK', name='Benchmark Student', email='bench@example.com'
+                )
+                client = Client()
+                began = time.perf_counter()
+                with CaptureQueriesContext(connection) as captured:
+                    for _ in range(scans):
+                        response = client.post('/kiosk/', {'barcode': student.enrollment_id})
+                        client.get(response['Location'])
+                elapsed = time.perf_counter() - began
+
+                writes = [
+                    q['sql'] for q in captured.captured_queries
+                    if q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+                ]
+                session_queries = sum('django_session' in q['sql'] for q in captured.captured_queries)
+                session_writes = sum('django_session' in sql for sql in writes)
+                self.stdout.write(
+                    f'{label:<24} | {scans} scans in {elapsed:6.2f}s | '
+                    f'writes/scan {len(writes) / scans:4.1f} | '
+                    f'django_session queries {session_queries} (writes {session_writes})'
+                )
+                transaction.set_rollback(True)
+
+    def bench_suggest(self, books, queries):
+        """
+        Build the typeahead index over a synthetic catalogue and time random
+        1-4 character prefix lookups against the targets: build within
+        SUGGEST_INDEX_MAX_MB and p99 lookup under SUGGEST_P99_TARGET_MS.
+        No database access.
+        """
+        rng = random.Random(16)
+        words = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 10)))
+                 for _ in range(5000)]
+        rows = [
+            (f'AC{n:07d}',
+             ' '.join(rng.choice(words) for _ in range(rng.randint(2, 6))).title(),
+             ' '.join(rng.choice(words) for _ in range(2)).title())
+            for n in range(books)
+        ]
+        budget_mb = settings.SUGGEST_INDEX_MAX_MB
+        index = SuggestIndex()
+        # The synthetic catalogue isn't in the database, so the staleness
+        # check (a book count) must not trigger a rebuild from it
+        with patch.object(SuggestIndex, '_book_rows', staticmethod(lambda: iter(rows))), \
+                patch.object(SuggestIndex, '_ensure_fresh', lambda self: None):
+            began = time.perf_counter()
+            index.reload()
+            build_time = time.perf_counter() - began
+            # Second build under tracemalloc, which would skew the timing above
+            tracemalloc.start()
+            traced = SuggestIndex()
+            traced.reload()
+            retained_mb, peak_mb = (size / 1024 / 1024 for size in tracemalloc.get_traced_memory())
+            tracemalloc.stop()
+            del traced
+            packed = index._packed
+            estimated_mb = packed.nbytes / 1024 / 1024 if packed else 0.0
+            self.stdout.write(
+                f'{books:,} books | built in {build_time:5.2f}s | '
+                f'{packed.tiers_indexed if packed else 0}/3 key tiers | '
+                f'estimated {estimated_mb:6.1f} MB, retained {retained_mb:6.1f} MB, '
+                f'build peak {peak_mb:6.1f} MB (budget {budget_mb} MB)'
+            )
+
+            prefixes = [rng.choice(words)[:rng.randint(1, 4)] for _ in range(queries)]
+            timings = []
+            for prefix in prefixes:
+                began = time.perf_counter()
+                index.suggest(prefix)
+                timings.append(time.perf_counter() - began)
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1000
+        p99 = timings[int(len(timings) * 0.99)] * 1000
+        within = p99 <= SUGGEST_P99_TARGET_MS and estimated_mb <= budget_mb
+        self.stdout.write(
+            f'{queries:,} lookups | p50 {p50:6.3f} ms | p99 {p99:6.3f} ms '
+            f'(target {SUGGEST_P99_TARGET_MS} ms) | '
+            + (self.style.SUCCESS('within targets') if within else self.style.ERROR('over target'))
+        )
+
+
+    def bench_fuzzy(self, books, queries):
+        """
+        Build the fuzzy-search vocabulary from a synthetic catalogue (titles
+        drawn from 40,000 words with Zipf-like frequencies), then correct
+        words with one typo (swap, deletion or substitution) and report how
+        often the original word comes back, and how fast.
+        No database access.
+        """
+        rng = random.Random(18)
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        vocabulary = sorted({''.join(rng.choice(letters) for _ in range(rng.randint(4, 12))) for _ in range(40_000)})
+        rng.shuffle(vocabulary)
+        cumulative = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+        rows = [
+            (' '.join(rng.choices(vocabulary, cum_weights=cumulative, k=rng.randint(2, 6))), '')
+            for _ in range(books)
+        ]
+
+        index = FuzzyIndex()
+        with patch.object(FuzzyIndex, '_book_rows', staticmethod(lambda: iter(rows))), \
+                patch.object(FuzzyIndex, '_ensure_fresh', lambda self: None):
+            began = time.perf_counter()
+            index.reload()
+            build_time = time.perf_counter() - began
+            tracemalloc.start()
+            traced = FuzzyIndex()
+            traced.reload()
+            retained_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+            tracemalloc.stop()
+            del traced
+            self.stdout.write(
+                f'{books:,} titles | {len(index._index):,} distinct words | '
+                f'built in {build_time:5.2f}s | retained {retained_mb:5.1f} MB'
+            )
+
+            def typo(word):
+                i = rng.randrange(len(word) - 1)
+                edit = rng.randrange(3)
+                if edit == 0:
+                    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+                if edit == 1:
+                    return word[:i] + word[i + 1:]
+                return word[:i] + rng.choice(letters.replace(word[i], '')) + word[i + 1:]
+
+            candidates = [word for word in index._index.words if len(word) >= 5]
+            timings, recovered = [], 0
+            for _ in range(queries):
+                word = rng.choice(candidates)
+                began = time.perf_counter()
+                corrected = index.closest(typo(word))
+                timings.append(time.perf_counter() - began)
+                recovered += corrected == word
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1000
+        p99 = timings[int(len(timings) * 0.99)] * 1000
+        self.stdout.write(
+            f'{queries:,} misspelt words | original recovered {recovered / queries:6.1%} | '
+            f'p50 {p50:6.3f} ms | p99 {p99:6.3f} ms (target {FUZZY_P99_TARGET_MS} ms) | '
+            + (self.style.SUCCESS('within target') if p99 <= FUZZY_P99_TARGET_MS else self.style.ERROR('over target'))
+        )
+
+    def bench_issue_desks(self, desk_counts, attempts):
+        """
+        Stress circulation.issue_book from several desks (threads, each with
+        its own database connection) racing for a small pool of books. A
+        desk returns each book it gets straight away, so the same books are
+        fought over all the time. A desk holds a book from its issue until
+        its return commits; two desks holding one book at once is a double
+        issue; at the end no book may be out of step with its loans.
+        Writes BENCH-* rows to the configured database and deletes them.
+        """
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.stdout.write(f'SQLite journal mode: {cursor.fetchone()[0]}, '
+                                  f'transaction mode: {connection.settings_dict["OPTIONS"].get("transaction_mode", "DEFERRED")}')
+
+        for desks in desk_counts:
+            students = Student.objects.bulk_create([
+                Student(enrollment_id=f'BENCH-{n:04d}', name=f'Bench Student {n}', email=f'bench{n}@example.com')
+                for n in range(desks)
+            ])
+            books = Book.objects.bulk_create([
+                Book(access_code=f'BENCH-{n:04d}', title=f'Bench Book {n}', shelf_location='BENCH')
+                for n in range(max(desks // 2, 2))
+            ])
+            held, held_lock = set(), threading.Lock()
+            counts = {'issued': 0, 'lost': 0, 'errors': 0, 'double': 0}
+            start = threading.Barrier(desks)
+
+            def desk(number):
+                rng = random.Random(number)
+                student = students[number]
+                tally = {'issued': 0, 'lost': 0, 'errors': 0, 'double': 0}
+                try:
+                    start.wait()
+                    for _ in range(attempts):
+                        book = rng.choice(books)
+                        try:
+                            loan = circulation.issue_book(student, book)
+                        except circulation.BookUnavailable:
+                            tally['lost'] += 1
+                            continue
+                        except DatabaseError:
+                            tally['errors'] += 1
+                            continue
+                        with held_lock:
+                            if book.pk in held:
+                                tally['double'] += 1
+                            held.add(book.pk)
+                        tally['issued'] += 1
+                        # Hold the book until the return is about to commit: no
+                        # other desk can issue it before then, and the next one
+                        # to win it finds it let go
+                        with transaction.atomic():
+                            circulation.return_book(loan)
+                            with held_lock:
+                                held.discard(book.pk)
+                finally:
+                    with held_lock:
+                        for key, value in tally.items():
+                            counts[key] += value
+                    connection.close()
+
+            threads = [threading.Thread(target=desk, args=(n,)) for n in range(desks)]
+            began = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - began
+
+            bench_books = Book.objects.filter(access_code__startswith='BENCH-')
+            open_loans = Transaction.objects.filter(book__in=bench_books, returned=False).count()
+            with transaction.atomic():
+                out_of_step = circulation.sync_books(bench_books)
+                transaction.set_rollback(True)
+            total = desks * attempts
+            self.stdout.write(
+                f'{desks:>3} desks | {total:,} attempts in {elapsed:6.2f}s ({total / elapsed:7.1f}/s) | '
+                f'issued+returned {counts["issued"]:,} ({counts["issued"] / elapsed:6.1f}/s) | '
+                f'lost races {counts["lost"]:,} | db errors {counts["errors"]} | '
+                f'double issues {counts["double"]} | open loans left {open_loans} | out of step {out_of_step}'
+            )
+            Transaction.objects.filter(book__in=bench_books).delete()
+            bench_books.delete()
+            Student.objects.filter(enrollment_id__startswith='BENCH-').delete()
+
+    def bench_smtp(self, emails, connect_delays_ms):
+        """
+        Reminder emails sent to a local SMTP sink: one connection per email
+        (EmailMessage.send(), as the reminder job used to) against
+        reminders.send_emails (one connection per EMAIL_BATCH_SIZE emails).
+        The sink can wait before greeting each new connection, which is
+        where the cost of a real server's handshakes goes.
+        """
+        loans = [
+            SimpleNamespace(
+                student=SimpleNamespace(name=f'Bench Student {n}', enrollment_id=f'BENCH-{n:04d}',
+                                        email=f'bench{n}@example.com'),
+                book=SimpleNamespace(title=f'Bench Book {n}', access_code=f'BENCH-{n:04d}', shelf_location='BENCH'),
+                issue_date=timezone.now() - timedelta(days=14),
+                due_date=timezone.now() + timedelta(days=1),
+            )
+            for n in range(emails)
+        ]
+        for delay_ms in connect_delays_ms:
+            sink = _SmtpSink(delay_ms / 1000)
+            threading.Thread(target=sink.serve_forever, daemon=True).start()
+            try:
+                smtp_settings = override_settings(
+                    EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                    EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.server_address[1], EMAIL_USE_TLS=False,
+                    EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+                )
+                with smtp_settings:
+                    messages = [reminders.reminder_email(loan) for loan in loans]
+                    began = time.perf_counter()
+                    for message in messages:
+                        message.send(fail_silently=False)
+                    per_email = time.perf_counter() - began, sink.reset()
+
+                    messages = [reminders.reminder_email(loan) for loan in loans]
+                    began = time.perf_counter()
+                    sent, failed = reminders.send_emails(messages)
+                    batched = time.perf_counter() - began, sink.reset()
+            finally:
+                sink.shutdown()
+                sink.server_close()
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{emails} reminders, sink greeting delay {delay_ms:g} ms, batch size {settings.EMAIL_BATCH_SIZE}'
+            ))
+            for label, (elapsed, (connections, received)) in (('connection per email', per_email),
+                                                               ('send_emails', batched)):
+                self.stdout.write(
+                    f'  {label:<21} {elapsed:7.2f}s  {received / elapsed:8.1f} emails/s  '
+                    f'{connections:4} connection(s)  {received} received'
+                )
+            if failed:
+                self.stdout.write(self.style.ERROR(f'  send_emails reported {failed} failure(s)'))
+            self.stdout.write(f'  speed-up: {per_email[0] / batched[0]:.1f}x ({sent} sent)')
+
+
+class _SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: accepts and discards every message."""
+
+    def handle(self):
+        sink = self.server
+        sink.count(connections=1)
+        time.sleep(sink.connect_delay)
+        self.wfile.write(b'220 bench-sink ESMTP\r\n')
+        for line in self.rfile:
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.wfile.write(b'250-bench-sink\r\n250 8BITMIME\r\n')
+            elif command == b'DATA':
+                self.wfile.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                sink.count(messages=1)
+                self.wfile.write(b'250 OK\r\n')
+            elif command == b'QUIT':
+                self.wfile.write(b'221 Bye\r\n')
+                return
+            else:
+                # HELO, MAIL FROM, RCPT TO, RSET, NOOP
+                self.wfile.write(b'250 OK\r\n')
+
+
+class _SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self, connect_delay):
+        super().__init__(('127.0.0.1', 0), _SmtpSinkHandler)
+        self.connect_delay = connect_delay
+        self._lock = threading.Lock()
+        self.connections = self.messages = 0
+
+    def count(self, connections=0, messages=0):
+        with self._lock:
+            self.connections += connections
+            self.messages += messages
+
+    def reset(self):
+        """(connections, messages) since the last reset."""
+        with self._lock:
+            counts = self.connections, self.messages
+            self.connections = self.messages = 0
+        return counts
+
+
+def _legacy_entry_exit_rows(chunk):
+    """The per-row formatting the Entry-Exit report used before vectorisation."""
+    for enrollment_id, name, department, mobile_no, entry_time, exit_time in chunk:
+        if exit_time:
+            duration = exit_time - entry_time
+            hours, remainder = divmod(int(duration.total_seconds()), 3600)
+            minutes, seconds = divmod(remainder, 60)
+            duration_str = f'{hours}h {minutes}m {seconds}s'
+        else:
+            duration_str = 'Still Inside'
+        yield [
+            enrollment_id, name, department, mobile_no,
+            entry_time.strftime('%Y-%m-%d %H:%M:%S'),
+            exit_time.strftime('%Y-%m-%d %H:%M:%S') if exit_time else 'Still Inside',
+            duration_str,
+        ]
@@ -2,6 +2,9 @@ import csv
 import os
 from django.core.management.base import BaseCommand
 from management.models import Student, Book
+from management.isbn import normalize_isbn
+from management import data_versions
+from management.search_cache import bump_catalogue_version
 
 class Command(BaseCommand):
     help = 'Import Students or Books from a CSV file.'
@@ -87,11 +90,14 @@ class Command(BaseCommand):
                 pages_val = row.get('pages', '').strip()
                 pages = int(pages_val) if pages_val.isdigit() else None
 
+                isbn_no = row.get('isbn_no', '').strip() or None
                 books_to_create.append(Book(
                     access_code=acid,
                     title=row.get('title', '').strip(),
                     author=row.get('author', '').strip(),
-                    isbn_no=row.get('isbn_no', '').strip() or None,
+                    isbn_no=isbn_no,
+                    # bulk_create skips Book.save(), which normally sets this
+                    isbn13=normalize_isbn(isbn_no),
                     pages=pages,
                     edition=row.get('edition', '').strip() or None,
                     allocated_department=row.get('allocated_department', '').strip() or None,
@@ -109,4 +115,9 @@ class Command(BaseCommand):
         if books_to_create:
             Book.objects.bulk_create(books_to_create)
 
+        # bulk_create sends no post_save, so invalidate what the signals would have
+        if count:
+            data_versions.bump_version(data_versions.BOOKS)
+            bump_catalogue_version()
+
         self.stdout.write(self.style.SUCCESS(f'Successfully imported {count} books.'))
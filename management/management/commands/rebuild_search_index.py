@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from management.search_index import fulltext_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Refill the full-text book search index from the book table.'
+
+    def handle(self, *args, **options):
+        backend = fulltext_backend()
+        if backend is None:
+            self.stdout.write(self.style.WARNING('No full-text index on this database; search uses substring matching.'))
+            return
+        count = rebuild_index()
+        if backend == 'mysql':
+            self.stdout.write(f'MySQL maintains the FULLTEXT index itself ({count} books).')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Indexed {count} books.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from management.models import LibraryLog, VisitCounter
+from management.visit_counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the dashboard visit counters from the library logs.'
+
+    def handle(self, *args, **options):
+        before = VisitCounter.objects.aggregate(total=Sum('visits'))['total'] or 0
+        rows = rebuild_counters()
+        after = VisitCounter.objects.aggregate(total=Sum('visits'))['total'] or 0
+
+        self.stdout.write(f'Library logs: {LibraryLog.objects.count()}')
+        self.stdout.write(f'Counted visits before: {before}, after: {after} ({rows} counter rows)')
+        if before == after:
+            self.stdout.write(self.style.SUCCESS('Counters were already in sync.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Corrected the counters by {after - before:+d} visit(s).'))
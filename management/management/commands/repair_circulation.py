@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from management.circulation import sync_books
+from management.models import Book
+
+
+class Command(BaseCommand):
+    help = "Set every book's status and current holder from its open loan (Transaction)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many books are out of step')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = sync_books()
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(f'Books: {Book.objects.count()}, issued: {Book.objects.filter(status="Issued").count()}')
+        if not fixed:
+            self.stdout.write(self.style.SUCCESS('Book status was already in step with the loans.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{fixed} book(s) out of step; run without --dry-run to fix.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Corrected {fixed} book(s).'))
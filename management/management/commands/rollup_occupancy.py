@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from management.occupancy_rollup import run_rollup
+
+
+class Command(BaseCommand):
+    help = 'Fold closed library sessions into the hourly occupancy rollup.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the rollup and recompute it from all logs')
+
+    def handle(self, *args, **options):
+        folded = run_rollup(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f'Folded {folded} session(s) into the hourly rollup.'))
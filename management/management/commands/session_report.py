@@ -0,0 +1,34 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from management.tasks import clear_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Report the size and growth of the django_session table, optionally deleting expired rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cleanup', action='store_true', help='Delete expired sessions after reporting')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        max_age = timedelta(seconds=settings.SESSION_COOKIE_AGE)
+        sessions = Session.objects.all()
+
+        total = sessions.count()
+        expired = sessions.filter(expire_date__lt=now).count()
+        self.stdout.write(f'Session engine: {settings.SESSION_ENGINE}')
+        self.stdout.write(f'Message storage: {settings.MESSAGE_STORAGE}')
+        self.stdout.write(f'Sessions: {total} ({expired} expired)')
+
+        # Rows are created with expire_date = now + SESSION_COOKIE_AGE, so the
+        # expiry date tells roughly when a session was last written.
+        for label, window in (('24 hours', timedelta(days=1)), ('7 days', timedelta(days=7))):
+            written = sessions.filter(expire_date__gte=now + max_age - window).count()
+            self.stdout.write(f'Written in the last {label}: {written}')
+
+        if options['cleanup']:
+            clear_expired_sessions()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {expired} expired session(s).'))
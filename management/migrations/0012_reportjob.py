@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0011_book_allocated_department_book_edition_book_isbn_no_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(choices=[('entry_exit', 'Entry-Exit Report'), ('book_issues', 'Book Issues Report'), ('overdue', 'Overdue Students Report')], max_length=20)),
+                ('file_format', models.CharField(choices=[('xlsx', 'Excel'), ('csv', 'CSV')], default='xlsx', max_length=4)),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Filters the report was generated with.')),
+                ('params_key', models.CharField(db_index=True, help_text='Hash of report type, format and filters; identical requests share it.', max_length=64)),
+                ('data_version', models.CharField(help_text='Version of the source tables when the job was requested.', max_length=200)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Running', 'Running'), ('Done', 'Done'), ('Failed', 'Failed')], default='Pending', max_length=20)),
+                ('file_path', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Report Job',
+                'verbose_name_plural': 'Report Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
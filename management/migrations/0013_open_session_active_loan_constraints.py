@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:53
+
+from django.db import migrations, models
+
+
+def close_duplicate_open_rows(apps, schema_editor):
+    """
+    The unique constraints below can't be created while duplicates exist.
+    A student with several open sessions must have left before the latest
+    entry, so the older sessions are closed at that entry time; a book with
+    several active loans must have come back before it was issued again, so
+    the older loans are marked returned.
+    """
+    LibraryLog = apps.get_model('management', 'LibraryLog')
+    Transaction = apps.get_model('management', 'Transaction')
+
+    latest_entry = {}
+    for log_id, student_id, entry_time in (
+        LibraryLog.objects.filter(exit_time__isnull=True)
+        .order_by('student_id', '-entry_time', '-id')
+        .values_list('id', 'student_id', 'entry_time')
+    ):
+        if student_id in latest_entry:
+            LibraryLog.objects.filter(pk=log_id).update(exit_time=latest_entry[student_id])
+        else:
+            latest_entry[student_id] = entry_time
+
+    seen_books = set()
+    for tx_id, book_id in (
+        Transaction.objects.filter(returned=False)
+        .order_by('book_id', '-issue_date', '-id')
+        .values_list('id', 'book_id')
+    ):
+        if book_id in seen_books:
+            Transaction.objects.filter(pk=tx_id).update(returned=True)
+        else:
+            seen_books.add(book_id)
+
+
+# MySQL has no partial indexes: Django creates the conditional indexes
+# above as plain full-table indexes and skips the conditional unique
+# constraints. The constraints are emulated with generated columns that
+# hold the key only while the row is "open" and NULL otherwise; a unique
+# index ignores NULLs, which gives the same guarantee. Composite indexes
+# led by the flag column stand in for the partial lookup indexes.
+MYSQL_FORWARD = [
+    "ALTER TABLE management_librarylog"
+    " ADD COLUMN open_student_id varchar(12)"
+    " GENERATED ALWAYS AS (IF(exit_time IS NULL, student_id, NULL)) VIRTUAL,"
+    " ADD UNIQUE INDEX uniq_open_log_per_student (open_student_id)",
+    "ALTER TABLE management_transaction"
+    " ADD COLUMN active_book_id varchar(50)"
+    " GENERATED ALWAYS AS (IF(returned = 0, book_id, NULL)) VIRTUAL,"
+    " ADD UNIQUE INDEX uniq_active_loan_per_book (active_book_id)",
+    "CREATE INDEX idx_open_log_entry_mysql ON management_librarylog (exit_time, entry_time)",
+    "CREATE INDEX idx_active_loan_due_mysql ON management_transaction (returned, due_date)",
+    "CREATE INDEX idx_active_loan_student_mysql ON management_transaction (student_id, returned)",
+]
+MYSQL_BACKWARD = [
+    "DROP INDEX idx_active_loan_student_mysql ON management_transaction",
+    "DROP INDEX idx_active_loan_due_mysql ON management_transaction",
+    "DROP INDEX idx_open_log_entry_mysql ON management_librarylog",
+    "ALTER TABLE management_transaction DROP INDEX uniq_active_loan_per_book, DROP COLUMN active_book_id",
+    "ALTER TABLE management_librarylog DROP INDEX uniq_open_log_per_student, DROP COLUMN open_student_id",
+]
+
+
+def mysql_emulation_forward(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        for statement in MYSQL_FORWARD:
+            schema_editor.execute(statement)
+
+
+def mysql_emulation_backward(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        for statement in MYSQL_BACKWARD:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0012_reportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_rows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='librarylog',
+            index=models.Index(condition=models.Q(('exit_time__isnull', True)), fields=['-entry_time'], name='idx_open_log_entry'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('returned', False)), fields=['due_date'], name='idx_active_loan_due'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('returned', False)), fields=['student'], name='idx_active_loan_student'),
+        ),
+        migrations.AddConstraint(
+            model_name='librarylog',
+            constraint=models.UniqueConstraint(condition=models.Q(('exit_time__isnull', True)), fields=('student',), name='uniq_open_log_per_student', violation_error_message='This student already has an open library session.'),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('returned', False)), fields=('book',), name='uniq_active_loan_per_book', violation_error_message='This book is already issued and has not been returned.'),
+        ),
+        migrations.RunPython(mysql_emulation_forward, mysql_emulation_backward),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0013_open_session_active_loan_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KioskScanEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(help_text='Client-generated id of the scan (e.g. a UUID).', max_length=64, unique=True)),
+                ('barcode', models.CharField(max_length=50)),
+                ('scanned_at', models.DateTimeField(help_text='When the kiosk scanned the card (device clock).')),
+                ('received_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('result', models.CharField(choices=[('in', 'Checked In'), ('out', 'Checked Out'), ('unknown', 'Unknown Student'), ('invalid', 'Invalid Barcode')], max_length=10)),
+            ],
+            options={
+                'verbose_name': 'Kiosk Scan Event',
+                'verbose_name_plural': 'Kiosk Scan Events',
+                'ordering': ['-received_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='librarylog',
+            name='entry_time',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+    ]
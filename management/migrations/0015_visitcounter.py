@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:01
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def count_existing_visits(apps, schema_editor):
+    """Start the counters from the logs already in the database."""
+    LibraryLog = apps.get_model('management', 'LibraryLog')
+    VisitCounter = apps.get_model('management', 'VisitCounter')
+    buckets = (
+        LibraryLog.objects
+        .annotate(day=TruncDate('entry_time'))
+        .values('day', 'student__department')
+        .annotate(visits=Count('pk'))
+        .order_by()
+    )
+    VisitCounter.objects.bulk_create(
+        [VisitCounter(day=row['day'], department=row['student__department'] or '', visits=row['visits'])
+         for row in buckets],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0014_kioskscanevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Local date of the entries.')),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('visits', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Visit Counter',
+                'verbose_name_plural': 'Visit Counters',
+                'ordering': ['-day', 'department'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'department'), name='uniq_visit_counter_day_department')],
+            },
+        ),
+        migrations.RunPython(count_existing_visits, migrations.RunPython.noop),
+    ]
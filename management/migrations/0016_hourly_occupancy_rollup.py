@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0015_visitcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_log_id', models.BigIntegerField(default=0, help_text='Highest LibraryLog id the rollup has looked at.')),
+                ('pending_log_ids', models.JSONField(blank=True, default=list, help_text='Logs at or below last_log_id that were still open; folded in once closed.')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Rollup Watermark',
+                'verbose_name_plural': 'Rollup Watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the (local) hour.')),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('visits', models.PositiveIntegerField(default=0, help_text='Sessions that started in this hour.')),
+                ('dwell_seconds', models.PositiveBigIntegerField(default=0, help_text='Total length of the sessions that started in this hour.')),
+                ('occupied_seconds', models.PositiveBigIntegerField(default=0, help_text='Student-seconds spent inside during this hour; / 3600 gives the average occupancy.')),
+            ],
+            options={
+                'verbose_name': 'Hourly Occupancy',
+                'verbose_name_plural': 'Hourly Occupancy',
+                'ordering': ['hour', 'department'],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'department'), name='uniq_hourly_occupancy_hour_department')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+from django.db import migrations
+
+FTS_TABLE = 'management_book_fts'
+BOOK_TABLE = 'management_book'
+
+# The index keeps its own copy of the searchable columns. Rows are matched
+# by access_code, and the update trigger only fires for the indexed columns,
+# so issuing/returning a book (a status change) never touches the index.
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        access_code UNINDEXED, title, author, isbn_no,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {BOOK_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} (access_code, title, author, isbn_no)
+        VALUES (new.access_code, new.title, COALESCE(new.author, ''), COALESCE(new.isbn_no, ''));
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {BOOK_TABLE} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE access_code = old.access_code;
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF access_code, title, author, isbn_no ON {BOOK_TABLE} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE access_code = old.access_code;
+        INSERT INTO {FTS_TABLE} (access_code, title, author, isbn_no)
+        VALUES (new.access_code, new.title, COALESCE(new.author, ''), COALESCE(new.isbn_no, ''));
+    END""",
+    f"""INSERT INTO {FTS_TABLE} (access_code, title, author, isbn_no)
+        SELECT access_code, title, COALESCE(author, ''), COALESCE(isbn_no, '') FROM {BOOK_TABLE}""",
+]
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+MYSQL_FORWARD = [f"ALTER TABLE {BOOK_TABLE} ADD FULLTEXT INDEX book_fulltext (title, author, isbn_no)"]
+MYSQL_BACKWARD = [f"ALTER TABLE {BOOK_TABLE} DROP INDEX book_fulltext"]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def _has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and _has_fts5(schema_editor.connection):
+        _run(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'mysql':
+        _run(schema_editor, MYSQL_FORWARD)
+    # Elsewhere (or without FTS5) the search page keeps using substring search
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+    elif vendor == 'mysql':
+        _run(schema_editor, MYSQL_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0016_hourly_occupancy_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:20
+
+from django.db import migrations, models
+
+from management.isbn import normalize_isbn
+
+
+def fill_isbn13(apps, schema_editor):
+    """Normalise the ISBNs already in the catalogue."""
+    Book = apps.get_model('management', 'Book')
+    batch = []
+    books = Book.objects.exclude(isbn_no__isnull=True).exclude(isbn_no='').only('access_code', 'isbn_no')
+    for book in books.iterator(chunk_size=2000):
+        book.isbn13 = normalize_isbn(book.isbn_no)
+        if book.isbn13:
+            batch.append(book)
+        if len(batch) >= 2000:
+            Book.objects.bulk_update(batch, ['isbn13'])
+            batch = []
+    Book.objects.bulk_update(batch, ['isbn13'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0018_book_title_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn13',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Canonical form of the ISBN No, set on save.', max_length=13, null=True, verbose_name='ISBN-13'),
+        ),
+        migrations.RunPython(fill_isbn13, migrations.RunPython.noop),
+    ]
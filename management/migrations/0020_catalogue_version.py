@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:31
+
+import uuid
+
+from django.db import migrations, models
+
+
+def create_row(apps, schema_editor):
+    CatalogueVersion = apps.get_model('management', 'CatalogueVersion')
+    CatalogueVersion.objects.get_or_create(pk=1, defaults={'version': uuid.uuid4().hex})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0019_book_isbn13'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(default='', max_length=32)),
+            ],
+            options={
+                'verbose_name': 'Catalogue Version',
+                'verbose_name_plural': 'Catalogue Version',
+            },
+        ),
+        migrations.RunPython(create_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef, Subquery
+
+
+def sync_book_status(apps, schema_editor):
+    """Set status and current_holder from the open loans (see circulation.sync_books)."""
+    Book = apps.get_model('management', 'Book')
+    Transaction = apps.get_model('management', 'Transaction')
+    open_loans = Transaction.objects.filter(book=OuterRef('pk'), returned=False)
+    Book.objects.filter(Exists(open_loans)).update(
+        status='Issued', current_holder=Subquery(open_loans.order_by().values('student')[:1])
+    )
+    Book.objects.exclude(Exists(open_loans)).update(status='Available', current_holder=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0020_catalogue_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(sync_book_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0021_sync_book_circulation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='kioskscanevent',
+            name='result',
+            field=models.CharField(choices=[('in', 'Checked In'), ('out', 'Checked Out'), ('unknown', 'Unknown Student'), ('invalid', 'Invalid Barcode'), ('expired', 'Too Old')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:17
+
+import uuid
+
+from django.db import migrations, models
+
+TABLES = ['library_logs', 'transactions', 'students', 'books', 'renew_requests']
+
+
+def create_rows(apps, schema_editor):
+    DataVersion = apps.get_model('management', 'DataVersion')
+    for name in TABLES:
+        DataVersion.objects.get_or_create(name=name, defaults={'version': uuid.uuid4().hex})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0022_kioskscanevent_expired'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.CharField(max_length=32)),
+            ],
+            options={
+                'verbose_name': 'Data Version',
+                'verbose_name_plural': 'Data Versions',
+            },
+        ),
+        migrations.RunPython(create_rows, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.utils import timezone
 from django.core.validators import RegexValidator
 from datetime import timedelta
+from .isbn import normalize_isbn
 
 
 class Student(models.Model):
@@ -63,6 +64,10 @@ class Book(models.Model):
     title = models.CharField(max_length=200)
     author = models.CharField(max_length=200, blank=True, null=True)
     isbn_no = models.CharField(max_length=50, blank=True, null=True, verbose_name='ISBN No')
+    isbn13 = models.CharField(
+        max_length=13, blank=True, null=True, editable=False, db_index=True, verbose_name='ISBN-13',
+        help_text='Canonical form of the ISBN No, set on save.'
+    )
     pages = models.IntegerField(blank=True, null=True, verbose_name='Total Pages')
     edition = models.CharField(max_length=50, blank=True, null=True)
     allocated_department = models.CharField(max_length=100, choices=Student.DEPARTMENT_CHOICES, blank=True, null=True)
@@ -81,6 +86,18 @@ class Book(models.Model):
         ordering = ['title']
         verbose_name = 'Book'
         verbose_name_plural = 'Books'
+        indexes = [
+            # Sort key of the search page's keyset pagination
+            models.Index(fields=['title', 'access_code'], name='idx_book_title_code'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Keep the exact-match ISBN column in step with the free-form one
+        self.isbn13 = normalize_isbn(self.isbn_no)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'isbn_no' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'isbn13'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.title} ({self.access_code})"
@@ -93,7 +110,8 @@ class LibraryLog(models.Model):
         on_delete=models.CASCADE,
         related_name='library_logs'
     )
-    entry_time = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Not auto_now_add: scans buffered by a kiosk carry their own timestamp
+    entry_time = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     exit_time = models.DateTimeField(null=True, blank=True, db_index=True)
 
     class Meta:
@@ -102,6 +120,22 @@ class LibraryLog(models.Model):
         verbose_name_plural = 'Library Logs'
         indexes = [
             models.Index(fields=['student', 'exit_time'], name='idx_student_exit'),
+            # Who is inside right now (dashboard, admin stats), newest first
+            models.Index(
+                fields=['-entry_time'],
+                condition=models.Q(exit_time__isnull=True),
+                name='idx_open_log_entry',
+            ),
+        ]
+        constraints = [
+            # A student can have only one open session, even with several kiosks.
+            # MySQL has no partial indexes; migration 0013 emulates this there.
+            models.UniqueConstraint(
+                fields=['student'],
+                condition=models.Q(exit_time__isnull=True),
+                name='uniq_open_log_per_student',
+                violation_error_message='This student already has an open library session.',
+            ),
         ]
 
     @property
@@ -113,6 +147,34 @@ class LibraryLog(models.Model):
         return f"{self.student.name} - {self.entry_time:%Y-%m-%d %H:%M} ({status})"
 
 
+class KioskScanEvent(models.Model):
+    """A scan received through the kiosk API, kept so replayed events are ignored."""
+    RESULT_CHOICES = [
+        ('in', 'Checked In'),
+        ('out', 'Checked Out'),
+        ('unknown', 'Unknown Student'),
+        ('invalid', 'Invalid Barcode'),
+        ('expired', 'Too Old'),
+    ]
+    event_id = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text='Client-generated id of the scan (e.g. a UUID).'
+    )
+    barcode = models.CharField(max_length=50)
+    scanned_at = models.DateTimeField(help_text='When the kiosk scanned the card (device clock).')
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    result = models.CharField(max_length=10, choices=RESULT_CHOICES)
+
+    class Meta:
+        ordering = ['-received_at']
+        verbose_name = 'Kiosk Scan Event'
+        verbose_name_plural = 'Kiosk Scan Events'
+
+    def __str__(self):
+        return f"{self.barcode} at {self.scanned_at:%Y-%m-%d %H:%M} ({self.result})"
+
+
 class Transaction(models.Model):
     """Tracks book issue/return transactions."""
     student = models.ForeignKey(
@@ -133,6 +195,30 @@ class Transaction(models.Model):
         ordering = ['-issue_date']
         verbose_name = 'Transaction'
         verbose_name_plural = 'Transactions'
+        indexes = [
+            # Active loans by due date (overdue report, reminders, admin stats)
+            models.Index(
+                fields=['due_date'],
+                condition=models.Q(returned=False),
+                name='idx_active_loan_due',
+            ),
+            # Active loans of a student (issue desk, manual reminders)
+            models.Index(
+                fields=['student'],
+                condition=models.Q(returned=False),
+                name='idx_active_loan_student',
+            ),
+        ]
+        constraints = [
+            # A book can be on loan to only one student at a time.
+            # MySQL has no partial indexes; migration 0013 emulates this there.
+            models.UniqueConstraint(
+                fields=['book'],
+                condition=models.Q(returned=False),
+                name='uniq_active_loan_per_book',
+                violation_error_message='This book is already issued and has not been returned.',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         # Auto-set due_date to 14 days from now on first creation
@@ -178,3 +264,153 @@ class ManualReminderProxy(models.Model):
         managed = False
         verbose_name_plural = 'Manual Due Reminders'
 
+
+
+class ReportJob(models.Model):
+    """A report generated in the background and kept on disk for reuse."""
+    REPORT_CHOICES = [
+        ('entry_exit', 'Entry-Exit Report'),
+        ('book_issues', 'Book Issues Report'),
+        ('overdue', 'Overdue Students Report'),
+    ]
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel'),
+        ('csv', 'CSV'),
+    ]
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
+    report_type = models.CharField(max_length=20, choices=REPORT_CHOICES)
+    file_format = models.CharField(max_length=4, choices=FORMAT_CHOICES, default='xlsx')
+    params = models.JSONField(default=dict, blank=True, help_text='Filters the report was generated with.')
+    params_key = models.CharField(
+        max_length=64,
+        db_index=True,
+        help_text='Hash of report type, format and filters; identical requests share it.'
+    )
+    data_version = models.CharField(
+        max_length=200,
+        help_text='Version of the source tables when the job was requested.'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    file_path = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Report Job'
+        verbose_name_plural = 'Report Jobs'
+
+    def __str__(self):
+        return f"{self.get_report_type_display()} ({self.status})"
+
+
+class VisitCounter(models.Model):
+    """
+    Number of library entries per day and department, kept up to date as
+    logs are created so the dashboard never has to count LibraryLog rows.
+    Rebuilt from the logs by `manage.py reconcile_visit_counters`.
+    """
+    day = models.DateField(help_text='Local date of the entries.')
+    department = models.CharField(max_length=100, blank=True)
+    visits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day', 'department']
+        verbose_name = 'Visit Counter'
+        verbose_name_plural = 'Visit Counters'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'department'], name='uniq_visit_counter_day_department'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.department or '-'}: {self.visits}"
+
+
+class HourlyOccupancy(models.Model):
+    """
+    Closed library sessions folded into one row per local hour and
+    department by `occupancy_rollup.run_rollup`. Analytics read these rows
+    instead of the raw logs.
+    """
+    hour = models.DateTimeField(help_text='Start of the (local) hour.')
+    department = models.CharField(max_length=100, blank=True)
+    visits = models.PositiveIntegerField(default=0, help_text='Sessions that started in this hour.')
+    dwell_seconds = models.PositiveBigIntegerField(
+        default=0,
+        help_text='Total length of the sessions that started in this hour.'
+    )
+    occupied_seconds = models.PositiveBigIntegerField(
+        default=0,
+        help_text='Student-seconds spent inside during this hour; / 3600 gives the average occupancy.'
+    )
+
+    class Meta:
+        ordering = ['hour', 'department']
+        verbose_name = 'Hourly Occupancy'
+        verbose_name_plural = 'Hourly Occupancy'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'department'], name='uniq_hourly_occupancy_hour_department'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.department or '-'}"
+
+
+class RollupWatermark(models.Model):
+    """How far a rollup job has read the log table."""
+    name = models.CharField(max_length=50, unique=True)
+    last_log_id = models.BigIntegerField(default=0, help_text='Highest LibraryLog id the rollup has looked at.')
+    pending_log_ids = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='Logs at or below last_log_id that were still open; folded in once closed.'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Rollup Watermark'
+        verbose_name_plural = 'Rollup Watermarks'
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_log_id}"
+
+
+class CatalogueVersion(models.Model):
+    """
+    Version token of the book table, replaced in the same transaction as
+    every write to it, including imports from other processes; cached
+    search results are tagged with it. A single row.
+    """
+    # Random rather than a counter, like data_versions: a database restored
+    # from a backup can't bring back a token that later results were built on
+    version = models.CharField(max_length=32, default='')
+
+    class Meta:
+        verbose_name = 'Catalogue Version'
+        verbose_name_plural = 'Catalogue Version'
+
+    def __str__(self):
+        return f"Catalogue {self.version}"
+
+
+class DataVersion(models.Model):
+    """
+    Version token of one library table (see data_versions.py), replaced in
+    the same transaction as every write to the table, whichever process
+    makes it; cached reports and stats are tagged with it.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.CharField(max_length=32)
+
+    class Meta:
+        verbose_name = 'Data Version'
+        verbose_name_plural = 'Data Versions'
+
+    def __str__(self):
+        return f"{self.name} {self.version}"
@@ -0,0 +1,118 @@
+"""
+In-memory occupancy index for the kiosk.
+
+Maps each student who is currently inside to the id of their open
+LibraryLog, so a scan no longer has to search the log table to decide
+between check-in and check-out. The index is loaded from the database on
+first use (run_server.py warms it at startup) and updated on every toggle.
+Edits made elsewhere, e.g. in the admin, reach it through the LibraryLog
+signals in signals.py.
+
+The index lives in the server process. This is fine for the single
+waitress process started by run_server.py. With several server processes,
+a stale entry is harmless: closing a log is a conditional UPDATE, and if it
+changes no row the scan falls back to a check-in.
+"""
+import threading
+from django.db import IntegrityError, transaction
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import LibraryLog
+from . import data_versions
+from .live_feed import publish_check_out
+
+
+class OccupancyIndex:
+    """enrollment_id -> id of that student's open LibraryLog."""
+
+    def __init__(self):
+        # Re-entrant: a lookup may load the index first, under the same lock
+        self._lock = threading.RLock()
+        self._open = {}
+        self._loaded = False
+
+    def reload(self):
+        """
+        Rebuild the index from the open logs in the database. A plain read
+        under the lock: it never waits for writers (WAL on SQLite,
+        consistent reads on MySQL).
+        """
+        open_logs = (
+            LibraryLog.objects
+            .filter(exit_time__isnull=True)
+            .order_by('entry_time')
+            .values_list('student_id', 'pk')
+        )
+        with self._lock:
+            # Ordered oldest first, so the newest open log wins for a student
+            self._open = dict(open_logs)
+            self._loaded = True
+
+    def reset(self):
+        """Forget everything; the index is reloaded on next use."""
+        with self._lock:
+            self._open = {}
+            self._loaded = False
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.reload()
+
+    def open_log_id(self, enrollment_id):
+        with self._lock:
+            self._ensure_loaded()
+            return self._open.get(enrollment_id)
+
+    def is_inside(self, enrollment_id):
+        return self.open_log_id(enrollment_id) is not None
+
+    def mark_inside(self, enrollment_id, log_id):
+        with self._lock:
+            if self._loaded:
+                self._open[enrollment_id] = log_id
+
+    def mark_outside(self, enrollment_id, log_id=None):
+        """Drop the student's entry (only if it still points at `log_id`, when given)."""
+        with self._lock:
+            if log_id is None or self._open.get(enrollment_id) == log_id:
+                self._open.pop(enrollment_id, None)
+
+    def toggle(self, student, at=None):
+        """
+        Check `student` out if they are inside, otherwise check them in,
+        at time `at` (default: now). Returns 'in' or 'out'.
+        """
+        moment = at or timezone.now()
+        # The lock guards only the dict. The database writes below happen
+        # without it: a caller may already hold a write transaction (the scan
+        # API), so waiting on the lock there while another thread held it and
+        # waited on the database would stall both.
+        log_id = self.open_log_id(student.pk)
+        if log_id is not None:
+            # A backdated device clock can't close a session before it began
+            closed = LibraryLog.objects.filter(
+                pk=log_id, student=student, exit_time__isnull=True
+            ).update(exit_time=Greatest(F('entry_time'), Value(moment, output_field=DateTimeField())))
+            if closed:
+                self.mark_outside(student.pk, log_id)
+                # .update() skips post_save, so mark the logs as changed here
+                data_versions.bump_version(data_versions.LIBRARY_LOGS)
+                publish_check_out(log_id, student.pk)
+                return 'out'
+            # The log was closed or removed behind our back: treat as entry
+
+        try:
+            with transaction.atomic():
+                log = LibraryLog.objects.create(student=student, entry_time=moment)
+        except IntegrityError:
+            # Another kiosk (or server process) opened a session for this
+            # student a moment ago; the unique constraint kept it single.
+            log = LibraryLog.objects.filter(student=student, exit_time__isnull=True).first()
+            if log is None:
+                raise
+        self.mark_inside(student.pk, log.pk)
+        return 'in'
+
+
+occupancy_index = OccupancyIndex()
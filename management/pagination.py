@@ -0,0 +1,108 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, which makes the database walk past every earlier row,
+a page continues from the sort key of the last row shown:
+
+    WHERE (title, access_code) > (:last_title, :last_code)
+    ORDER BY title, access_code LIMIT :size
+
+so every page costs one index range scan, however deep the reader goes.
+Cursors are the sort-key values of a boundary row, JSON-encoded in an
+opaque URL-safe string.
+"""
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """Values encoded in `cursor`, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    if not all(isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in values):
+        return None
+    return values
+
+
+def _seek(queryset, keys, cursor, op):
+    """
+    `queryset` narrowed to the rows after (op='gt') or before (op='lt') the
+    `cursor`, and its values; the values are None if the cursor is missing
+    or doesn't fit the keys (a crafted one, or one from another ordering).
+    """
+    values = decode_cursor(cursor, len(keys))
+    if values is None:
+        return queryset, None
+    try:
+        return queryset.filter(_after(keys, values, op)), values
+    except (TypeError, ValueError, ValidationError):
+        return queryset, None
+
+
+def _after(keys, values, op):
+    """Rows whose `keys` tuple sorts after (op='gt') or before (op='lt') `values`."""
+    condition = Q()
+    for i, key in enumerate(keys):
+        equal = dict(zip(keys[:i], values[:i]))
+        condition |= Q(**equal, **{f'{key}__{op}': values[i]})
+    # Implied by the above, but lets the database seek into the index on the
+    # leading key instead of scanning it from the start
+    return Q(**{f'{keys[0]}__{op}e': values[0]}) & condition
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of its neighbours (None at either end)."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_other_pages(self):
+        return bool(self.next_cursor or self.previous_cursor)
+
+
+def keyset_page(queryset, keys, page_size, after=None, before=None):
+    """
+    Page of `queryset` ordered by `keys` (ascending, ending in a unique
+    field), following the `after` or preceding the `before` cursor.
+    """
+    def cursor_of(obj):
+        return encode_cursor([getattr(obj, key) for key in keys])
+
+    preceding, before_values = _seek(queryset, keys, before, 'lt')
+    if before_values is not None:
+        # Walk backwards from the cursor, then put the page back in order
+        descending = [f'-{key}' for key in keys]
+        rows = list(preceding.order_by(*descending)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return KeysetPage(
+            rows,
+            next_cursor=cursor_of(rows[-1]) if rows else None,
+            previous_cursor=cursor_of(rows[0]) if rows and has_previous else None,
+        )
+
+    queryset, after_values = _seek(queryset, keys, after, 'gt')
+    rows = list(queryset.order_by(*keys)[:page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    return KeysetPage(
+        rows,
+        next_cursor=cursor_of(rows[-1]) if rows and has_next else None,
+        previous_cursor=cursor_of(rows[0]) if rows and after_values is not None else None,
+    )
@@ -0,0 +1,102 @@
+"""
+Due-date reminder emails.
+
+The daily reminder job and the admin's manual reminder page both send
+through `send_emails`, which keeps one SMTP connection open for a batch of
+EMAIL_BATCH_SIZE messages instead of opening (and, for Gmail, TLS-handshaking)
+a new connection for every email. Batches stay under the providers'
+messages-per-session limits.
+
+If the connection drops partway (a server timeout, a 421 "too many
+messages"), it is reopened and the message that failed is tried once more.
+A message the server refuses, such as one for a bad address, counts as
+failed and the rest carry on.
+"""
+import logging
+import smtplib
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+
+logger = logging.getLogger('management')
+
+# Refusals of one message; the connection itself is fine
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def reminder_email(tx):
+    """The reminder for one open loan (`tx` with student and book loaded)."""
+    context = {
+        'student_name': tx.student.name,
+        'enrollment_id': tx.student.enrollment_id,
+        'book_title': tx.book.title,
+        'access_code': tx.book.access_code,
+        'shelf_location': tx.book.shelf_location,
+        'issue_date': tx.issue_date.strftime('%d %b, %Y'),
+        'due_date': tx.due_date.strftime('%d %b, %Y'),
+    }
+    email = EmailMultiAlternatives(
+        subject=f"📚 Library Reminder: Return '{tx.book.title}'",
+        body=render_to_string('management/email/reminder.txt', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[tx.student.email],
+    )
+    email.attach_alternative(render_to_string('management/email/reminder.html', context), 'text/html')
+    return email
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except OSError:
+        # Closing a connection the server already dropped; it is closed now
+        pass
+
+
+def _send_one(connection, message):
+    """Send on the open connection, reconnecting once if it dropped. Returns whether it was sent."""
+    for attempt in (1, 2):
+        try:
+            # One message per call: send_messages() raises without saying
+            # which of a list went out, and a retry must not send twice
+            return connection.send_messages([message]) == 1
+        except OSError as error:
+            # smtplib's errors are OSErrors; 421 means the server is closing the session
+            if isinstance(error, MESSAGE_ERRORS) and getattr(error, 'smtp_code', None) != 421:
+                logger.exception("Email to %s was refused.", ', '.join(message.to))
+                return False
+            _close(connection)
+            if attempt == 2:
+                logger.exception("Failed to send email to %s.", ', '.join(message.to))
+                return False
+            logger.warning("SMTP connection lost (%s); reconnecting.", error)
+            try:
+                connection.open()
+            except OSError:
+                logger.exception("Could not reconnect to the mail server.")
+                return False
+    return False
+
+
+def send_emails(messages, batch_size=None):
+    """Send `messages` over one connection per batch. Returns (sent, failed) counts."""
+    messages = list(messages)
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    connection = get_connection()
+    sent = failed = 0
+    for start in range(0, len(messages), batch_size):
+        try:
+            connection.open()
+        except OSError:
+            logger.exception("Could not connect to the mail server.")
+            failed += len(messages) - start
+            break
+        try:
+            for message in messages[start:start + batch_size]:
+                if _send_one(connection, message):
+                    sent += 1
+                else:
+                    failed += 1
+        finally:
+            _close(connection)
+    return sent, failed
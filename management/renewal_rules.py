@@ -0,0 +1,85 @@
+"""
+Automatic approval of renewal requests.
+
+Almost every renewal request is approved, so the scheduler approves the
+routine ones and leaves only the exceptions in the admin queue. A pending
+request is an exception, kept for staff, when:
+
+- `returned`: its loan has been closed already;
+- `overdue`: its loan is past the due date;
+- `other_overdue`: the student has another loan past its due date;
+- `renewal_limit`: the loan was renewed RENEWAL_AUTO_APPROVE_MAX_RENEWALS
+  times already.
+
+Each rule is a condition on the pending requests, with the facts it needs
+(renewal counts, other overdue loans) as correlated subqueries, so the
+database evaluates them for all requests at once: one aggregate query
+counts every outcome and the approvals are the set-based UPDATEs of
+`circulation.approve_renewals`. Requests are never loaded one by one.
+"""
+import logging
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+from .circulation import approve_renewals
+from .models import RenewRequest, Transaction
+
+logger = logging.getLogger('management')
+
+
+def exception_rules(now):
+    """Reason -> condition under which a pending request is left for staff."""
+    prior_renewals = RenewRequest.objects.filter(
+        transaction=OuterRef('transaction'), status='Approved'
+    ).order_by().values('transaction').annotate(n=Count('pk')).values('n')
+    other_overdue = Transaction.objects.filter(
+        student=OuterRef('transaction__student'), returned=False, due_date__lt=now
+    ).exclude(pk=OuterRef('transaction'))
+    return {
+        'returned': Q(transaction__returned=True),
+        'overdue': Q(transaction__due_date__lt=now),
+        'other_overdue': Q(Exists(other_overdue)),
+        'renewal_limit': Q(GreaterThanOrEqual(
+            Coalesce(Subquery(prior_renewals, output_field=IntegerField()), 0),
+            settings.RENEWAL_AUTO_APPROVE_MAX_RENEWALS,
+        )),
+    }
+
+
+def auto_approve_renewals(dry_run=False):
+    """
+    Approve every pending request no rule objects to. Returns a summary:
+    `pending`, `approved`, `extended` (loans) and, per reason, how many
+    requests it holds back (a request can have several reasons).
+    """
+    now = timezone.now()
+    rules = exception_rules(now)
+    with transaction.atomic():
+        pending = RenewRequest.objects.filter(status='Pending')
+        summary = pending.aggregate(
+            pending=Count('pk'),
+            **{reason: Count('pk', filter=condition) for reason, condition in rules.items()},
+        )
+        # Plain ids: the rule subqueries read the tables the approval updates
+        routine = list(pending.exclude(reduce(or_, rules.values())).values_list('pk', flat=True))
+        summary['approved'], summary['extended'] = approve_renewals(routine)
+        if dry_run:
+            transaction.set_rollback(True)
+
+    if summary['approved'] and not dry_run:
+        logger.info(
+            "Auto-approved %d of %d renewal request(s); %d left for staff.",
+            summary['approved'], summary['pending'], summary['pending'] - summary['approved'],
+        )
+    return summary
+
+
+def run_auto_approval():
+    """Scheduler entry point."""
+    if settings.RENEWAL_AUTO_APPROVE:
+        auto_approve_renewals()
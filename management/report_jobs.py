@@ -0,0 +1,236 @@
+"""
+Background report generation.
+
+Large reports used to be built inside one of the waitress request threads,
+where the openpyxl/pandas work held the GIL and delayed kiosk scans on the
+other threads. Now a view only records a `ReportJob`; the file is written by
+a separate worker process into REPORT_ARTIFACT_DIR and downloaded once the
+dashboard sees the job finish.
+
+A finished job is reused for identical requests (same report, format and
+filters) for up to REPORT_JOB_MAX_AGE seconds, as long as the tables it was
+built from have not been written to since (see data_versions.py).
+
+If a worker process dies (killed, out of memory) the pool is broken for
+good: its job is marked Failed and the next job gets a new pool. A job
+still Pending or Running after REPORT_JOB_TIMEOUT seconds is marked Failed
+too, so a lost job is never handed out again.
+
+This module must stay importable before Django is set up: the worker
+processes unpickle `run_report_job` / `_init_worker` from here first.
+Model imports therefore live inside the functions.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger('management')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    """Set up Django inside a freshly spawned worker process."""
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    # Inherited from runserver; apps.py would start another scheduler here
+    os.environ.pop('RUN_MAIN', None)
+    django.setup()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 'spawn' so the workers never inherit open database connections
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.REPORT_JOB_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def _discard_executor(executor):
+    """Drop a broken pool so the next job starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def fail_job(job_id, error):
+    """Mark an unfinished job Failed."""
+    from django.utils import timezone
+    from .models import ReportJob
+    ReportJob.objects.filter(pk=job_id, status__in=['Pending', 'Running']).update(
+        status='Failed', error=error, finished_at=timezone.now()
+    )
+
+
+def fail_stale_jobs():
+    """Mark jobs that have been unfinished for longer than REPORT_JOB_TIMEOUT as Failed."""
+    from django.utils import timezone
+    from .models import ReportJob
+    cutoff = timezone.now() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+    stale = ReportJob.objects.filter(status__in=['Pending', 'Running'], created_at__lt=cutoff).update(
+        status='Failed', error='The report took too long and was abandoned.', finished_at=timezone.now()
+    )
+    if stale:
+        logger.warning("Marked %d stale report job(s) as failed.", stale)
+
+
+def clean_params(report_type, params):
+    """Keep only the filters the report accepts, as stripped strings."""
+    from .reports import REPORTS
+    return {
+        name: str(params.get(name, '')).strip()
+        for name in REPORTS[report_type]['filters']
+        if str(params.get(name, '')).strip()
+    }
+
+
+def params_key(report_type, file_format, params):
+    payload = json.dumps([report_type, file_format, params], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def data_version(report_type):
+    """Version string of everything the report's rows are computed from."""
+    from django.utils import timezone
+    from .reports import REPORTS
+    from . import data_versions
+
+    report = REPORTS[report_type]
+    version = data_versions.get_versions(*report['depends_on'])
+    if report['time_dependent']:
+        version += f'@{timezone.localdate().isoformat()}'
+    return version
+
+
+def request_report(report_type, params, file_format='xlsx'):
+    """
+    Return a job for the requested report: a reusable finished or in-flight
+    job when one exists, otherwise a new job queued on the worker pool.
+    """
+    from django.utils import timezone
+    from .models import ReportJob
+
+    fail_stale_jobs()
+    params = clean_params(report_type, params)
+    key = params_key(report_type, file_format, params)
+    version = data_version(report_type)
+    max_age = timezone.now() - timedelta(seconds=settings.REPORT_JOB_MAX_AGE)
+
+    existing = (
+        ReportJob.objects
+        .filter(params_key=key, data_version=version, created_at__gte=max_age)
+        .exclude(status='Failed')
+        .order_by('-created_at')
+        .first()
+    )
+    if existing and (existing.status != 'Done' or os.path.exists(existing.file_path)):
+        return existing
+
+    job = ReportJob.objects.create(
+        report_type=report_type,
+        file_format=file_format,
+        params=params,
+        params_key=key,
+        data_version=version,
+    )
+    # The worker reads the job row through its own connection, so only hand
+    # it over once the row is committed.
+    transaction.on_commit(partial(submit_job, job.pk))
+    return job
+
+
+def submit_job(job_id):
+    """Run the job on the worker pool (or inline when REPORT_JOB_WORKERS is 0)."""
+    if settings.REPORT_JOB_WORKERS <= 0:
+        run_report_job(job_id)
+        return
+    executor = _get_executor()
+    try:
+        future = executor.submit(run_report_job, job_id)
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        executor = _get_executor()
+        future = executor.submit(run_report_job, job_id)
+    future.add_done_callback(partial(_job_done, job_id, executor))
+
+
+def _job_done(job_id, executor, future):
+    """Runs in the pool's management thread when a job's process returns or dies."""
+    from django.db import connection
+    error = future.exception()
+    if error is None:
+        return
+    logger.error("Report job %s was lost: %r", job_id, error)
+    if isinstance(error, BrokenProcessPool):
+        _discard_executor(executor)
+    try:
+        fail_job(job_id, 'The report worker stopped unexpectedly. Please try again.')
+    finally:
+        connection.close()
+
+
+def run_report_job(job_id):
+    """Generate the file for one job. Runs inside a worker process."""
+    from django.db import close_old_connections
+    from django.utils import timezone
+    from .models import ReportJob
+    from .reports import write_report
+
+    claimed = ReportJob.objects.filter(pk=job_id, status='Pending').update(status='Running')
+    if not claimed:
+        return
+
+    job = ReportJob.objects.get(pk=job_id)
+    artifact_dir = Path(settings.REPORT_ARTIFACT_DIR)
+    path = artifact_dir / f'{job.report_type}_{job.pk}.{job.file_format}'
+    try:
+        artifact_dir.mkdir(parents=True, exist_ok=True)
+        write_report(job.report_type, job.params, job.file_format, path)
+    except Exception as e:
+        logger.exception("Report job %s failed.", job_id)
+        ReportJob.objects.filter(pk=job_id).update(
+            status='Failed', error=str(e), finished_at=timezone.now()
+        )
+    else:
+        ReportJob.objects.filter(pk=job_id).update(
+            status='Done', file_path=str(path), finished_at=timezone.now()
+        )
+        logger.info("Report job %s finished: %s", job_id, path)
+    finally:
+        close_old_connections()
+
+
+def purge_report_jobs(older_than=timedelta(days=1)):
+    """Delete old jobs together with their files on disk."""
+    from django.utils import timezone
+    from .models import ReportJob
+
+    old_jobs = ReportJob.objects.filter(created_at__lt=timezone.now() - older_than)
+    removed = 0
+    for path in old_jobs.exclude(file_path='').values_list('file_path', flat=True):
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    deleted, _ = old_jobs.delete()
+    logger.info("Purged %d report job(s) and %d file(s).", deleted, removed)
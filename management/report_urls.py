@@ -6,4 +6,7 @@ urlpatterns = [
     path('entry-exit/', report_views.download_entry_exit, name='report_entry_exit'),
     path('book-issues/', report_views.download_book_issues, name='report_book_issues'),
     path('overdue-students/', report_views.download_overdue_students, name='report_overdue_students'),
+    path('jobs/<str:report_type>/start/', report_views.start_report_job, name='report_job_start'),
+    path('jobs/<int:job_id>/', report_views.report_job_status, name='report_job_status'),
+    path('jobs/<int:job_id>/download/', report_views.download_report_job, name='report_job_download'),
 ]
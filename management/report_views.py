@@ -1,11 +1,14 @@
-import io
-import pandas as pd
+import os
+import tempfile
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.template.response import TemplateResponse
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
 from django.utils import timezone
-from .models import Student, LibraryLog, Transaction
+from django.views.decorators.http import require_POST
+from .models import Student, ReportJob
+from . import reports, report_jobs
 
 
 @staff_member_required(login_url='/admin/login/')
@@ -22,216 +25,144 @@ def reports_dashboard(request):
     return TemplateResponse(request, 'admin/reports_dashboard.html', context)
 
 
-@staff_member_required(login_url='/admin/login/')
-@staff_member_required(login_url='/admin/login/')
-def download_entry_exit(request):
-    """Download filtered Entry-Exit report with duration."""
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    department = request.GET.get('department', '')
-
-    queryset = LibraryLog.objects.select_related('student').all()
-
-    if date_from:
-        queryset = queryset.filter(entry_time__date__gte=date_from)
-    if date_to:
-        queryset = queryset.filter(entry_time__date__lte=date_to)
-    if department:
-        queryset = queryset.filter(student__department=department)
-
-    rows = []
-    for log in queryset.order_by('-entry_time'):
-        if log.exit_time:
-            duration = log.exit_time - log.entry_time
-            hours, remainder = divmod(int(duration.total_seconds()), 3600)
-            minutes, seconds = divmod(remainder, 60)
-            duration_str = f'{hours}h {minutes}m {seconds}s'
-        else:
-            duration_str = 'Still Inside'
-
-        rows.append({
-            'enrollment_id': log.student.enrollment_id,
-            'name': log.student.name,
-            'department': log.student.department,
-            'mobile_no': log.student.mobile_no,
-            'entry_time': log.entry_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'exit_time': log.exit_time.strftime('%Y-%m-%d %H:%M:%S') if log.exit_time else 'Still Inside',
-            'duration': duration_str,
-        })
-
-    df = pd.DataFrame(rows)
-    if df.empty:
-        df = pd.DataFrame(columns=[
-            'Enrollment ID', 'Name', 'Department', 'Mobile No',
-            'Entry Time', 'Exit Time', 'Duration'
-        ])
-    else:
-        df.columns = [
-            'Enrollment ID', 'Name', 'Department', 'Mobile No',
-            'Entry Time', 'Exit Time', 'Duration'
-        ]
+def _export_response(request, columns, rows, sheet_name, filename_prefix):
+    """
+    Send report rows as a file without holding the whole report in memory.
+    `?format=csv` streams the CSV line by line; the default `.xlsx` is built
+    with a write-only workbook on a temporary file and sent back in chunks.
+    """
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
 
-    mode = request.GET.get('mode', 'download')
-    if mode == 'preview':
-        html_table = df.head(15).to_html(classes='preview-table', index=False)
-        return render(request, 'admin/report_preview.html', {'html_table': html_table, 'title': 'Entry-Exit Preview'})
+    if request.GET.get('format') == 'csv':
+        response = StreamingHttpResponse(
+            reports.iter_csv(columns, rows),
+            content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename_prefix}_{timestamp}.csv"'
+        return response
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Entry-Exit Report')
+    output = tempfile.TemporaryFile()
+    reports.write_xlsx(columns, rows, sheet_name, output)
     output.seek(0)
 
-    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-    response = HttpResponse(
+    return FileResponse(
         output,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        as_attachment=True,
+        filename=f'{filename_prefix}_{timestamp}.xlsx',
+        content_type=reports.XLSX_CONTENT_TYPE
     )
-    response['Content-Disposition'] = f'attachment; filename="entry_exit_report_{timestamp}.xlsx"'
-    return response
+
+
+def _preview_response(request, queryset, columns, build_rows, title):
+    """
+    Render the first PREVIEW_ROWS rows of a report. The queryset is sliced in
+    the database (LIMIT) so a preview never touches the rest of the rows.
+    """
+    rows = list(build_rows(queryset[:reports.PREVIEW_ROWS]))
+    context = {
+        'title': title,
+        'columns': columns,
+        'rows': rows,
+        'preview_rows': reports.PREVIEW_ROWS,
+        'total_rows': queryset.count(),
+    }
+    return render(request, 'admin/report_preview.html', context)
+
+
+@staff_member_required(login_url='/admin/login/')
+def download_entry_exit(request):
+    """Download filtered Entry-Exit report with duration."""
+    queryset = reports.entry_exit_queryset(
+        date_from=request.GET.get('date_from', ''),
+        date_to=request.GET.get('date_to', ''),
+        department=request.GET.get('department', ''),
+    )
+    mode = request.GET.get('mode', 'download')
+    if mode == 'preview':
+        return _preview_response(request, queryset, reports.ENTRY_EXIT_COLUMNS, reports.entry_exit_rows, 'Entry-Exit Preview')
+
+    rows = reports.entry_exit_rows(queryset)
+    return _export_response(request, reports.ENTRY_EXIT_COLUMNS, rows, 'Entry-Exit Report', 'entry_exit_report')
 
 # we can also use @login_required decorator instead of @staff_member_required
-# @login_required(login_url='/admin/login/')    
+# @login_required(login_url='/admin/login/')
 @staff_member_required(login_url='/admin/login/')
 def download_book_issues(request):
     """Download filtered Book Issue report."""
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    department = request.GET.get('department', '')
-    status = request.GET.get('status', '')
-
-    queryset = Transaction.objects.select_related('student', 'book').all()
-
-    if date_from:
-        queryset = queryset.filter(issue_date__date__gte=date_from)
-    if date_to:
-        queryset = queryset.filter(issue_date__date__lte=date_to)
-    if department:
-        queryset = queryset.filter(student__department=department)
-    
-    if status == 'returned':
-        queryset = queryset.filter(returned=True)
-    elif status == 'pending':
-        queryset = queryset.filter(returned=False)
-    elif status == 'overdue':
-        queryset = queryset.filter(returned=False, due_date__lt=timezone.now())
-
-    rows = []
-    now = timezone.now()
-    for tx in queryset.order_by('-issue_date'):
-        if tx.returned:
-            book_status = 'Returned'
-        elif now > tx.due_date:
-            book_status = f'OVERDUE ({(now - tx.due_date).days} days)'
-        else:
-            book_status = 'Pending'
-
-        rows.append({
-            'enrollment_id': tx.student.enrollment_id,
-            'name': tx.student.name,
-            'department': tx.student.department,
-            'access_code': tx.book.access_code,
-            'book_title': tx.book.title,
-            'book_author': tx.book.author or '',
-            'shelf_location': tx.book.shelf_location,
-            'issue_date': tx.issue_date.strftime('%Y-%m-%d'),
-            'due_date': tx.due_date.strftime('%Y-%m-%d'),
-            'status': book_status,
-        })
-
-    df = pd.DataFrame(rows)
-    if df.empty:
-        df = pd.DataFrame(columns=[
-            'Enrollment ID', 'Student Name', 'Department',
-            'Access Code', 'Book Title', 'Author', 'Shelf Location',
-            'Issue Date', 'Due Date', 'Status'
-        ])
-    else:
-        df.columns = [
-            'Enrollment ID', 'Student Name', 'Department',
-            'Access Code', 'Book Title', 'Author', 'Shelf Location',
-            'Issue Date', 'Due Date', 'Status'
-        ]
-
+    queryset = reports.book_issues_queryset(
+        date_from=request.GET.get('date_from', ''),
+        date_to=request.GET.get('date_to', ''),
+        department=request.GET.get('department', ''),
+        status=request.GET.get('status', ''),
+    )
     mode = request.GET.get('mode', 'download')
     if mode == 'preview':
-        html_table = df.head(15).to_html(classes='preview-table', index=False)
-        return render(request, 'admin/report_preview.html', {'html_table': html_table, 'title': 'Book Issues Preview'})
+        return _preview_response(request, queryset, reports.BOOK_ISSUES_COLUMNS, reports.book_issues_rows, 'Book Issues Preview')
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Book Issues Report')
-    output.seek(0)
-
-    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-    response = HttpResponse(
-        output,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="book_issues_report_{timestamp}.xlsx"'
-    return response
+    rows = reports.book_issues_rows(queryset)
+    return _export_response(request, reports.BOOK_ISSUES_COLUMNS, rows, 'Book Issues Report', 'book_issues_report')
 
 
 @staff_member_required(login_url='/admin/login/')
 def download_overdue_students(request):
     """Download Overdue Students report."""
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    department = request.GET.get('department', '')
-
-    queryset = Transaction.objects.select_related('student', 'book').filter(
-        returned=False,
-        due_date__lt=timezone.now()
+    queryset = reports.overdue_queryset(
+        date_from=request.GET.get('date_from', ''),
+        date_to=request.GET.get('date_to', ''),
+        department=request.GET.get('department', ''),
     )
-
-    if date_from:
-        queryset = queryset.filter(issue_date__date__gte=date_from)
-    if date_to:
-        queryset = queryset.filter(issue_date__date__lte=date_to)
-    if department:
-        queryset = queryset.filter(student__department=department)
-
-    rows = []
-    now = timezone.now()
-    for tx in queryset.order_by('due_date'):
-        overdue_days = (now - tx.due_date).days
-        rows.append({
-            'enrollment_id': tx.student.enrollment_id,
-            'name': tx.student.name,
-            'department': tx.student.department,
-            'mobile_no': tx.student.mobile_no,
-            'book_title': tx.book.title,
-            'book_author': tx.book.author or '',
-            'access_code': tx.book.access_code,
-            'due_date': tx.due_date.strftime('%Y-%m-%d'),
-            'overdue_days': overdue_days,
-        })
-
-    if not rows:
-        df = pd.DataFrame(columns=[
-            'Enrollment ID', 'Student Name', 'Department', 'Mobile No',
-            'Book Title', 'Author', 'Access Code', 'Due Date', 'Overdue Days'
-        ])
-    else:
-        df = pd.DataFrame(rows)
-        df.columns = [
-            'Enrollment ID', 'Student Name', 'Department', 'Mobile No',
-            'Book Title', 'Author', 'Access Code', 'Due Date', 'Overdue Days'
-        ]
-
     mode = request.GET.get('mode', 'download')
     if mode == 'preview':
-        html_table = df.head(15).to_html(classes='preview-table', index=False)
-        return render(request, 'admin/report_preview.html', {'html_table': html_table, 'title': 'Overdue Students Preview'})
+        return _preview_response(request, queryset, reports.OVERDUE_COLUMNS, reports.overdue_rows, 'Overdue Students Preview')
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Overdue Students')
-    output.seek(0)
+    rows = reports.overdue_rows(queryset)
+    return _export_response(request, reports.OVERDUE_COLUMNS, rows, 'Overdue Students', 'overdue_students_report')
 
-    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-    response = HttpResponse(
-        output,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# ── Background report jobs ──────────────────────────────────
+def _job_payload(job):
+    return {
+        'id': job.pk,
+        'report_type': job.report_type,
+        'status': job.status,
+        'error': job.error,
+        'status_url': reverse('report_job_status', args=[job.pk]),
+        'download_url': reverse('report_job_download', args=[job.pk]) if job.status == 'Done' else None,
+    }
+
+
+@staff_member_required(login_url='/admin/login/')
+@require_POST
+def start_report_job(request, report_type):
+    """Queue a report for background generation (or reuse a cached one)."""
+    if report_type not in reports.REPORTS:
+        raise Http404("Unknown report.")
+    file_format = 'csv' if request.POST.get('format') == 'csv' else 'xlsx'
+    job = report_jobs.request_report(report_type, request.POST, file_format)
+    return JsonResponse(_job_payload(job), status=202)
+
+
+@staff_member_required(login_url='/admin/login/')
+def report_job_status(request, job_id):
+    """Polled by the reports dashboard until the job is finished."""
+    report_jobs.fail_stale_jobs()
+    job = get_object_or_404(ReportJob, pk=job_id)
+    return JsonResponse(_job_payload(job))
+
+
+@staff_member_required(login_url='/admin/login/')
+def download_report_job(request, job_id):
+    """Send the file produced by a finished job."""
+    job = get_object_or_404(ReportJob, pk=job_id, status='Done')
+    if not os.path.exists(job.file_path):
+        raise Http404("Report file has been removed. Please generate it again.")
+
+    report = reports.REPORTS[job.report_type]
+    timestamp = timezone.localtime(job.finished_at).strftime('%Y%m%d_%H%M%S')
+    content_type = 'text/csv; charset=utf-8' if job.file_format == 'csv' else reports.XLSX_CONTENT_TYPE
+    return FileResponse(
+        open(job.file_path, 'rb'),
+        as_attachment=True,
+        filename=f"{report['filename_prefix']}_{timestamp}.{job.file_format}",
+        content_type=content_type
     )
-    response['Content-Disposition'] = f'attachment; filename="overdue_students_report_{timestamp}.xlsx"'
-    return response
@@ -0,0 +1,311 @@
+import csv
+from datetime import timezone as dt_timezone
+from itertools import islice
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from django.utils import timezone
+from .models import LibraryLog, Transaction
+from .date_ranges import date_range_filter
+
+# Rows are pulled from the database in chunks of this size so memory stays
+# bounded no matter how large the report is.
+EXPORT_CHUNK_SIZE = 2000
+
+# Number of rows shown by the `mode=preview` pages
+PREVIEW_ROWS = 15
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+ENTRY_EXIT_COLUMNS = [
+    'Enrollment ID', 'Name', 'Department', 'Mobile No',
+    'Entry Time', 'Exit Time', 'Duration'
+]
+BOOK_ISSUES_COLUMNS = [
+    'Enrollment ID', 'Student Name', 'Department',
+    'Access Code', 'Book Title', 'Author', 'Shelf Location',
+    'Issue Date', 'Due Date', 'Status'
+]
+OVERDUE_COLUMNS = [
+    'Enrollment ID', 'Student Name', 'Department', 'Mobile No',
+    'Book Title', 'Author', 'Access Code', 'Due Date', 'Overdue Days'
+]
+
+
+# ── Querysets ───────────────────────────────────────────────
+def entry_exit_queryset(date_from='', date_to='', department=''):
+    """Filtered LibraryLog queryset for the Entry-Exit report."""
+    queryset = LibraryLog.objects.select_related('student').all()
+
+    queryset = queryset.filter(**date_range_filter('entry_time', date_from, date_to))
+    if department:
+        queryset = queryset.filter(student__department=department)
+    return queryset.order_by('-entry_time')
+
+
+def book_issues_queryset(date_from='', date_to='', department='', status=''):
+    """Filtered Transaction queryset for the Book Issues report."""
+    queryset = Transaction.objects.select_related('student', 'book').all()
+
+    queryset = queryset.filter(**date_range_filter('issue_date', date_from, date_to))
+    if department:
+        queryset = queryset.filter(student__department=department)
+
+    if status == 'returned':
+        queryset = queryset.filter(returned=True)
+    elif status == 'pending':
+        queryset = queryset.filter(returned=False)
+    elif status == 'overdue':
+        queryset = queryset.filter(returned=False, due_date__lt=timezone.now())
+    return queryset.order_by('-issue_date')
+
+
+def overdue_queryset(date_from='', date_to='', department=''):
+    """Filtered Transaction queryset for the Overdue Students report."""
+    queryset = Transaction.objects.select_related('student', 'book').filter(
+        returned=False,
+        due_date__lt=timezone.now()
+    )
+
+    queryset = queryset.filter(**date_range_filter('issue_date', date_from, date_to))
+    if department:
+        queryset = queryset.filter(student__department=department)
+    return queryset.order_by('due_date')
+
+
+# ── Row builders ────────────────────────────────────────────
+# The builders read plain column values with values_list() and format each
+# chunk of rows with NumPy array operations instead of a Python
+# strftime()/divmod() per row. The output matches the per-row formatting
+# exactly: timestamps are written as stored (UTC), durations are truncated
+# to whole seconds and overdue days are whole days as in timedelta.days.
+NS_PER_SECOND = 10 ** 9
+NS_PER_DAY = 86400 * NS_PER_SECOND
+
+ENTRY_EXIT_FIELDS = [
+    'student__enrollment_id', 'student__name', 'student__department',
+    'student__mobile_no', 'entry_time', 'exit_time',
+]
+BOOK_ISSUES_FIELDS = [
+    'student__enrollment_id', 'student__name', 'student__department',
+    'book__access_code', 'book__title', 'book__author', 'book__shelf_location',
+    'issue_date', 'due_date', 'returned',
+]
+OVERDUE_FIELDS = [
+    'student__enrollment_id', 'student__name', 'student__department',
+    'student__mobile_no', 'book__title', 'book__author', 'book__access_code',
+    'due_date',
+]
+
+
+def _chunks(queryset, fields):
+    """Yield lists of value tuples, EXPORT_CHUNK_SIZE rows at a time."""
+    values = queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    while True:
+        chunk = list(islice(values, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _utc_datetimes(values):
+    """datetime64[ns] array (naive UTC, NaT for None) from aware datetimes."""
+    return np.array(
+        [None if value is None else timezone.make_naive(value, dt_timezone.utc) for value in values],
+        dtype='datetime64[ns]',
+    )
+
+
+# '{m}m {s}s' for every remainder of a duration below one hour
+_MINUTES_SECONDS_TEXT = np.array([f'{m}m {s}s' for m in range(60) for s in range(60)])
+
+
+def _format_datetimes(array, unit):
+    """'YYYY-MM-DD HH:MM:SS' (unit='s') or 'YYYY-MM-DD' (unit='D') strings."""
+    text = np.datetime_as_string(array, unit=unit)
+    if unit == 's' and text.dtype.itemsize >= 11 * 4:
+        # ISO output is fixed width: swap the 'T' separator for a space by
+        # editing the UCS-4 code points in place.
+        text.view(np.uint32).reshape(len(text), -1)[:, 10] = ord(' ')
+    return text
+
+
+def _as_datetime64(moment):
+    return np.datetime64(timezone.make_naive(moment, dt_timezone.utc), 'ns')
+
+
+def _whole_days_since(now, array):
+    """(now - value).days for every value, i.e. floored whole days."""
+    return (_as_datetime64(now) - array).astype('int64') // NS_PER_DAY
+
+
+def format_entry_exit_chunk(chunk):
+    """Format raw ENTRY_EXIT_FIELDS tuples into Entry-Exit report rows."""
+    columns = list(zip(*chunk))
+    entry = _utc_datetimes(columns[4])
+    exit_ = _utc_datetimes(columns[5])
+    inside = np.isnat(exit_)
+
+    # Truncate towards zero like int(timedelta.total_seconds())
+    elapsed = (exit_ - entry).astype('int64')
+    seconds_total = np.where(elapsed >= 0, elapsed // NS_PER_SECOND, -(-elapsed // NS_PER_SECOND))
+    hours, remainder = np.divmod(seconds_total, 3600)
+    duration = np.char.add(np.char.add(hours.astype(str), 'h '), _MINUTES_SECONDS_TEXT[remainder])
+
+    entry_text = _format_datetimes(entry, 's')
+    exit_text = np.where(inside, 'Still Inside', _format_datetimes(exit_, 's'))
+    duration = np.where(inside, 'Still Inside', duration)
+
+    return zip(
+        columns[0], columns[1], columns[2], columns[3],
+        entry_text.tolist(), exit_text.tolist(), duration.tolist(),
+    )
+
+
+def format_book_issues_chunk(chunk, now):
+    """Format raw BOOK_ISSUES_FIELDS tuples into Book Issues report rows."""
+    columns = list(zip(*chunk))
+    issue = _utc_datetimes(columns[7])
+    due = _utc_datetimes(columns[8])
+    returned = np.array(columns[9], dtype=bool)
+
+    overdue_days = _whole_days_since(now, due)
+    overdue_text = np.char.add(np.char.add('OVERDUE (', overdue_days.astype(str)), ' days)')
+    status = np.select(
+        [returned, _as_datetime64(now) > due],
+        [np.str_('Returned'), overdue_text],
+        default='Pending',
+    )
+    authors = [author or '' for author in columns[5]]
+
+    return zip(
+        columns[0], columns[1], columns[2], columns[3], columns[4], authors, columns[6],
+        _format_datetimes(issue, 'D').tolist(), _format_datetimes(due, 'D').tolist(), status.tolist(),
+    )
+
+
+def format_overdue_chunk(chunk, now):
+    """Format raw OVERDUE_FIELDS tuples into Overdue Students report rows."""
+    columns = list(zip(*chunk))
+    due = _utc_datetimes(columns[7])
+    authors = [author or '' for author in columns[5]]
+
+    return zip(
+        columns[0], columns[1], columns[2], columns[3], columns[4], authors, columns[6],
+        _format_datetimes(due, 'D').tolist(), _whole_days_since(now, due).tolist(),
+    )
+
+
+def entry_exit_rows(queryset):
+    """Yield one Entry-Exit report row per log, reading the queryset in chunks."""
+    for chunk in _chunks(queryset, ENTRY_EXIT_FIELDS):
+        yield from format_entry_exit_chunk(chunk)
+
+
+def book_issues_rows(queryset):
+    """Yield one Book Issues report row per transaction."""
+    now = timezone.now()
+    for chunk in _chunks(queryset, BOOK_ISSUES_FIELDS):
+        yield from format_book_issues_chunk(chunk, now)
+
+
+def overdue_rows(queryset):
+    """Yield one Overdue Students report row per overdue transaction."""
+    now = timezone.now()
+    for chunk in _chunks(queryset, OVERDUE_FIELDS):
+        yield from format_overdue_chunk(chunk, now)
+
+
+# ── Writers ─────────────────────────────────────────────────
+class _Echo:
+    """File-like object whose write() hands the value straight back (for csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(columns, rows):
+    """Yield the report as CSV text, one line at a time."""
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens the UTF-8 file with the right encoding
+    yield '\ufeff' + writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(columns, rows, sheet_name, fileobj):
+    """
+    Write the report into `fileobj` using openpyxl's write-only mode.
+    Rows are flushed to a temporary file as they are appended instead of
+    being kept in memory.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_name)
+
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=column)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    sheet.append(header)
+
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fileobj)
+
+
+# ── Registry (used by the background report jobs) ───────────
+# `filters` lists the GET parameters the report accepts, `depends_on` the
+# tables whose writes make a cached copy of the report stale, and
+# `time_dependent` marks reports whose rows change with the clock
+# (overdue days), which are only reused on the day they were built.
+REPORTS = {
+    'entry_exit': {
+        'title': 'Entry-Exit Report',
+        'columns': ENTRY_EXIT_COLUMNS,
+        'queryset': entry_exit_queryset,
+        'rows': entry_exit_rows,
+        'sheet_name': 'Entry-Exit Report',
+        'filename_prefix': 'entry_exit_report',
+        'filters': ['date_from', 'date_to', 'department'],
+        'depends_on': ['library_logs', 'students'],
+        'time_dependent': False,
+    },
+    'book_issues': {
+        'title': 'Book Issues Report',
+        'columns': BOOK_ISSUES_COLUMNS,
+        'queryset': book_issues_queryset,
+        'rows': book_issues_rows,
+        'sheet_name': 'Book Issues Report',
+        'filename_prefix': 'book_issues_report',
+        'filters': ['date_from', 'date_to', 'department', 'status'],
+        'depends_on': ['transactions', 'students', 'books'],
+        'time_dependent': True,
+    },
+    'overdue': {
+        'title': 'Overdue Students Report',
+        'columns': OVERDUE_COLUMNS,
+        'queryset': overdue_queryset,
+        'rows': overdue_rows,
+        'sheet_name': 'Overdue Students',
+        'filename_prefix': 'overdue_students_report',
+        'filters': ['date_from', 'date_to', 'department'],
+        'depends_on': ['transactions', 'students', 'books'],
+        'time_dependent': True,
+    },
+}
+
+
+def write_report(report_type, params, file_format, path):
+    """Build a full report straight into the file at `path`."""
+    report = REPORTS[report_type]
+    rows = report['rows'](report['queryset'](**params))
+
+    if file_format == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for line in iter_csv(report['columns'], rows):
+                f.write(line)
+    else:
+        with open(path, 'wb') as f:
+            write_xlsx(report['columns'], rows, report['sheet_name'], f)
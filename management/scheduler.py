@@ -1,7 +1,11 @@
 import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 from django_apscheduler.jobstores import DjangoJobStore, register_events
-from .tasks import send_due_reminders
+from .tasks import send_due_reminders, clear_expired_sessions
+from .report_jobs import purge_report_jobs
+from .kiosk import purge_scan_events
+from .occupancy_rollup import run_rollup
+from .renewal_rules import run_auto_approval
 
 logger = logging.getLogger('management')
 
@@ -24,6 +28,59 @@ def start():
     #     replace_existing=True,
     # )
 
+    # Daily at 2 AM — delete generated report files older than a day
+    scheduler.add_job(
+        purge_report_jobs,
+        trigger="cron",
+        hour=2,
+        minute=0,
+        id="purge_report_jobs",
+        max_instances=1,
+        replace_existing=True,
+    )
+
+    # Daily at 2:15 AM — forget kiosk scan ids older than 30 days
+    scheduler.add_job(
+        purge_scan_events,
+        trigger="cron",
+        hour=2,
+        minute=15,
+        id="purge_scan_events",
+        max_instances=1,
+        replace_existing=True,
+    )
+
+    # Daily at 2:30 AM — delete expired admin sessions
+    scheduler.add_job(
+        clear_expired_sessions,
+        trigger="cron",
+        hour=2,
+        minute=30,
+        id="clear_expired_sessions",
+        max_instances=1,
+        replace_existing=True,
+    )
+
+    # Every hour at :05 — fold closed library sessions into the occupancy rollup
+    scheduler.add_job(
+        run_rollup,
+        trigger="cron",
+        minute=5,
+        id="run_occupancy_rollup",
+        max_instances=1,
+        replace_existing=True,
+    )
+
+    # Every 15 minutes — approve routine renewal requests, leaving exceptions for staff
+    scheduler.add_job(
+        run_auto_approval,
+        trigger="cron",
+        minute="*/15",
+        id="auto_approve_renewals",
+        max_instances=1,
+        replace_existing=True,
+    )
+
     register_events(scheduler)
     scheduler.start()
-    logger.info("APScheduler started with 1 scheduled task.")
+    logger.info("APScheduler started with 5 scheduled tasks.")
@@ -0,0 +1,140 @@
+"""
+Cache of book search result pages.
+
+A results page (the access codes shown, the cursors of its neighbours, the
+corrected query and the total) is cached under the normalised query, the
+page cursor and the catalogue version. The version is a token in the
+database (CatalogueVersion), replaced in the same transaction as every
+write that a results page could show (CATALOGUE_FIELDS, new and deleted
+books), so a cached page can never outlive the data it was built from,
+whichever process wrote it. The version is read before the search runs,
+so a page built while a write commits is stored under the older version
+and never served for the newer one.
+
+Issues and returns don't touch the catalogue version: the books of a
+cached page are re-read on every hit, so their status is current, and the
+count of available books is cached on its own, per query, under the books
+data version (`data_versions.BOOKS`), which circulation replaces.
+
+Hits and misses are counted per process and shown by
+/api/search/cache-stats/.
+"""
+import hashlib
+import threading
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from . import data_versions
+from .models import Book, CatalogueVersion
+from .pagination import KeysetPage
+
+CACHE_PREFIX = 'book-search'
+
+# Book fields a results page shows or is matched and sorted on. Changing
+# any other field (status, holder, shelf) leaves cached pages valid.
+CATALOGUE_FIELDS = ('title', 'author', 'isbn_no', 'edition', 'allocated_department')
+
+
+# ── Catalogue version ───────────────────────────────────────
+def catalogue_version():
+    return CatalogueVersion.objects.filter(pk=1).values_list('version', flat=True).first() or ''
+
+
+def bump_catalogue_version():
+    """Make every cached search result stale. Call inside the writing transaction."""
+    version = uuid.uuid4().hex
+    if not CatalogueVersion.objects.filter(pk=1).update(version=version):
+        CatalogueVersion.objects.update_or_create(pk=1, defaults={'version': version})
+
+
+# ── Hit/miss counters ───────────────────────────────────────
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.since = timezone.now()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'since': self.since,
+            }
+
+
+cache_stats = CacheStats()
+
+
+# ── Results ─────────────────────────────────────────────────
+def normalise_query(query):
+    """Case and spacing folded; every search backend ignores both."""
+    return ' '.join(query.lower().split())
+
+
+def _cache_key(version, query, after, before):
+    page = f'{query}\0{after or ""}\0{before or ""}\0{settings.BOOK_SEARCH_PAGE_SIZE}'
+    digest = hashlib.sha1(page.encode('utf-8')).hexdigest()
+    return f'{CACHE_PREFIX}:{version}:{digest}'
+
+
+def _available_key(version, query):
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()
+    return f'{CACHE_PREFIX}:{version}:{data_versions.get_version(data_versions.BOOKS)}:available:{digest}'
+
+
+def cached_search(query, after, before, search, count_available):
+    """
+    `search(query, after, before)` for the normalised `query`, from the cache
+    when possible. `search` returns a dict with `page` (a KeysetPage),
+    `available_books` and JSON-able extras such as counts; the same shape is
+    returned here. `count_available(query, extras)` recounts the available
+    books when only that count is stale.
+    """
+    query = normalise_query(query)
+    version = catalogue_version()
+    key = _cache_key(version, query, after, before)
+    available_key = _available_key(version, query)
+
+    cached = cache.get(key)
+    cache_stats.record(hit=cached is not None)
+    if cached is not None:
+        results = dict(cached)
+        codes = results.pop('codes')
+        books = Book.objects.in_bulk(codes)
+        results['page'] = KeysetPage(
+            [books[code] for code in codes if code in books],
+            next_cursor=results.pop('next_cursor'),
+            previous_cursor=results.pop('previous_cursor'),
+        )
+        results['available_books'] = cache.get(available_key)
+        if results['available_books'] is None:
+            results['available_books'] = count_available(query, results)
+            cache.set(available_key, results['available_books'], timeout=settings.BOOK_SEARCH_CACHE_TTL)
+        return results
+
+    results = search(query, after, before)
+    page = results['page']
+    cache.set(key, {
+        **{name: value for name, value in results.items() if name not in ('page', 'available_books')},
+        'codes': [book.pk for book in page.object_list],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }, timeout=settings.BOOK_SEARCH_CACHE_TTL)
+    cache.set(available_key, results['available_books'], timeout=settings.BOOK_SEARCH_CACHE_TTL)
+    return results
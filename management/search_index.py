@@ -0,0 +1,149 @@
+"""
+Full-text search over the book catalogue (title, author, ISBN).
+
+SQLite:  an FTS5 virtual table, `management_book_fts`, created and filled by
+         migration 0017. Triggers on the book table keep it in sync on every
+         write path, including `import_data`'s bulk inserts and .update().
+MySQL:   a FULLTEXT index on the book table, maintained by InnoDB itself.
+
+A query that is a valid ISBN-10 or ISBN-13 is first looked up exactly in
+the normalised `isbn13` column. Other queries return every matching book:
+the SEARCH_RANKED_RESULTS most relevant first (title matches weigh most),
+then the rest by accession code, so counts and pages cover the whole
+match. On any other database, or when the index is missing, `search_books`
+falls back to the old `icontains` filter so the search page keeps working.
+"""
+import contextlib
+import functools
+import logging
+import re
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from .isbn import normalize_isbn
+from .models import Book
+
+logger = logging.getLogger('management')
+
+FTS_TABLE = 'management_book_fts'
+
+# Matches ordered by relevance; any further ones follow by accession code.
+# Each ranked match becomes two query parameters, so this also stays clear
+# of SQLite's parameter limit.
+SEARCH_RANKED_RESULTS = 200
+
+# bm25 weights per FTS column: access_code (not indexed), title, author, isbn_no
+_BM25_WEIGHTS = '0.0, 10.0, 5.0, 2.0'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+@functools.lru_cache(maxsize=None)
+def sqlite_has_fts5():
+    """Whether this process's SQLite library includes the FTS5 extension."""
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+def search_terms(query):
+    """Words of the query; punctuation and FTS operators are dropped."""
+    return _WORD_RE.findall(query.lower())
+
+
+def fulltext_backend():
+    """'fts5', 'mysql' or None (no full-text index on this database)."""
+    if connection.vendor == 'sqlite':
+        return 'fts5' if sqlite_has_fts5() else None
+    if connection.vendor == 'mysql':
+        return 'mysql'
+    return None
+
+
+def _fts5_match(terms):
+    """SQL selecting the accession codes of every match, with its parameters."""
+    # Every word must match; the last one may be a prefix of a longer word
+    match = ' '.join(f'"{term}"' for term in terms[:-1])
+    match = f'{match} "{terms[-1]}"*'.strip()
+    return f'SELECT access_code FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]
+
+
+def _fts5_codes(terms, limit):
+    sql, params = _fts5_match(terms)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} ORDER BY bm25({FTS_TABLE}, {_BM25_WEIGHTS}) LIMIT %s', [*params, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _mysql_match(terms):
+    match = ' '.join(f'+{term}*' for term in terms)
+    table = Book._meta.db_table
+    return f'SELECT access_code FROM {table} WHERE MATCH(title, author, isbn_no) AGAINST (%s IN BOOLEAN MODE)', [match]
+
+
+def _mysql_codes(terms, limit):
+    sql, params = _mysql_match(terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{sql} ORDER BY MATCH(title, author, isbn_no) AGAINST (%s IN BOOLEAN MODE) DESC LIMIT %s',
+            [*params, *params, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def fallback_search(query):
+    """The original substring search, used when no full-text index is available."""
+    return Book.objects.filter(Q(title__icontains=query) | Q(isbn_no__icontains=query))
+
+
+def search_books(query, ranked=SEARCH_RANKED_RESULTS):
+    """Books matching `query`, the `ranked` most relevant first."""
+    isbn = normalize_isbn(query)
+    if isbn:
+        # An ISBN, in any spelling: one probe of the isbn13 index
+        exact = Book.objects.filter(isbn13=isbn)
+        if exact.exists():
+            return exact
+
+    terms = search_terms(query)
+    backend = fulltext_backend()
+    if not terms or backend is None:
+        return fallback_search(query)
+
+    # Savepoint, so a missing index doesn't break an enclosing transaction.
+    # Not a transaction of its own: on SQLite (IMMEDIATE) that would queue
+    # every search behind the writers.
+    savepoint = transaction.atomic() if connection.in_atomic_block else contextlib.nullcontext()
+    try:
+        with savepoint:
+            codes = (_fts5_codes if backend == 'fts5' else _mysql_codes)(terms, ranked)
+    except DatabaseError:
+        logger.warning("Full-text book index unavailable; using substring search.", exc_info=True)
+        return fallback_search(query)
+
+    if not codes:
+        return Book.objects.none()
+    ranking = Case(
+        *[When(access_code=code, then=Value(position)) for position, code in enumerate(codes)],
+        default=Value(len(codes)),
+        output_field=IntegerField(),
+    )
+    # The ranked codes only order the results; the match itself is uncapped.
+    # `search_rank` (0 = best match) lets the results page use it as a sort key
+    matches = RawSQL(*(_fts5_match if backend == 'fts5' else _mysql_match)(terms))
+    return (Book.objects.filter(access_code__in=matches)
+            .annotate(search_rank=ranking).order_by('search_rank', 'access_code'))
+
+
+def rebuild_index():
+    """Refill the SQLite index from the book table. Returns the number of books indexed."""
+    if fulltext_backend() != 'fts5':
+        return Book.objects.count()
+    table = Book._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (access_code, title, author, isbn_no) '
+            f"SELECT access_code, title, COALESCE(author, ''), COALESCE(isbn_no, '') FROM {table}"
+        )
+        return cursor.rowcount
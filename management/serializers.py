@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .models import Book
+from .circulation import MAX_BULK_BOOKS
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Custom JWT Serializer to add username to the response."""
@@ -41,3 +43,29 @@ class RegisterSerializer(serializers.ModelSerializer):
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True)
+
+
+class KioskScanSerializer(serializers.Serializer):
+    """One scan sent by a kiosk to /api/kiosk/scan/."""
+    event_id = serializers.CharField(max_length=64)
+    barcode = serializers.CharField(max_length=50, trim_whitespace=True)
+    scanned_at = serializers.DateTimeField(required=False)
+
+
+class BulkCirculationSerializer(serializers.Serializer):
+    """A pile of books issued to or returned by one student, for /api/circulation/bulk/."""
+    enrollment_id = serializers.CharField(max_length=50, trim_whitespace=True)
+    action = serializers.ChoiceField(choices=['issue', 'return'])
+    access_codes = serializers.ListField(
+        child=serializers.CharField(max_length=50, trim_whitespace=True),
+        allow_empty=False, max_length=MAX_BULK_BOOKS
+    )
+
+
+class BookSerializer(serializers.ModelSerializer):
+    """Catalogue entry returned by the book lookup endpoints."""
+
+    class Meta:
+        model = Book
+        fields = ['access_code', 'title', 'author', 'isbn_no', 'isbn13', 'edition',
+                  'allocated_department', 'shelf_location', 'status']
@@ -0,0 +1,99 @@
+from functools import partial
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Student, Book, LibraryLog, Transaction, RenewRequest
+from . import data_versions
+from .occupancy import occupancy_index
+from .visit_counters import record_visit
+from .live_feed import publish_check_in, publish_check_out
+from .suggest_index import suggest_index
+from .fuzzy_search import fuzzy_index
+from .search_cache import CATALOGUE_FIELDS, bump_catalogue_version
+
+
+# ── Data versions (stale reports and stats) ─────────────────
+@receiver([post_save, post_delete], sender=LibraryLog)
+def library_log_changed(sender, **kwargs):
+    data_versions.bump_version(data_versions.LIBRARY_LOGS)
+
+
+@receiver([post_save, post_delete], sender=Transaction)
+def transaction_changed(sender, **kwargs):
+    data_versions.bump_version(data_versions.TRANSACTIONS)
+
+
+@receiver([post_save, post_delete], sender=Student)
+def student_changed(sender, **kwargs):
+    data_versions.bump_version(data_versions.STUDENTS)
+
+
+@receiver(pre_save, sender=Book)
+def book_saving(sender, instance, **kwargs):
+    # Whether a search results page could show the change (None: a new book)
+    stored = Book.objects.filter(pk=instance.pk).values(*CATALOGUE_FIELDS).first()
+    instance._catalogue_changed = stored != {field: getattr(instance, field) for field in CATALOGUE_FIELDS}
+
+
+@receiver([post_save, post_delete], sender=Book)
+def book_changed(sender, instance, **kwargs):
+    data_versions.bump_version(data_versions.BOOKS)
+    if getattr(instance, '_catalogue_changed', True):
+        # In the database, so cached search pages go stale in every process
+        bump_catalogue_version()
+
+
+@receiver([post_save, post_delete], sender=RenewRequest)
+def renew_request_changed(sender, **kwargs):
+    data_versions.bump_version(data_versions.RENEW_REQUESTS)
+
+
+# ── Kiosk occupancy index and live dashboard feed ───────────
+@receiver(post_save, sender=LibraryLog)
+def library_log_saved(sender, instance, created, **kwargs):
+    if instance.exit_time is None:
+        occupancy_index.mark_inside(instance.student_id, instance.pk)
+        publish_check_in(
+            instance, new_visit=created and timezone.localdate(instance.entry_time) == timezone.localdate()
+        )
+    else:
+        occupancy_index.mark_outside(instance.student_id, instance.pk)
+        publish_check_out(instance.pk, instance.student_id)
+
+
+@receiver(post_delete, sender=LibraryLog)
+def library_log_deleted(sender, instance, **kwargs):
+    occupancy_index.mark_outside(instance.student_id, instance.pk)
+    publish_check_out(instance.pk, instance.student_id)
+
+
+# ── Dashboard visit counters ────────────────────────────────
+@receiver(post_save, sender=LibraryLog)
+def library_log_created(sender, instance, created, **kwargs):
+    if created:
+        record_visit(instance.student.department, timezone.localdate(instance.entry_time))
+
+
+# ── Typeahead prefix index ──────────────────────────────────
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    transaction.on_commit(partial(
+        suggest_index.update_book, instance.access_code, instance.title, instance.author, created=created
+    ))
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    transaction.on_commit(partial(suggest_index.remove_book, instance.access_code))
+
+
+# ── Fuzzy search vocabulary ─────────────────────────────────
+@receiver(post_save, sender=Book)
+def book_saved_fuzzy(sender, instance, created, **kwargs):
+    transaction.on_commit(partial(fuzzy_index.add_book, instance.title, instance.author, created=created))
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted_fuzzy(sender, instance, **kwargs):
+    transaction.on_commit(fuzzy_index.remove_book)
@@ -0,0 +1,71 @@
+"""
+Statistics snapshot shown on the admin index page.
+
+The counts are computed in one query, a scalar subquery per count, and
+cached for STATS_CACHE_TTL seconds. A snapshot also records the data
+versions it was computed from (see data_versions.py), so any write to one
+of the counted tables makes it stale straight away.
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, Func
+from django.utils import timezone
+from . import data_versions
+
+STATS_CACHE_KEY = 'admin-index-stats'
+
+# The overdue count changes with the clock alone, so snapshots still expire
+STATS_CACHE_TTL = 60
+
+STATS_DEPENDS_ON = (
+    data_versions.STUDENTS,
+    data_versions.BOOKS,
+    data_versions.LIBRARY_LOGS,
+    data_versions.TRANSACTIONS,
+    data_versions.RENEW_REQUESTS,
+)
+
+
+def _count_sql(queryset):
+    """SQL and parameters counting the rows of `queryset`, for use as a scalar subquery."""
+    # COUNT as a plain function rather than an aggregate: no GROUP BY, so
+    # exactly one row even when nothing matches
+    return queryset.order_by().values(n=Func(F('pk'), function='COUNT')).query.sql_with_params()
+
+
+def compute_stats():
+    """Count everything the admin index shows, straight from the database, in one query."""
+    from .models import Student, Book, LibraryLog, Transaction, RenewRequest
+
+    now = timezone.now()
+    counts = {
+        'total_books': Book.objects.all(),
+        'books_available': Book.objects.filter(status='Available'),
+        'books_issued': Book.objects.filter(status='Issued'),
+        'total_students': Student.objects.all(),
+        'inside_now': LibraryLog.objects.filter(exit_time__isnull=True),
+        'overdue': Transaction.objects.filter(returned=False, due_date__lt=now),
+        'pending_renewals': RenewRequest.objects.filter(status='Pending'),
+    }
+    columns, params = [], []
+    for queryset in counts.values():
+        sql, query_params = _count_sql(queryset)
+        columns.append(f'({sql})')
+        params.extend(query_params)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {", ".join(columns)}', params)
+        stats = dict(zip(counts, cursor.fetchone()))
+    stats['computed_at'] = now
+    return stats
+
+
+def get_stats():
+    """The cached snapshot, recomputed when it is older than the TTL or stale."""
+    version = data_versions.get_versions(*STATS_DEPENDS_ON)
+    cached = cache.get(STATS_CACHE_KEY)
+    if cached is not None and cached['version'] == version:
+        return cached['stats']
+
+    stats = compute_stats()
+    cache.set(STATS_CACHE_KEY, {'version': version, 'stats': stats}, timeout=STATS_CACHE_TTL)
+    return stats
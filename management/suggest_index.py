@@ -0,0 +1,268 @@
+"""
+In-memory prefix index for search-as-you-type (/api/books/suggest/).
+
+Every book is indexed under a few keys: its access code and the start of
+its title (tier 0), the start of each author word (tier 1) and the start of
+each later title word (tier 2). Keys are normalised (case, accents and
+punctuation folded away) and truncated to MAX_KEY_CHARS.
+
+The sorted keys, like the books' codes, titles and authors, are packed into
+one string plus an array of offsets, which costs a few bytes per entry
+instead of a Python object each; a lookup is a bisect into that packing
+followed by a short forward scan. If the catalogue would not fit in
+SUGGEST_INDEX_MAX_MB, the lower tiers are left out, and if even tier 0
+does not fit the endpoint falls back to the full-text search.
+
+Each tier is packed and scanned on its own, best tier first, so matches
+in a lower tier can never crowd out those of a higher one; a query stops
+descending once it has enough books.
+
+Books saved or deleted in this process (admin, API) go into a small sorted
+delta that overrides the packed index; once it holds SUGGEST_DELTA_MAX
+books, the packing is rebuilt in a background thread. Changes made by other
+processes are noticed as described in catalogue_index.py.
+"""
+import bisect
+import logging
+import re
+import sys
+import unicodedata
+from array import array
+from operator import itemgetter
+from django.conf import settings
+from .catalogue_index import CatalogueIndex
+
+logger = logging.getLogger('management')
+
+MAX_KEY_CHARS = 40
+# Keys looked at per tier and query before ranking; bounds the worst-case latency
+SCAN_LIMIT = 300
+TIERS = 3
+
+_NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalise(text):
+    """Lower-case, accent-free, single-spaced form used for keys and queries."""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD_RE.sub(' ', text.casefold()).strip()
+
+
+def book_keys(access_code, title, author):
+    """(tier, key) pairs a book is found under."""
+    title = normalise(title)
+    keys = [(0, normalise(access_code)[:MAX_KEY_CHARS]), (0, title[:MAX_KEY_CHARS])]
+    author = normalise(author)
+    keys += [(1, author[m.start():][:MAX_KEY_CHARS]) for m in re.finditer(r'\S+', author)]
+    keys += [(2, title[m.start():][:MAX_KEY_CHARS]) for m in re.finditer(r'\S+', title) if m.start()]
+    return [(tier, key) for tier, key in keys if key]
+
+
+class _PackedStrings:
+    """Read-only sequence of strings stored as one string plus end offsets."""
+
+    def __init__(self, strings):
+        self.offsets = array('I', [0])
+        total = 0
+        for string in strings:
+            total += len(string)
+            self.offsets.append(total)
+        self.blob = ''.join(strings)
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.blob) + self.offsets.itemsize * len(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]]
+
+
+class PackedIndex:
+    """Immutable sorted key -> book packing built from (access_code, title, author) rows."""
+
+    def __init__(self, rows, max_bytes):
+        codes, titles, authors = [], [], []
+        tiers = tuple([] for _ in range(TIERS))
+        for number, (access_code, title, author) in enumerate(rows):
+            codes.append(access_code)
+            titles.append(title)
+            authors.append(author or '')
+            for tier, key in book_keys(access_code, title, author):
+                tiers[tier].append((key, number))
+        self.codes = _PackedStrings(codes)
+        self.titles = _PackedStrings(titles)
+        self.authors = _PackedStrings(authors)
+        del codes, titles, authors
+
+        self.nbytes = self.codes.nbytes + self.titles.nbytes + self.authors.nbytes
+        # Per indexed tier: its sorted keys and the book number of each
+        self.tier_keys = []
+        for entries in tiers:
+            # Key text plus 4-byte offset and book number per entry
+            cost = sum(len(key) + 8 for key, _ in entries)
+            if self.nbytes + cost > max_bytes:
+                break
+            # Stable sort on the key alone: far cheaper than comparing whole tuples
+            entries.sort(key=itemgetter(0))
+            self.tier_keys.append((
+                _PackedStrings([key for key, _ in entries]),
+                array('I', (number for _, number in entries)),
+            ))
+            self.nbytes += cost
+        del tiers
+
+    @property
+    def tiers_indexed(self):
+        return len(self.tier_keys)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def candidates(self, prefix, tier):
+        """Yield (access_code, title, author) for the first SCAN_LIMIT `tier` keys starting with `prefix`."""
+        if tier >= self.tiers_indexed:
+            return
+        keys, books = self.tier_keys[tier]
+        i = bisect.bisect_left(keys, prefix)
+        end = min(len(keys), i + SCAN_LIMIT)
+        while i < end and keys[i].startswith(prefix):
+            number = books[i]
+            yield self.codes[number], self.titles[number], self.authors[number]
+            i += 1
+
+    def lookup(self, access_code):
+        """(title, author) of an indexed book, or None."""
+        # Access codes are tier 0 keys
+        for code, title, author in self.candidates(normalise(access_code)[:MAX_KEY_CHARS], 0):
+            if code == access_code:
+                return title, author
+        return None
+
+
+class SuggestIndex(CatalogueIndex):
+    """The packed index plus the delta of books changed since it was built."""
+    label = 'Suggest index'
+
+    def __init__(self):
+        super().__init__()
+        self._packed = None
+        self._delta = {}        # access_code -> (title, author), or None when deleted
+        self._delta_keys = []   # sorted (tier, key, access_code) for books in the delta
+
+    # ── Building ─────────────────────────────────────────────
+    @staticmethod
+    def _book_rows():
+        from .models import Book
+        return (
+            Book.objects.order_by()
+            .values_list('access_code', 'title', 'author')
+            .iterator(chunk_size=5000)
+        )
+
+    def reload(self):
+        """Build the packed index from the database, replacing the delta."""
+        max_bytes = settings.SUGGEST_INDEX_MAX_MB * 1024 * 1024
+        with self._lock:
+            started_delta = dict(self._delta)
+        packed = PackedIndex(self._book_rows(), max_bytes)
+        with self._lock:
+            self._packed = packed if packed.tiers_indexed else None
+            # Keep only changes made while the build was reading the table
+            self._delta = {code: book for code, book in self._delta.items() if started_delta.get(code, 0) != book}
+            self._rebuild_delta_keys()
+            self._loaded_with(len(packed))
+        if packed.tiers_indexed < TIERS:
+            logger.warning(
+                "Suggest index limited to %d of %d key tiers by SUGGEST_INDEX_MAX_MB.", packed.tiers_indexed, TIERS
+            )
+        logger.info("Suggest index built: %d books, %.1f MB.", len(packed), packed.nbytes / 1024 / 1024)
+
+    def reset(self):
+        with self._lock:
+            self._packed = None
+            self._delta = {}
+            self._delta_keys = []
+            self._loaded = False
+
+    # ── Incremental updates ──────────────────────────────────
+    def _rebuild_delta_keys(self):
+        self._delta_keys = sorted(
+            (tier, key, code)
+            for code, book in self._delta.items() if book
+            for tier, key in book_keys(code, *book)
+        )
+
+    def update_book(self, access_code, title, author, created=False):
+        with self._lock:
+            if not self._loaded:
+                return
+            if created:
+                self._book_count += 1
+            book = (title, author or '')
+            if access_code not in self._delta and self._packed is not None \
+                    and self._packed.lookup(access_code) == book:
+                # Issue/return and other edits that don't touch the indexed fields
+                return
+            self._delta[access_code] = book
+            self._rebuild_delta_keys()
+            too_big = len(self._delta) >= settings.SUGGEST_DELTA_MAX
+        if too_big:
+            self._rebuild_in_background()
+
+    def remove_book(self, access_code):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._book_count -= 1
+            self._delta[access_code] = None
+            self._rebuild_delta_keys()
+
+    # ── Queries ──────────────────────────────────────────────
+    @property
+    def available(self):
+        with self._lock:
+            self._ensure_fresh()
+            return self._packed is not None
+
+    def suggest(self, query, limit=10):
+        """Up to `limit` books whose title, author words or access code start with `query`."""
+        prefix = normalise(query)[:MAX_KEY_CHARS]
+        if not prefix:
+            return []
+        with self._lock:
+            self._ensure_fresh()
+            # The delta is changed in place by writers; look at a copy
+            packed, delta, delta_keys = self._packed, dict(self._delta), self._delta_keys
+
+        found = {}
+        for tier in range(TIERS):
+            # A book is ranked by its best tier, which comes first
+            if packed is not None:
+                for code, title, author in packed.candidates(prefix, tier):
+                    if code not in delta and code not in found:
+                        found[code] = (tier, title, author)
+            i = bisect.bisect_left(delta_keys, (tier, prefix))
+            while i < len(delta_keys) and delta_keys[i][0] == tier and delta_keys[i][1].startswith(prefix):
+                code = delta_keys[i][2]
+                if code not in found:
+                    title, author = delta[code]
+                    found[code] = (tier, title, author)
+                i += 1
+            if len(found) >= limit:
+                # Books found in lower tiers would rank after these
+                break
+
+        ranked = sorted(found.items(), key=lambda item: (item[1][0], item[1][1].casefold(), item[0]))
+        return [
+            {'access_code': code, 'title': title, 'author': author}
+            for code, (_, title, author) in ranked[:limit]
+        ]
+
+
+suggest_index = SuggestIndex()
@@ -107,6 +107,231 @@ class TransactionModelTest(TestCase):
         self.assertTrue(tx.is_overdue)
 
 
+class CirculationTest(TestCase):
+    """Test that issues, returns and renewals keep Book.status and current_holder in step."""
+
+    def setUp(self):
+        self.student = Student.objects.create(enrollment_id='STU-001', name='Pavan Kumar', email='p@college.edu')
+        self.other = Student.objects.create(enrollment_id='STU-002', name='Asha Patel', email='a@college.edu')
+        self.book = Book.objects.create(access_code='BK-101', title='Clean Code', shelf_location='A-1')
+
+    def issue(self, enrollment_id, access_code='BK-101'):
+        return self.client.post('/issue-book/', {'enrollment_id': enrollment_id, 'access_code': access_code})
+
+    def test_issue_desk_marks_book_issued(self):
+        self.assertEqual(self.issue('STU-001').status_code, 302)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.status, self.book.current_holder_id), ('Issued', 'STU-001'))
+        self.assertTrue(Transaction.objects.filter(book=self.book, student=self.student, returned=False).exists())
+
+    def test_availability_is_read_from_the_book_row(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.issue('STU-001')
+        with CaptureQueriesContext(connection) as captured:
+            response = self.issue('STU-002')
+        self.assertContains(response, 'currently issued to Pavan Kumar')
+        self.assertFalse(any('management_transaction' in q['sql'] for q in captured.captured_queries))
+        # The holder themselves is offered a renewal instead
+        self.assertIsNotNone(self.issue('STU-001').context['own_active_issue'])
+
+    def test_lost_race_is_reported(self):
+        from .circulation import BookUnavailable, issue_book
+        issue_book(self.student, self.book)
+        with self.assertRaises(BookUnavailable):
+            issue_book(self.other, Book.objects.get(pk='BK-101'))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.current_holder_id, 'STU-001')
+
+    def test_issue_claims_book_row_not_stale_copy(self):
+        from .circulation import BookUnavailable, issue_book
+        stale = Book.objects.get(pk='BK-101')
+        issue_book(self.student, self.book)
+        # `stale` still says Available; the database decides
+        self.assertEqual(stale.status, 'Available')
+        with self.assertRaises(BookUnavailable):
+            issue_book(self.other, stale)
+        self.assertEqual(Transaction.objects.filter(book=self.book).count(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.current_holder_id, 'STU-001')
+
+    def test_admin_return_action_frees_book(self):
+        from django.contrib.auth.models import User
+        from .circulation import issue_book
+        loan = issue_book(self.student, self.book)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@college.edu', 'pass'))
+        self.client.post('/admin/management/transaction/', {'action': 'mark_returned', '_selected_action': [loan.pk]})
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.status, self.book.current_holder), ('Available', None))
+        self.assertTrue(Transaction.objects.get(pk=loan.pk).returned)
+
+    def test_bulk_renewal_approval_is_set_based(self):
+        from django.contrib.auth.models import User
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .circulation import issue_book
+        from .models import RenewRequest
+        soon = timezone.now() + timedelta(days=1)
+        loan = issue_book(self.student, self.book, due_date=soon)
+        other_book = Book.objects.create(access_code='BK-102', title='Refactoring', shelf_location='A-1')
+        returned = issue_book(self.other, other_book, due_date=soon)
+        Transaction.objects.filter(pk=returned.pk).update(returned=True)
+        requests = [RenewRequest.objects.create(transaction=loan), RenewRequest.objects.create(transaction=loan),
+                    RenewRequest.objects.create(transaction=returned)]
+        done = RenewRequest.objects.create(transaction=loan, status='Rejected')
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@college.edu', 'pass'))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/admin/management/renewrequest/', {
+                'action': 'approve_requests', '_selected_action': [r.pk for r in requests] + [done.pk],
+            }, follow=True)
+        self.assertContains(response, '3 request(s) approved; 1 loan(s) now due in 15 days.')
+        updates = [q['sql'] for q in captured.captured_queries
+                   if q['sql'].startswith('UPDATE') and 'management_dataversion' not in q['sql']]
+        self.assertEqual(len(updates), 2)
+        # Filtered on id lists: MySQL rejects an UPDATE whose WHERE selects from its own table
+        self.assertFalse(any('SELECT' in q for q in updates))
+        loan.refresh_from_db()
+        self.assertGreater(loan.due_date, timezone.now() + timedelta(days=14))
+        self.assertEqual(Transaction.objects.get(pk=returned.pk).due_date, soon)
+        self.assertEqual(RenewRequest.objects.get(pk=done.pk).status, 'Rejected')
+
+    def test_bulk_renewal_rejection(self):
+        from .circulation import issue_book, reject_renewals
+        from .models import RenewRequest
+        loan = issue_book(self.student, self.book)
+        RenewRequest.objects.create(transaction=loan)
+        RenewRequest.objects.create(transaction=loan, status='Approved')
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(reject_renewals(RenewRequest.objects.all()), 1)
+        updates = [q['sql'] for q in captured.captured_queries
+                   if q['sql'].startswith('UPDATE') and 'management_dataversion' not in q['sql']]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('SELECT', updates[0])
+        self.assertEqual(sorted(RenewRequest.objects.values_list('status', flat=True)), ['Approved', 'Rejected'])
+
+    def test_auto_approval_leaves_exceptions_for_staff(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .circulation import issue_book
+        from .models import RenewRequest
+        from .renewal_rules import auto_approve_renewals
+        soon, past = timezone.now() + timedelta(days=2), timezone.now() - timedelta(days=1)
+        books = [Book.objects.create(access_code=f'BK-2{n}', title=f'Book {n}', shelf_location='A-1') for n in range(4)]
+        routine = RenewRequest.objects.create(transaction=issue_book(self.student, self.book, due_date=soon))
+        overdue = RenewRequest.objects.create(transaction=issue_book(self.other, books[0], due_date=past))
+        # The other student's second loan is fine, but they have an overdue book
+        other_overdue = RenewRequest.objects.create(transaction=issue_book(self.other, books[1], due_date=soon))
+        renewed = issue_book(self.student, books[2], due_date=soon)
+        RenewRequest.objects.bulk_create([RenewRequest(transaction=renewed, status='Approved')] * 2)
+        limit = RenewRequest.objects.create(transaction=renewed)
+
+        with CaptureQueriesContext(connection) as captured:
+            summary = auto_approve_renewals()
+        # One aggregate over the pending requests, the ids of the routine ones,
+        # then the two approval UPDATEs
+        sql = [q['sql'] for q in captured.captured_queries
+               if 'SAVEPOINT' not in q['sql'] and 'management_dataversion' not in q['sql']]
+        self.assertEqual([q.split()[0] for q in sql], ['SELECT', 'SELECT', 'SELECT', 'UPDATE', 'UPDATE'])
+        self.assertEqual(
+            {key: summary[key] for key in ('pending', 'approved', 'extended', 'overdue', 'other_overdue', 'renewal_limit')},
+            {'pending': 4, 'approved': 1, 'extended': 1, 'overdue': 1, 'other_overdue': 1, 'renewal_limit': 1},
+        )
+        statuses = dict(RenewRequest.objects.filter(
+            pk__in=[routine.pk, overdue.pk, other_overdue.pk, limit.pk]).values_list('pk', 'status'))
+        self.assertEqual(statuses, {routine.pk: 'Approved', overdue.pk: 'Pending',
+                                    other_overdue.pk: 'Pending', limit.pk: 'Pending'})
+        self.assertGreater(Transaction.objects.get(pk=routine.transaction_id).due_date,
+                           timezone.now() + timedelta(days=14))
+
+    def test_repair_command_backfills_status(self):
+        from io import StringIO
+        from django.core.management import call_command
+        # Loans created the old way, plus a book left marked as issued
+        Transaction.objects.create(student=self.student, book=self.book)
+        stale = Book.objects.create(access_code='BK-102', title='Refactoring', shelf_location='A-1')
+        Book.objects.filter(pk=stale.pk).update(status='Issued', current_holder=self.other)
+
+        out = StringIO()
+        call_command('repair_circulation', '--dry-run', stdout=out)
+        self.assertIn('2 book(s) out of step', out.getvalue())
+        self.assertEqual(Book.objects.get(pk='BK-101').status, 'Available')
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as captured:
+            call_command('repair_circulation', stdout=StringIO())
+        # MySQL rejects an UPDATE whose WHERE selects from its own table
+        updates = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('UPDATE "management_book"')]
+        self.assertEqual(len(updates), 2)
+        self.assertFalse(any('FROM "management_book"' in q for q in updates))
+        self.assertEqual(
+            sorted(Book.objects.values_list('access_code', 'status', 'current_holder')),
+            [('BK-101', 'Issued', 'STU-001'), ('BK-102', 'Available', None)],
+        )
+
+    def test_bulk_issue_reports_each_book(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        Book.objects.create(access_code='BK-102', title='Refactoring', shelf_location='A-1')
+        Book.objects.create(access_code='BK-103', title='SICP', shelf_location='A-2')
+        from .circulation import issue_book
+        issue_book(self.other, Book.objects.get(pk='BK-103'))
+
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user('desk', password='x', is_staff=True))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/issue-book/bulk/', {
+                'enrollment_id': 'STU-001', 'action': 'issue',
+                'access_codes': 'BK-101\nBK-102, BK-103 BK-999 BK-101',
+            })
+        results = [(r['access_code'], r['result']) for r in response.context['results']]
+        self.assertEqual(results, [('BK-101', 'issued'), ('BK-102', 'issued'), ('BK-103', 'unavailable'),
+                                   ('BK-999', 'not_found'), ('BK-101', 'duplicate')])
+        self.assertEqual(Transaction.objects.filter(student=self.student, returned=False).count(), 2)
+        # One lookup of the books and one insert of the loans, however many books
+        sql = [q['sql'] for q in captured.captured_queries]
+        self.assertEqual(sum('FROM "management_book"' in q and 'IN' in q for q in sql), 1)
+        self.assertEqual(sum(q.startswith('INSERT INTO "management_transaction"') for q in sql), 1)
+
+    def test_bulk_form_requires_staff(self):
+        from .circulation import issue_book
+        issue_book(self.student, self.book)
+        self.assertEqual(self.client.get('/issue-book/bulk/').status_code, 302)
+        for action in ('issue', 'return'):
+            response = self.client.post('/issue-book/bulk/', {
+                'enrollment_id': 'STU-002' if action == 'issue' else 'STU-001',
+                'action': action, 'access_codes': 'BK-101',
+            })
+            self.assertEqual(response.status_code, 302)
+            self.assertIn('/admin/login/', response['Location'])
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.status, self.book.current_holder_id), ('Issued', 'STU-001'))
+        self.assertEqual(Transaction.objects.filter(returned=False).count(), 1)
+
+    def test_bulk_return_api(self):
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+        from .circulation import issue_book
+        Book.objects.create(access_code='BK-102', title='Refactoring', shelf_location='A-1')
+        issue_book(self.student, self.book)
+        issue_book(self.other, Book.objects.get(pk='BK-102'))
+
+        client = APIClient()
+        payload = {'enrollment_id': 'STU-001', 'action': 'return', 'access_codes': ['BK-101', 'BK-102']}
+        self.assertEqual(client.post('/api/circulation/bulk/', payload, format='json').status_code, 401)
+        client.force_authenticate(User.objects.create_user('desk', password='x', is_staff=True))
+        response = client.post('/api/circulation/bulk/', payload, format='json')
+        self.assertEqual([r['result'] for r in response.data['results']], ['returned', 'not_issued'])
+        self.assertEqual(
+            sorted(Book.objects.values_list('access_code', 'status')), [('BK-101', 'Available'), ('BK-102', 'Issued')]
+        )
+        self.assertEqual(client.post('/api/circulation/bulk/', {**payload, 'enrollment_id': 'NOPE'},
+                                     format='json').status_code, 404)
+
+
 class KioskViewTest(TestCase):
     """Test the Kiosk check-in/check-out flow."""
 
@@ -140,6 +365,33 @@ class KioskViewTest(TestCase):
         log = LibraryLog.objects.filter(student=self.student).last()
         self.assertIsNotNone(log.exit_time)
 
+    def test_kiosk_scan_skips_log_lookup(self):
+        from .occupancy import occupancy_index
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        occupancy_index.reload()
+        # A single statement on the log table for check-in and check-out alike
+        for expected in ('in', 'out'):
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(occupancy_index.toggle(self.student), expected)
+            log_queries = [q['sql'] for q in captured.captured_queries if 'management_librarylog' in q['sql']]
+            self.assertEqual(len(log_queries), 1)
+        self.assertFalse(LibraryLog.objects.filter(exit_time__isnull=True).exists())
+
+    def test_kiosk_scan_does_not_touch_sessions(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/kiosk/', {'barcode': 'STU-001'}, follow=True)
+        self.assertContains(response, 'Welcome')
+        self.assertFalse([q for q in captured.captured_queries if 'django_session' in q['sql']])
+
+    def test_second_open_session_is_rejected(self):
+        from django.db import IntegrityError
+        LibraryLog.objects.create(student=self.student)
+        with self.assertRaises(IntegrityError):
+            LibraryLog.objects.create(student=self.student)
+
     def test_kiosk_unknown_barcode(self):
         response = self.client.post('/kiosk/', {'barcode': 'UNKNOWN-999'}, follow=True)
         self.assertEqual(response.status_code, 200)
@@ -156,6 +408,113 @@ class KioskViewTest(TestCase):
         self.assertContains(response, 'Invalid barcode')
 
 
+class KioskScanApiTest(TestCase):
+    """Test the batched JSON kiosk scan API."""
+
+    def setUp(self):
+        from .occupancy import occupancy_index
+        occupancy_index.reset()
+        self.client = Client()
+        self.student = Student.objects.create(
+            enrollment_id='STU-001', name='Pavan Kumar', email='pavan@college.edu', department='CSE'
+        )
+        from django.test import override_settings
+        tokens = override_settings(KIOSK_API_TOKENS=['kiosk-1-token'])
+        tokens.enable()
+        self.addCleanup(tokens.disable)
+
+    def scan(self, payload, token='kiosk-1-token'):
+        return self.client.post('/api/kiosk/scan/', payload, content_type='application/json',
+                                HTTP_X_KIOSK_TOKEN=token)
+
+    def test_requires_a_kiosk_token(self):
+        for token in ('', 'wrong-token'):
+            response = self.scan({'event_id': 'k1-1', 'barcode': 'STU-001'}, token=token)
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(LibraryLog.objects.exists())
+
+    def test_scans_older_than_the_offline_window_are_not_applied(self):
+        from django.test import override_settings
+        from .models import KioskScanEvent
+        long_ago = timezone.now() - timedelta(days=30)
+        with override_settings(KIOSK_OFFLINE_WINDOW=24 * 60 * 60):
+            response = self.scan({'event_id': 'k1-1', 'barcode': 'STU-001', 'scanned_at': long_ago.isoformat()})
+        self.assertEqual(response.json()['results'][0]['result'], 'expired')
+        self.assertFalse(LibraryLog.objects.exists())
+        self.assertEqual(KioskScanEvent.objects.get().result, 'expired')
+
+    def test_single_scan_checks_in(self):
+        response = self.scan({'event_id': 'k1-1', 'barcode': 'STU-001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['result'], 'in')
+        self.assertTrue(LibraryLog.objects.filter(student=self.student, exit_time__isnull=True).exists())
+
+    def test_batch_uses_device_times(self):
+        entered = timezone.now() - timedelta(hours=2)
+        left = entered + timedelta(minutes=45)
+        # Sent out of order: applied by scanned_at, reported in sent order
+        response = self.scan({'scans': [
+            {'event_id': 'k1-2', 'barcode': 'STU-001', 'scanned_at': left.isoformat()},
+            {'event_id': 'k1-1', 'barcode': 'STU-001', 'scanned_at': entered.isoformat()},
+        ]})
+        self.assertEqual([r['result'] for r in response.json()['results']], ['out', 'in'])
+        log = LibraryLog.objects.get(student=self.student)
+        self.assertEqual(log.entry_time, entered)
+        self.assertEqual(log.exit_time, left)
+
+    def test_replayed_batch_is_not_applied_twice(self):
+        from .models import KioskScanEvent
+        batch = {'scans': [{'event_id': 'k1-1', 'barcode': 'STU-001'}]}
+        self.scan(batch)
+        results = self.scan(batch).json()['results']
+        self.assertEqual(results[0]['result'], 'in')
+        self.assertTrue(results[0]['duplicate'])
+        self.assertEqual(LibraryLog.objects.filter(student=self.student).count(), 1)
+        self.assertIsNone(LibraryLog.objects.get(student=self.student).exit_time)
+        self.assertEqual(KioskScanEvent.objects.count(), 1)
+
+    def test_unknown_and_invalid_barcodes(self):
+        response = self.scan({'scans': [
+            {'event_id': 'k1-1', 'barcode': 'UNKNOWN-999'},
+            {'event_id': 'k1-2', 'barcode': '<script>'},
+        ]})
+        self.assertEqual([r['result'] for r in response.json()['results']], ['unknown', 'invalid'])
+        self.assertFalse(LibraryLog.objects.exists())
+
+    def test_backdated_scan_does_not_end_before_entry(self):
+        self.client.post('/kiosk/', {'barcode': 'STU-001'})
+        log = LibraryLog.objects.get(student=self.student)
+        earlier = log.entry_time - timedelta(hours=1)
+        response = self.scan({'event_id': 'k1-1', 'barcode': 'STU-001', 'scanned_at': earlier.isoformat()})
+        self.assertEqual(response.json()['results'][0]['result'], 'out')
+        log.refresh_from_db()
+        self.assertEqual(log.exit_time, log.entry_time)
+
+    def test_index_lock_not_held_during_writes(self):
+        import threading
+        from django.db.models.signals import pre_save
+        from .occupancy import occupancy_index
+        free = []
+
+        def lock_is_free(**kwargs):
+            # Acquirable from another thread only if the scanning thread doesn't hold it
+            probe = threading.Thread(target=lambda: free.append(
+                occupancy_index._lock.acquire(timeout=0.5) and occupancy_index._lock.release() is None))
+            probe.start()
+            probe.join()
+
+        pre_save.connect(lock_is_free, sender=LibraryLog)
+        try:
+            self.scan({'scans': [{'event_id': 'k1-1', 'barcode': 'STU-001'}]})
+        finally:
+            pre_save.disconnect(lock_is_free, sender=LibraryLog)
+        self.assertEqual(free, [True])
+
+    def test_rejects_bad_payload(self):
+        self.assertEqual(self.scan({'scans': []}).status_code, 400)
+        self.assertEqual(self.scan({'barcode': 'STU-001'}).status_code, 400)
+
+
 class DashboardViewTest(TestCase):
     """Test dashboard requires authentication."""
 
@@ -173,6 +532,741 @@ class DashboardViewTest(TestCase):
         self.assertIn('/admin/login/', response.url)
 
 
+class AdminStatsTest(TestCase):
+    """Test the cached statistics snapshot on the admin index."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.student = Student.objects.create(
+            enrollment_id='STU-001', name='Pavan Kumar', email='pavan@college.edu', department='CSE'
+        )
+        Book.objects.create(access_code='B-1', title='Book One', status='Available')
+        Book.objects.create(access_code='B-2', title='Book Two', status='Issued')
+        LibraryLog.objects.create(student=self.student)
+
+    def test_snapshot_is_cached_until_a_write(self):
+        from .stats import get_stats
+        stats = get_stats()
+        self.assertEqual(
+            {k: v for k, v in stats.items() if k != 'computed_at'},
+            {'total_students': 1, 'total_books': 2, 'books_available': 1, 'books_issued': 1,
+             'inside_now': 1, 'overdue': 0, 'pending_renewals': 0},
+        )
+        with self.assertNumQueries(1):    # the data versions
+            self.assertEqual(get_stats(), stats)
+
+        Book.objects.create(access_code='B-3', title='Book Three', status='Available')
+        self.assertEqual(get_stats()['total_books'], 3)
+
+    def test_counts_take_one_query(self):
+        from .stats import compute_stats
+        Transaction.objects.create(student=self.student, book=Book.objects.get(access_code='B-2'),
+                                   due_date=timezone.now() - timedelta(days=1))
+        with self.assertNumQueries(1):
+            stats = compute_stats()
+        self.assertEqual((stats['overdue'], stats['inside_now'], stats['pending_renewals']), (1, 1, 0))
+
+    def test_writes_from_other_processes_make_the_snapshot_stale(self):
+        from .models import DataVersion
+        from .stats import get_stats
+        get_stats()
+        # What another process's bump_version leaves behind: only the database row changes
+        Book.objects.bulk_create([Book(access_code='B-3', title='Book Three', status='Available')])
+        DataVersion.objects.filter(name='books').update(version='written-elsewhere')
+        self.assertEqual(get_stats()['total_books'], 3)
+
+    def test_admin_index_shows_computed_time(self):
+        from django.contrib.auth.models import User
+        admin_user = User.objects.create_superuser('admin', 'admin@college.edu', 'pass')
+        self.client.force_login(admin_user)
+        response = self.client.get('/admin/')
+        self.assertContains(response, 'Stats computed at')
+        self.assertContains(response, 'Pending Renewals')
+
+
+class VisitCounterTest(TestCase):
+    """Test the incrementally maintained dashboard visit counters."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.student = Student.objects.create(
+            enrollment_id='STU-001', name='Pavan Kumar', email='pavan@college.edu', department='Computer'
+        )
+
+    def test_new_logs_are_counted_by_day_and_department(self):
+        from .models import VisitCounter
+        from .visit_counters import visit_totals
+        yesterday = timezone.now() - timedelta(days=1)
+        LibraryLog.objects.create(student=self.student, entry_time=yesterday, exit_time=yesterday)
+        self.client.post('/kiosk/', {'barcode': 'STU-001'})
+        self.client.post('/kiosk/', {'barcode': 'STU-001'})
+        self.client.post('/kiosk/', {'barcode': 'STU-001'})
+
+        counter = VisitCounter.objects.get(day=timezone.localdate(), department='Computer')
+        self.assertEqual(counter.visits, 2)
+        self.assertEqual(visit_totals(), (3, 2))
+
+    def test_dashboard_reads_counters_not_logs(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        LibraryLog.objects.create(student=self.student)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['total_visits'], 1)
+        self.assertEqual(response.context['today_visits'], 1)
+        counts = [q['sql'] for q in captured.captured_queries if 'COUNT(' in q['sql'].upper()]
+        self.assertEqual(counts, [])
+
+    def test_reconcile_rebuilds_from_logs(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .visit_counters import visit_totals
+        log = LibraryLog.objects.create(student=self.student)
+        log.delete()
+        self.assertEqual(visit_totals(), (1, 1))
+        call_command('reconcile_visit_counters', stdout=StringIO())
+        self.assertEqual(visit_totals(), (0, 0))
+
+
+class LiveFeedTest(TestCase):
+    """Test the Server-Sent Events occupancy feed."""
+
+    def setUp(self):
+        from .occupancy import occupancy_index
+        occupancy_index.reset()
+        self.student = Student.objects.create(
+            enrollment_id='STU-001', name='Pavan Kumar', email='pavan@college.edu', department='Computer'
+        )
+
+    def test_ring_buffer_resume_and_resync(self):
+        from .live_feed import OccupancyFeed
+        feed = OccupancyFeed(size=2)
+        start = feed.last_event_id()
+        self.assertEqual(feed.events_after(start, timeout=0), [])
+        feed.publish('in', {'log_id': 1})
+        events = feed.events_after(start, timeout=0)
+        self.assertEqual([(kind, data) for _, kind, data in events], [('in', {'log_id': 1})])
+        # Too far behind for the buffer, or from another server process
+        feed.publish('out', {'log_id': 1})
+        feed.publish('in', {'log_id': 2})
+        self.assertIsNone(feed.events_after(start, timeout=0))
+        self.assertIsNone(feed.events_after('otherepoch-1', timeout=0))
+
+    def test_kiosk_scans_are_published_after_commit(self):
+        from .live_feed import occupancy_feed
+        start = occupancy_feed.last_event_id()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/kiosk/', {'barcode': 'STU-001'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/kiosk/', {'barcode': 'STU-001'})
+        events = occupancy_feed.events_after(start, timeout=0)
+        self.assertEqual([kind for _, kind, _ in events], ['in', 'out'])
+        self.assertEqual(events[0][2]['name'], 'Pavan Kumar')
+        self.assertTrue(events[0][2]['new_visit'])
+
+    def test_feed_streams_deltas(self):
+        from django.test import override_settings
+        from .live_feed import occupancy_feed
+        start = occupancy_feed.last_event_id()
+        occupancy_feed.publish('out', {'log_id': 7, 'enrollment_id': 'STU-001'})
+        with override_settings(LIVE_FEED_STREAM_SECONDS=0.2):
+            response = self.client.get('/dashboard/feed/', HTTP_LAST_EVENT_ID=start)
+            body = ''.join(chunk.decode() for chunk in response.streaming_content)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: out\ndata: {"log_id": 7, "enrollment_id": "STU-001"}', body)
+
+    def test_stream_limit(self):
+        from django.test import override_settings
+        with override_settings(LIVE_FEED_MAX_STREAMS=0):
+            response = self.client.get('/dashboard/feed/')
+        self.assertEqual(response.status_code, 503)
+
+
+class OccupancyRollupTest(TestCase):
+    """Test the hourly occupancy rollup and the analytics API."""
+
+    def setUp(self):
+        self.student = Student.objects.create(
+            enrollment_id='STU-001', name='Pavan Kumar', email='pavan@college.edu', department='Computer'
+        )
+        # Yesterday 10:30 - 12:15 local time
+        self.day = timezone.localdate() - timedelta(days=1)
+        from .date_ranges import local_day_start
+        self.start = local_day_start(self.day) + timedelta(hours=10, minutes=30)
+        LibraryLog.objects.create(
+            student=self.student, entry_time=self.start, exit_time=self.start + timedelta(hours=1, minutes=45)
+        )
+
+    def test_sessions_are_split_across_hours(self):
+        from .models import HourlyOccupancy
+        from .occupancy_rollup import run_rollup
+        self.assertEqual(run_rollup(), 1)
+        rows = {timezone.localtime(r.hour).hour: r for r in HourlyOccupancy.objects.filter(department='Computer')}
+        self.assertEqual({h: r.occupied_seconds for h, r in rows.items()}, {10: 1800, 11: 3600, 12: 900})
+        self.assertEqual((rows[10].visits, rows[10].dwell_seconds), (1, 6300))
+        self.assertEqual(rows[11].visits, 0)
+
+    def test_only_new_or_pending_logs_are_folded(self):
+        from .models import HourlyOccupancy
+        from .occupancy_rollup import run_rollup
+        run_rollup()
+        self.assertEqual(run_rollup(), 0)
+
+        other = Student.objects.create(
+            enrollment_id='STU-002', name='Other', email='other@college.edu', department='Computer'
+        )
+        log = LibraryLog.objects.create(student=other, entry_time=self.start + timedelta(minutes=10))
+        self.assertEqual(run_rollup(), 0)
+        log.exit_time = log.entry_time + timedelta(minutes=20)
+        log.save()
+        self.assertEqual(run_rollup(), 1)
+        hour = HourlyOccupancy.objects.get(hour=self.start.replace(minute=0), department='Computer')
+        self.assertEqual((hour.visits, hour.occupied_seconds), (2, 1800 + 1200))
+
+    def test_logs_committed_late_below_the_watermark_are_folded(self):
+        from unittest import mock
+        from .models import RollupWatermark
+        from .occupancy_rollup import run_rollup
+        others = [Student.objects.create(enrollment_id=f'STU-00{n}', name='Other', email=f'o{n}@college.edu',
+                                         department='Computer') for n in (2, 3)]
+        session = {'entry_time': self.start, 'exit_time': self.start + timedelta(minutes=30)}
+        in_flight = LibraryLog.objects.create(student=others[0], **session)
+        LibraryLog.objects.create(student=others[1], **session)
+        # Not committed yet when the rollup runs
+        in_flight_id = in_flight.pk
+        in_flight.delete()
+        self.assertEqual(run_rollup(), 2)
+        self.assertIn(in_flight_id, RollupWatermark.objects.get().pending_log_ids)
+
+        LibraryLog.objects.create(pk=in_flight_id, student=others[0], **session)
+        self.assertEqual(run_rollup(), 1)
+        self.assertEqual(run_rollup(), 0)
+
+        # A gap left far enough behind is given up on
+        rolled_back = LibraryLog.objects.create(student=others[1], **session)
+        rolled_back_id = rolled_back.pk
+        LibraryLog.objects.create(student=others[1], **session)
+        rolled_back.delete()
+        self.assertEqual(run_rollup(), 1)
+        self.assertEqual(RollupWatermark.objects.get().pending_log_ids, [rolled_back_id])
+        with mock.patch('management.occupancy_rollup.ROLLUP_GAP_IDS', 0):
+            run_rollup()
+        self.assertEqual(RollupWatermark.objects.get().pending_log_ids, [])
+
+    def test_api_serves_rollup(self):
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+        from .occupancy_rollup import run_rollup
+        run_rollup()
+        client = APIClient()
+        response = client.get('/api/analytics/occupancy/')
+        self.assertEqual(response.status_code, 401)
+
+        client.force_authenticate(User.objects.create_user('staff', password='x', is_staff=True))
+        with self.assertNumQueries(2):
+            response = client.get('/api/analytics/occupancy/', {'group': 'hour_of_day', 'department': 'Computer'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['bucket'], r['visits'], r['student_hours']) for r in response.json()['results']],
+            [(10, 1, 0.5), (11, 0, 1.0), (12, 0, 0.25)],
+        )
+        day = client.get('/api/analytics/occupancy/', {'group': 'day'}).json()['results']
+        self.assertEqual(day, [{'bucket': self.day.isoformat(), 'department': 'Computer', 'visits': 1,
+                                'student_hours': 1.75, 'avg_dwell_minutes': 105.0}])
+        self.assertEqual(client.get('/api/analytics/occupancy/', {'group': 'week'}).status_code, 400)
+
+
+class BookSearchTest(TestCase):
+    """Test the full-text book search."""
+
+    def setUp(self):
+        Book.objects.create(access_code='B-1', title='Operating System Concepts',
+                            author='Silberschatz', isbn_no='978-1-118-06333-0', shelf_location='A1')
+        Book.objects.create(access_code='B-2', title='Modern Operating Systems',
+                            author='Tanenbaum', isbn_no='978-0-13-359162-0', shelf_location='A1')
+        Book.objects.create(access_code='B-3', title='Computer Networks',
+                            author='Tanenbaum', isbn_no='978-0-13-212695-3', shelf_location='A2')
+
+    def codes(self, query):
+        from .search_index import search_books
+        return [book.access_code for book in search_books(query)]
+
+    def test_words_and_prefixes_match_any_field(self):
+        self.assertEqual(sorted(self.codes('operating sys')), ['B-1', 'B-2'])
+        self.assertEqual(self.codes('networks tanen'), ['B-3'])
+        self.assertEqual(self.codes('359162'), ['B-2'])
+
+    def test_title_matches_rank_first(self):
+        Book.objects.create(access_code='B-4', title='A Life of Tanenbaum', author='Someone', shelf_location='A3')
+        self.assertEqual(self.codes('tanenbaum')[0], 'B-4')
+
+    def test_index_follows_edits(self):
+        from .models import Book as BookModel
+        book = BookModel.objects.get(access_code='B-3')
+        book.title = 'Data Communications'
+        book.save()
+        self.assertEqual(self.codes('networks'), [])
+        self.assertEqual(self.codes('communications'), ['B-3'])
+        BookModel.objects.bulk_create([BookModel(access_code='B-9', title='Network Security', shelf_location='A4')])
+        self.assertEqual(self.codes('security'), ['B-9'])
+        book.delete()
+        self.assertEqual(self.codes('communications'), [])
+
+    def test_falls_back_when_index_is_unavailable(self):
+        from unittest import mock
+        from django.db import OperationalError
+        with mock.patch('management.search_index._fts5_codes', side_effect=OperationalError('no such table')):
+            self.assertEqual(sorted(self.codes('Operating')), ['B-1', 'B-2'])
+
+    def test_search_outside_a_transaction_opens_none(self):
+        from unittest import mock
+        from django.db import connection
+        # On SQLite every outermost atomic() takes the write lock
+        with mock.patch.object(connection, 'in_atomic_block', False), \
+                mock.patch('management.search_index.transaction.atomic') as atomic:
+            self.assertEqual(sorted(self.codes('operating')), ['B-1', 'B-2'])
+        atomic.assert_not_called()
+
+    def test_search_page(self):
+        response = self.client.get('/search/', {'q': 'operating'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_books'], 2)
+        self.assertContains(response, 'Modern Operating Systems')
+
+
+class BookSearchPaginationTest(TestCase):
+    """Test keyset pagination on the book search page."""
+
+    def setUp(self):
+        for code, title, status in [('B-5', 'Algorithms', 'Issued'), ('B-4', 'Algorithms', 'Available'),
+                                    ('B-3', 'Compilers', 'Available'), ('B-2', 'Databases', 'Issued'),
+                                    ('B-1', 'Networks', 'Available')]:
+            Book.objects.create(access_code=code, title=title, status=status, shelf_location='A1')
+
+    def get(self, **params):
+        from django.test import override_settings
+        with override_settings(BOOK_SEARCH_PAGE_SIZE=2):
+            return self.client.get('/search/', params)
+
+    def codes(self, response):
+        return [book.access_code for book in response.context['books']]
+
+    def test_pages_forward_and_back(self):
+        first = self.get()
+        self.assertEqual(self.codes(first), ['B-4', 'B-5'])
+        self.assertIsNone(first.context['page'].previous_cursor)
+
+        second = self.get(after=first.context['page'].next_cursor)
+        self.assertEqual(self.codes(second), ['B-3', 'B-2'])
+        third = self.get(after=second.context['page'].next_cursor)
+        self.assertEqual(self.codes(third), ['B-1'])
+        self.assertIsNone(third.context['page'].next_cursor)
+
+        back = self.get(before=third.context['page'].previous_cursor)
+        self.assertEqual(self.codes(back), ['B-3', 'B-2'])
+        self.assertEqual(self.codes(self.get(before=back.context['page'].previous_cursor)), ['B-4', 'B-5'])
+
+    def test_counts_use_one_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as captured:
+            response = self.get()
+        self.assertEqual((response.context['total_books'], response.context['available_books']), (5, 3))
+        self.assertEqual(len([q for q in captured.captured_queries if 'COUNT(' in q['sql'].upper()]), 1)
+
+    def test_ranked_results_page_in_rank_order(self):
+        Book.objects.create(access_code='B-6', title='Algorithms Unlocked', shelf_location='A1')
+        first = self.get(q='algorithms')
+        self.assertEqual(first.context['total_books'], 3)
+        rest = self.get(q='algorithms', after=first.context['page'].next_cursor)
+        self.assertEqual(len(self.codes(first) + self.codes(rest)), 3)
+        self.assertEqual(set(self.codes(first) + self.codes(rest)), {'B-4', 'B-5', 'B-6'})
+
+    def test_bad_cursor_shows_first_page(self):
+        self.assertEqual(self.codes(self.get(after='not-a-cursor')), ['B-4', 'B-5'])
+
+    def test_cursor_of_the_wrong_types_shows_first_page(self):
+        from .pagination import encode_cursor
+        first = self.codes(self.get(q='algorithms'))
+        for values in (['abc', 'B-4'], [{'a': 1}, 'x'], [None, 'x']):
+            for direction in ('after', 'before'):
+                response = self.get(q='algorithms', **{direction: encode_cursor(values)})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.codes(response), first)
+
+    def test_matches_past_the_ranked_ones_are_counted_and_paged(self):
+        import functools
+        from unittest import mock
+        from .search_index import search_books
+        Book.objects.create(access_code='B-6', title='Algorithms Unlocked', shelf_location='A1')
+        with mock.patch('management.views.search_books', functools.partial(search_books, ranked=1)):
+            first = self.get(q='algorithms')
+            rest = self.get(q='algorithms', after=first.context['page'].next_cursor)
+        self.assertEqual((first.context['total_books'], first.context['available_books']), (3, 2))
+        self.assertEqual(len(self.codes(first) + self.codes(rest)), 3)
+        self.assertEqual(set(self.codes(first) + self.codes(rest)), {'B-4', 'B-5', 'B-6'})
+        self.assertIsNone(rest.context['page'].next_cursor)
+
+
+class SearchCacheTest(TestCase):
+    """Test the book search result cache."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .search_cache import cache_stats
+        cache.clear()
+        cache_stats.reset()
+        self.stats = cache_stats
+        Book.objects.create(access_code='DS-1', title='Data Structures', shelf_location='A1')
+        Book.objects.create(access_code='DS-2', title='Data Structures in C', status='Issued', shelf_location='A1')
+
+    def search(self, q):
+        response = self.client.get('/search/', {'q': q})
+        return [book.access_code for book in response.context['books']], response.context['available_books']
+
+    def test_repeated_query_is_served_from_cache(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.assertEqual(self.search('data structures'), (['DS-1', 'DS-2'], 1))
+        with CaptureQueriesContext(connection) as captured:
+            # Case and spacing don't make a new entry
+            self.assertEqual(self.search('  Data   STRUCTURES '), (['DS-1', 'DS-2'], 1))
+        self.assertEqual(len(captured.captured_queries), 3)    # versions + the page's books
+        self.assertEqual((self.stats.hits, self.stats.misses), (1, 1))
+
+    def test_book_writes_make_cached_pages_stale(self):
+        self.search('data structures')
+        Book.objects.filter(access_code='DS-2').get().delete()
+        self.assertEqual(self.search('data structures'), (['DS-1'], 1))
+        book = Book.objects.get(access_code='DS-1')
+        book.title = 'Data Structures and Algorithms'
+        book.save()
+        self.search('data structures')
+        self.assertEqual(self.stats.hits, 0)
+
+    def test_circulation_keeps_cached_pages(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import circulation
+        from .search_cache import catalogue_version
+        student = Student.objects.create(enrollment_id='S-1', name='Reader', email='reader@example.com')
+        self.search('data structures')
+        version = catalogue_version()
+        with CaptureQueriesContext(connection) as captured:
+            loan = circulation.issue_book(student, Book.objects.get(access_code='DS-1'))
+        self.assertFalse([q for q in captured.captured_queries if 'catalogueversion' in q['sql'].lower()])
+        # The page is still cached; the status and the count are current
+        response = self.client.get('/search/', {'q': 'data structures'})
+        self.assertEqual([book.status for book in response.context['books']], ['Issued', 'Issued'])
+        self.assertEqual(response.context['available_books'], 0)
+        circulation.return_book(loan)
+        self.assertEqual(self.search('data structures'), (['DS-1', 'DS-2'], 1))
+        self.assertEqual(catalogue_version(), version)
+        self.assertEqual((self.stats.hits, self.stats.misses), (2, 1))
+
+    def test_import_makes_cached_pages_stale(self):
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        self.search('data structures')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write('access_code,title,shelf_location\nDS-3,Data Structures Using Python,A2\n')
+        self.addCleanup(os.remove, f.name)
+        call_command('import_data', 'books', f.name, stdout=StringIO())
+        self.assertEqual(self.search('data structures')[0], ['DS-1', 'DS-2', 'DS-3'])
+
+    def test_stats_api(self):
+        from django.contrib.auth.models import User
+        from rest_framework_simplejwt.tokens import RefreshToken
+        self.search('data structures')
+        self.search('data structures')
+        admin = User.objects.create_user('admin', password='pw', is_staff=True)
+        token = RefreshToken.for_user(admin).access_token
+        response = self.client.get('/api/search/cache-stats/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['hits'], response.json()['misses'], response.json()['hit_rate']), (1, 1, 0.5))
+        self.assertEqual(self.client.get('/api/search/cache-stats/').status_code, 401)
+
+
+class FuzzySearchTest(TestCase):
+    """Test typo correction for searches that find nothing."""
+
+    def setUp(self):
+        from .fuzzy_search import fuzzy_index
+        self.index = fuzzy_index
+        self.index.reset()
+        self.addCleanup(self.index.reset)
+        Book.objects.create(access_code='TD-1', title='Engineering Thermodynamics',
+                            author='P K Nag', shelf_location='C1')
+        Book.objects.create(access_code='TD-2', title='Fluid Mechanics', author='Frank White', shelf_location='C1')
+
+    def test_trigram_similarity(self):
+        from .fuzzy_search import TrigramIndex, similarity, trigrams
+        self.assertEqual(trigrams('cat'), {'  c', ' ca', 'cat', 'at '})
+        self.assertEqual(similarity(trigrams('fluid'), trigrams('fluid')), 1.0)
+        index = TrigramIndex({'fluid': 3, 'fluids': 1, 'mechanics': 1})
+        self.assertEqual(sorted(word for _, _, word in index.similar('fluid')), ['fluid', 'fluids'])
+        self.assertEqual(index.similar('xyz'), [])
+
+    def test_correct_query(self):
+        from .fuzzy_search import correct_query
+        self.assertEqual(correct_query('Thermodynamcis'), 'thermodynamics')
+        self.assertEqual(correct_query('fluid mechancs'), 'fluid mechanics')
+        self.assertIsNone(correct_query('fluid mechanics'))
+        self.assertIsNone(correct_query('qwertyuiop'))
+
+    def test_search_page_falls_back_to_corrected_words(self):
+        response = self.client.get('/search/', {'q': 'Thermodynamcis'})
+        self.assertEqual(response.context['corrected_query'], 'thermodynamics')
+        self.assertEqual([book.access_code for book in response.context['books']], ['TD-1'])
+        self.assertContains(response, 'Showing results for')
+
+        response = self.client.get('/search/', {'q': 'fluid'})
+        self.assertIsNone(response.context['corrected_query'])
+
+    def test_words_of_new_books_are_added(self):
+        from .fuzzy_search import correct_query
+        self.index.reload()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(access_code='TD-3', title='Heat Transfer', shelf_location='C2')
+        self.assertEqual(correct_query('transfr'), 'transfer')
+
+
+class BookIsbnTest(TestCase):
+    """Test ISBN normalisation and exact ISBN lookups."""
+
+    def setUp(self):
+        self.book = Book.objects.create(access_code='IS-1', title='A Book', isbn_no='0-306-40615-2',
+                                        shelf_location='A1')
+
+    def test_normalize_isbn(self):
+        from .isbn import normalize_isbn
+        self.assertEqual(normalize_isbn('0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalize_isbn('ISBN 978 0 306 40615 7'), '9780306406157')
+        self.assertEqual(normalize_isbn('080442957x'), '9780804429573')
+        self.assertIsNone(normalize_isbn('0-306-40615-3'))    # bad check digit
+        self.assertIsNone(normalize_isbn('operating systems'))
+        self.assertIsNone(normalize_isbn(None))
+
+    def test_set_on_save_and_import(self):
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        self.assertEqual(self.book.isbn13, '9780306406157')
+        self.book.isbn_no = 'unknown'
+        self.book.save(update_fields=['isbn_no'])
+        self.book.refresh_from_db()
+        self.assertIsNone(self.book.isbn13)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write('access_code,title,isbn_no,shelf_location\nIS-2,Imported,978-0-8044-2957-3,A2\n')
+        self.addCleanup(os.remove, f.name)
+        call_command('import_data', 'books', f.name, stdout=StringIO())
+        self.assertEqual(Book.objects.get(access_code='IS-2').isbn13, '9780804429573')
+
+    def test_search_matches_either_spelling(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .search_index import search_books
+        with CaptureQueriesContext(connection) as captured:
+            codes = [book.access_code for book in search_books('978-0306406157')]
+        self.assertEqual(codes, ['IS-1'])
+        self.assertTrue(all('isbn13' in q['sql'] for q in captured.captured_queries))
+        response = self.client.get('/search/', {'q': '0306406152'})
+        self.assertEqual([book.access_code for book in response.context['books']], ['IS-1'])
+
+    def test_isbn_api(self):
+        response = self.client.get('/api/books/isbn/978-0-306-40615-7/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['isbn13'], '9780306406157')
+        self.assertEqual([book['access_code'] for book in response.json()['results']], ['IS-1'])
+        self.assertEqual(self.client.get('/api/books/isbn/080442957X/').status_code, 404)
+        self.assertEqual(self.client.get('/api/books/isbn/12345/').status_code, 400)
+
+
+class SuggestIndexTest(TestCase):
+    """Test the typeahead prefix index and /api/books/suggest/."""
+
+    def setUp(self):
+        from .suggest_index import suggest_index
+        self.index = suggest_index
+        self.index.reset()
+        self.addCleanup(self.index.reset)
+        Book.objects.create(access_code='CS-101', title='Introduction to Algorithms',
+                            author='Thomas Cormen', shelf_location='A1')
+        Book.objects.create(access_code='CS-102', title='The Algorithm Design Manual',
+                            author='Steven Skiena', shelf_location='A1')
+        Book.objects.create(access_code='HI-201', title='Histoire de la Révolution',
+                            author='Jules Michelet', shelf_location='B1')
+
+    def codes(self, query, **kwargs):
+        return [book['access_code'] for book in self.index.suggest(query, **kwargs)]
+
+    def test_prefixes_of_titles_authors_and_codes(self):
+        self.assertEqual(self.codes('intro'), ['CS-101'])
+        self.assertEqual(self.codes('CORM'), ['CS-101'])
+        self.assertEqual(self.codes('cs-1'), ['CS-101', 'CS-102'])
+        self.assertEqual(self.codes('revolu'), ['HI-201'])
+        self.assertEqual(self.codes('zzz'), [])
+
+    def test_title_starts_rank_before_later_words(self):
+        # 'Algorithm' starts CS-102's third word but CS-101's second: same tier, then by title
+        Book.objects.create(access_code='CS-103', title='Algorithms Unlocked', shelf_location='A1')
+        self.index.reload()
+        self.assertEqual(self.codes('algo'), ['CS-103', 'CS-101', 'CS-102'])
+        self.assertEqual(self.codes('algo', limit=1), ['CS-103'])
+
+    def test_saves_and_deletes_update_the_index(self):
+        self.index.reload()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(access_code='CS-104', title='Compilers', author='Aho', shelf_location='A2')
+        self.assertEqual(self.codes('compil'), ['CS-104'])
+        book = Book.objects.get(access_code='CS-101')
+        book.title = 'Concrete Mathematics'
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+        self.assertEqual(self.codes('intro'), [])
+        self.assertEqual(self.codes('concrete'), ['CS-101'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(access_code='CS-104').delete()
+        self.assertEqual(self.codes('compil'), [])
+
+    def test_query_reads_a_snapshot_of_the_delta(self):
+        from unittest import mock
+        self.index.reload()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(access_code='CS-104', title='Compilers', author='Aho', shelf_location='A2')
+        packed = self.index._packed
+        candidates = packed.candidates
+
+        def deleted_meanwhile(prefix, tier):
+            # Another thread deletes the book while this query is running
+            self.index.remove_book('CS-104')
+            return candidates(prefix, tier)
+
+        with mock.patch.object(packed, 'candidates', deleted_meanwhile):
+            self.assertEqual(self.codes('compil'), ['CS-104'])
+        self.assertEqual(self.codes('compil'), [])
+
+    def test_scan_limit_does_not_drop_better_tiers(self):
+        from unittest import mock
+        for n in range(3):
+            Book.objects.create(access_code=f'VOL-{n}', title=f'Volume {n}', author=f'Alan Author{n}',
+                                shelf_location='A1')
+        Book.objects.create(access_code='BOT-1', title='Alpine Flora', shelf_location='A1')
+        self.index.reload()
+        # The three 'alan ...' author keys sort before 'alpine flora'
+        with mock.patch('management.suggest_index.SCAN_LIMIT', 2):
+            self.assertEqual(self.codes('al', limit=1), ['BOT-1'])
+
+    def test_status_changes_leave_the_delta_empty(self):
+        self.index.reload()
+        book = Book.objects.get(access_code='CS-101')
+        book.status = 'Issued'
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+        self.assertEqual(self.index._delta, {})
+
+    def test_bulk_import_is_noticed_by_the_count_check(self):
+        from unittest import mock
+        self.index.reload()
+        Book.objects.bulk_create([Book(access_code='CS-105', title='Compilers', shelf_location='A2')])
+        self.index._checked_at -= 60
+        with mock.patch.object(self.index, '_rebuild_in_background', self.index.reload):
+            self.assertEqual(self.codes('compil'), ['CS-105'])
+
+    def test_memory_budget_drops_lower_tiers(self):
+        from .suggest_index import PackedIndex
+        rows = [('CS-101', 'Introduction to Algorithms', 'Thomas Cormen')]
+        self.assertEqual(PackedIndex(rows, 10_000).tiers_indexed, 3)
+        small = PackedIndex(rows, PackedIndex(rows, 0).nbytes + 60)
+        self.assertEqual(small.tiers_indexed, 1)
+        self.assertEqual(PackedIndex(rows, 0).tiers_indexed, 0)
+
+    def test_suggest_endpoint(self):
+        response = self.client.get('/api/books/suggest/', {'q': 'skie'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'access_code': 'CS-102', 'title': 'The Algorithm Design Manual', 'author': 'Steven Skiena'},
+        ])
+        self.assertEqual(self.client.get('/api/books/suggest/', {'q': ''}).json()['results'], [])
+
+    def test_endpoint_falls_back_without_index(self):
+        from django.test import override_settings
+        with override_settings(SUGGEST_INDEX_MAX_MB=0):
+            response = self.client.get('/api/books/suggest/', {'q': 'algorithms'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('CS-101', [book['access_code'] for book in response.json()['results']])
+
+
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+
+
+class FlakySmtpBackend(LocmemBackend):
+    """In-memory backend that counts connections and can drop one or refuse an address."""
+    opened = 0
+    drop_before = None      # message number whose first attempt loses the connection
+    refuse = set()
+    attempts = 0
+
+    def open(self):
+        FlakySmtpBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        import smtplib
+        FlakySmtpBackend.attempts += 1
+        if FlakySmtpBackend.attempts == FlakySmtpBackend.drop_before:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        for message in messages:
+            if set(message.to) & FlakySmtpBackend.refuse:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+class ReminderEmailTest(TestCase):
+    """Test that reminders share SMTP connections and survive a dropped one."""
+
+    def setUp(self):
+        from django.core import mail
+        mail.outbox = []
+        FlakySmtpBackend.opened = FlakySmtpBackend.attempts = 0
+        FlakySmtpBackend.drop_before, FlakySmtpBackend.refuse = None, set()
+        for n in range(5):
+            student = Student.objects.create(enrollment_id=f'STU-{n}', name=f'Student {n}', email=f's{n}@college.edu')
+            book = Book.objects.create(access_code=f'BK-{n}', title=f'Book {n}', shelf_location='A-1')
+            loan = Transaction.objects.create(student=student, book=book)
+            Transaction.objects.filter(pk=loan.pk).update(issue_date=timezone.now() - timedelta(days=14))
+
+    def send(self):
+        from django.test import override_settings
+        from .tasks import send_due_reminders
+        with override_settings(EMAIL_BACKEND='management.tests.FlakySmtpBackend', EMAIL_BATCH_SIZE=2):
+            send_due_reminders()
+        from django.core import mail
+        return sorted(message.to[0] for message in mail.outbox)
+
+    def test_one_connection_per_batch(self):
+        self.assertEqual(self.send(), [f's{n}@college.edu' for n in range(5)])
+        self.assertEqual(FlakySmtpBackend.opened, 3)
+
+    def test_dropped_connection_is_reopened_without_duplicates(self):
+        FlakySmtpBackend.drop_before = 2
+        self.assertEqual(self.send(), [f's{n}@college.edu' for n in range(5)])
+        self.assertEqual(FlakySmtpBackend.opened, 4)
+
+    def test_refused_address_does_not_stop_the_rest(self):
+        FlakySmtpBackend.refuse = {'s1@college.edu'}
+        with self.assertLogs('management', 'ERROR'):
+            sent = self.send()
+        self.assertEqual(sent, ['s0@college.edu', 's2@college.edu', 's3@college.edu', 's4@college.edu'])
+        self.assertEqual(FlakySmtpBackend.opened, 3)
+
+
 class ExportViewTest(TestCase):
     """Test export functionality for authenticated users."""
 
@@ -200,3 +1294,330 @@ class ExportViewTest(TestCase):
             response['Content-Type'],
             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
+
+
+class ReportExportTest(TestCase):
+    """Test the streaming report exports."""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.admin = User.objects.create_superuser('admin', 'admin@test.com', 'testpass123')
+        self.client = Client()
+        self.client.login(username='admin', password='testpass123')
+        self.student = Student.objects.create(
+            enrollment_id='230180107001',
+            name='Pavan Kumar',
+            email='pavan@college.edu',
+            mobile_no='9876543210',
+            department='Computer'
+        )
+        self.book = Book.objects.create(
+            access_code='BK-101',
+            title='Clean Code',
+            author='Robert Martin',
+            shelf_location='A-1'
+        )
+
+    def test_entry_exit_xlsx(self):
+        import io
+        from openpyxl import load_workbook
+        LibraryLog.objects.create(student=self.student)
+        response = self.client.get('/admin/reports/entry-exit/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'],
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook['Entry-Exit Report'].values)
+        self.assertEqual(rows[0][0], 'Enrollment ID')
+        self.assertEqual(rows[1][0], '230180107001')
+        self.assertEqual(rows[1][5], 'Still Inside')
+
+    def test_book_issues_csv_streams(self):
+        Transaction.objects.create(student=self.student, book=self.book)
+        response = self.client.get('/admin/reports/book-issues/', {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        lines = content.splitlines()
+        self.assertTrue(lines[0].startswith('Enrollment ID,Student Name'))
+        self.assertIn('BK-101,Clean Code,Robert Martin,A-1', lines[1])
+        self.assertTrue(lines[1].endswith('Pending'))
+
+    def test_overdue_csv_empty(self):
+        response = self.client.get('/admin/reports/overdue-students/', {'format': 'csv'})
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_preview_is_limited_and_counted(self):
+        LibraryLog.objects.bulk_create([
+            LibraryLog(student=self.student, exit_time=timezone.now()) for _ in range(20)
+        ])
+        response = self.client.get('/admin/reports/entry-exit/', {'mode': 'preview'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['rows']), 15)
+        self.assertEqual(response.context['total_rows'], 20)
+        self.assertContains(response, 'Showing 15 of 20 matching rows.')
+
+
+class DateRangeFilterTest(TestCase):
+    """The datetime-range filters must select the same rows as the `__date` lookups."""
+
+    def setUp(self):
+        from datetime import datetime
+        from zoneinfo import ZoneInfo
+        self.student = Student.objects.create(
+            enrollment_id='230180107001',
+            name='Pavan Kumar',
+            email='pavan@college.edu',
+            department='Computer'
+        )
+        ist = ZoneInfo('Asia/Kolkata')
+        # Around local midnight, where local and UTC dates disagree
+        moments = [
+            datetime(2024, 1, 9, 23, 59, 59, tzinfo=ist),
+            datetime(2024, 1, 10, 0, 0, 0, tzinfo=ist),
+            datetime(2024, 1, 10, 3, 0, 0, tzinfo=ist),
+            datetime(2024, 1, 10, 23, 59, 59, 999999, tzinfo=ist),
+            datetime(2024, 1, 11, 0, 0, 0, tzinfo=ist),
+            datetime(2024, 1, 11, 12, 0, 0, tzinfo=ist),
+        ]
+        for moment in moments:
+            log = LibraryLog.objects.create(student=self.student, exit_time=timezone.now())
+            LibraryLog.objects.filter(pk=log.pk).update(entry_time=moment, exit_time=moment + timedelta(hours=1))
+
+    def assertSameRows(self, old_filter, date_from, date_to):
+        from .date_ranges import date_range_filter
+        expected = set(LibraryLog.objects.filter(**old_filter).values_list('pk', flat=True))
+        actual = set(LibraryLog.objects.filter(
+            **date_range_filter('entry_time', date_from, date_to)
+        ).values_list('pk', flat=True))
+        self.assertEqual(actual, expected)
+
+    def test_single_day(self):
+        self.assertSameRows({'entry_time__date': '2024-01-10'}, '2024-01-10', '2024-01-10')
+
+    def test_open_ended_ranges(self):
+        self.assertSameRows({'entry_time__date__gte': '2024-01-10'}, '2024-01-10', '')
+        self.assertSameRows({'entry_time__date__lte': '2024-01-10'}, '', '2024-01-10')
+
+    def test_multi_day_range(self):
+        self.assertSameRows(
+            {'entry_time__date__gte': '2024-01-09', 'entry_time__date__lte': '2024-01-10'},
+            '2024-01-09', '2024-01-10'
+        )
+
+    def test_day_filter_matches_date_lookup(self):
+        from datetime import date
+        from .date_ranges import day_filter
+        expected = set(LibraryLog.objects.filter(entry_time__date=date(2024, 1, 11)).values_list('pk', flat=True))
+        actual = set(LibraryLog.objects.filter(**day_filter('entry_time', date(2024, 1, 11))).values_list('pk', flat=True))
+        self.assertEqual(actual, expected)
+        self.assertEqual(len(actual), 2)
+
+
+class ReportJobTest(TestCase):
+    """Test background report jobs and artifact reuse."""
+
+    def setUp(self):
+        import tempfile
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        self.artifact_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            REPORT_JOB_WORKERS=0, REPORT_ARTIFACT_DIR=self.artifact_dir.name
+        )
+        self.settings_override.enable()
+        self.admin = User.objects.create_superuser('admin', 'admin@test.com', 'testpass123')
+        self.client = Client()
+        self.client.login(username='admin', password='testpass123')
+        self.student = Student.objects.create(
+            enrollment_id='230180107001',
+            name='Pavan Kumar',
+            email='pavan@college.edu',
+            mobile_no='9876543210',
+            department='Computer'
+        )
+        LibraryLog.objects.create(student=self.student)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.artifact_dir.cleanup()
+
+    def start_job(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/reports/jobs/entry_exit/start/', data)
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def test_job_runs_and_downloads(self):
+        job = self.start_job(format='csv', department='Computer')
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual(status['status'], 'Done')
+        response = self.client.get(status['download_url'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertIn('230180107001,Pavan Kumar,Computer', content)
+
+    def test_identical_request_reuses_artifact(self):
+        first = self.start_job(format='csv')
+        second = self.start_job(format='csv')
+        self.assertEqual(first['id'], second['id'])
+
+    def test_new_writes_make_artifact_stale(self):
+        first = self.start_job(format='csv')
+        LibraryLog.objects.create(student=self.student, exit_time=timezone.now())
+        second = self.start_job(format='csv')
+        self.assertNotEqual(first['id'], second['id'])
+
+    def test_stale_unfinished_job_is_not_reused(self):
+        from .models import ReportJob
+        first = self.start_job(format='csv')
+        ReportJob.objects.filter(pk=first['id']).update(
+            status='Running', created_at=timezone.now() - timedelta(hours=1)
+        )
+        with self.settings(REPORT_JOB_MAX_AGE=2 * 60 * 60):
+            second = self.start_job(format='csv')
+        self.assertNotEqual(first['id'], second['id'])
+        self.assertEqual(ReportJob.objects.get(pk=first['id']).status, 'Failed')
+        self.assertEqual(self.client.get(second['status_url']).json()['status'], 'Done')
+
+    def test_broken_worker_pool_is_replaced(self):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+        from unittest.mock import patch
+        from . import report_jobs
+        from .models import ReportJob
+
+        class DeadPool:
+            """A pool whose worker died: submit() raises, or the job's future fails."""
+            def __init__(self, broken_on_submit):
+                self.broken_on_submit, self.shut_down = broken_on_submit, False
+
+            def submit(self, fn, *args):
+                if self.broken_on_submit:
+                    raise BrokenProcessPool('A child process terminated abruptly')
+                future = Future()
+                future.set_exception(BrokenProcessPool('A child process terminated abruptly'))
+                return future
+
+            def shutdown(self, wait=True):
+                self.shut_down = True
+
+        broken, dying = DeadPool(True), DeadPool(False)
+        job = ReportJob.objects.create(report_type='entry_exit', file_format='csv', params={},
+                                       params_key='k', data_version='v')
+        with self.settings(REPORT_JOB_WORKERS=2), patch.object(report_jobs, '_executor', broken), \
+                patch.object(report_jobs, '_get_executor', side_effect=[broken, dying]):
+            report_jobs.submit_job(job.pk)
+            # The broken pool was dropped, the job went to a new one, whose worker died in turn
+            self.assertTrue(broken.shut_down and dying.shut_down)
+            self.assertIsNone(report_jobs._executor)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Failed')
+
+    def test_unknown_report(self):
+        response = self.client.post('/admin/reports/jobs/nope/start/')
+        self.assertEqual(response.status_code, 404)
+
+
+class ReportFormattingTest(TestCase):
+    """The vectorised report builders must match the old per-row formatting exactly."""
+
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        self.students = [
+            Student.objects.create(
+                enrollment_id=f'23018010700{i}', name=f'Student {i}', email=f's{i}@college.edu',
+                mobile_no='9876543210', department='Computer'
+            )
+            for i in range(3)
+        ]
+        self.books = [
+            Book.objects.create(access_code='BK-1', title='Clean Code', author='Robert Martin', shelf_location='A-1'),
+            Book.objects.create(access_code='BK-2', title='SICP', author=None, shelf_location='B-2'),
+            Book.objects.create(access_code='BK-3', title='TAOCP', author='Donald Knuth', shelf_location='C-3'),
+        ]
+        base = datetime(2024, 1, 10, 23, 59, 58, 999999, tzinfo=dt_timezone.utc)
+        durations = [None, timedelta(seconds=0), timedelta(seconds=59, microseconds=999999),
+                     timedelta(hours=3, minutes=7, seconds=5), timedelta(days=1, hours=2)]
+        for i, duration in enumerate(durations):
+            log = LibraryLog.objects.create(
+                student=self.students[i % 3], exit_time=timezone.now() if duration is not None else None
+            )
+            entry = base + timedelta(hours=i)
+            LibraryLog.objects.filter(pk=log.pk).update(
+                entry_time=entry, exit_time=entry + duration if duration is not None else None
+            )
+        now = timezone.now()
+        for i, (due_offset, returned) in enumerate([
+            (timedelta(days=-3, hours=-2), False), (timedelta(hours=-1), False),
+            (timedelta(days=5), False), (timedelta(days=-10), True),
+        ]):
+            tx = Transaction.objects.create(
+                student=self.students[i % 3], book=self.books[i % 3],
+                due_date=now + due_offset, returned=returned
+            )
+            Transaction.objects.filter(pk=tx.pk).update(issue_date=now - timedelta(days=20, microseconds=i))
+
+    def legacy_entry_exit(self, queryset):
+        for log in queryset:
+            if log.exit_time:
+                duration = log.exit_time - log.entry_time
+                hours, remainder = divmod(int(duration.total_seconds()), 3600)
+                minutes, seconds = divmod(remainder, 60)
+                duration_str = f'{hours}h {minutes}m {seconds}s'
+            else:
+                duration_str = 'Still Inside'
+            yield [
+                log.student.enrollment_id, log.student.name, log.student.department, log.student.mobile_no,
+                log.entry_time.strftime('%Y-%m-%d %H:%M:%S'),
+                log.exit_time.strftime('%Y-%m-%d %H:%M:%S') if log.exit_time else 'Still Inside',
+                duration_str,
+            ]
+
+    def test_entry_exit_rows_match(self):
+        from . import reports
+        queryset = reports.entry_exit_queryset()
+        self.assertEqual(
+            [list(row) for row in reports.entry_exit_rows(queryset)],
+            list(self.legacy_entry_exit(queryset)),
+        )
+
+    def test_book_issues_rows_match(self):
+        from unittest import mock
+        from . import reports
+        now = timezone.now()
+        expected = []
+        for tx in reports.book_issues_queryset():
+            if tx.returned:
+                book_status = 'Returned'
+            elif now > tx.due_date:
+                book_status = f'OVERDUE ({(now - tx.due_date).days} days)'
+            else:
+                book_status = 'Pending'
+            expected.append([
+                tx.student.enrollment_id, tx.student.name, tx.student.department,
+                tx.book.access_code, tx.book.title, tx.book.author or '', tx.book.shelf_location,
+                tx.issue_date.strftime('%Y-%m-%d'), tx.due_date.strftime('%Y-%m-%d'), book_status,
+            ])
+        with mock.patch('management.reports.timezone.now', return_value=now):
+            rows = [list(row) for row in reports.book_issues_rows(reports.book_issues_queryset())]
+        self.assertEqual(rows, expected)
+        self.assertIn('OVERDUE (3 days)', [row[-1] for row in rows])
+
+    def test_overdue_rows_match(self):
+        from unittest import mock
+        from . import reports
+        now = timezone.now()
+        with mock.patch('management.reports.timezone.now', return_value=now):
+            queryset = reports.overdue_queryset()
+            expected = [
+                [tx.student.enrollment_id, tx.student.name, tx.student.department, tx.student.mobile_no,
+                 tx.book.title, tx.book.author or '', tx.book.access_code,
+                 tx.due_date.strftime('%Y-%m-%d'), (now - tx.due_date).days]
+                for tx in queryset
+            ]
+            rows = [list(row) for row in reports.overdue_rows(queryset)]
+        self.assertEqual(rows, expected)
+        self.assertEqual([row[-1] for row in rows], [3, 0])
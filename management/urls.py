@@ -4,8 +4,10 @@ from . import views
 urlpatterns = [
     path('kiosk/', views.kiosk, name='kiosk'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/feed/', views.dashboard_feed, name='dashboard_feed'),
     path('renew/', views.renew_request, name='renew_request'),
     path('issue-book/', views.issue_book_manual, name='issue_book_manual'),
+    path('issue-book/bulk/', views.bulk_circulation, name='bulk_circulation'),
     path('admin-manual-reminder/', views.admin_manual_reminder, name='admin_manual_reminder'),
     path('search/', views.book_search, name='book_search'),
 ]
@@ -1,11 +1,21 @@
 import logging
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.http import require_http_methods, require_GET
-from django.db.models import Q
+from django.db.models import Count, Q
 from .models import Student, LibraryLog, Book
-from django.utils import timezone
+from .occupancy import occupancy_index
+from .kiosk import is_valid_barcode
+from .visit_counters import visit_totals
+from .live_feed import occupancy_feed, FeedStream
+from .search_index import search_books
+from .fuzzy_search import correct_query
+from .search_cache import cached_search
+from .circulation import issue_book, issue_books, return_books, BookUnavailable, MAX_BULK_BOOKS
+from .pagination import keyset_page
 
 logger = logging.getLogger('management')
 
@@ -21,24 +31,17 @@ def kiosk(request):
             return redirect('kiosk')
         
         # Sanitize: only allow alphanumeric, hyphens, underscores
-        if not barcode.replace('-', '').replace('_', '').isalnum():
+        if not is_valid_barcode(barcode):
             messages.error(request, "⚠️ Format Error: Invalid barcode format. Only alphanumeric characters allowed.")
             return redirect('kiosk')
 
         try:
-            student = Student.objects.get(enrollment_id=barcode)
-            log = LibraryLog.objects.filter(
-                student=student,
-                exit_time__isnull=True
-            ).last()
-
-            if log:
-                log.exit_time = timezone.now()
-                log.save(update_fields=['exit_time'])
+            student = Student.objects.only('enrollment_id', 'name', 'department').get(enrollment_id=barcode)
+
+            if occupancy_index.toggle(student) == 'out':
                 messages.success(request, f" Goodbye, {student.name}! See you next time.")
                 logger.info("Student %s checked OUT", student.enrollment_id)
             else:
-                LibraryLog.objects.create(student=student)
                 messages.success(request, f"Welcome, {student.name}! Access Granted.")
                 logger.info("Student %s checked IN", student.enrollment_id)
                 
@@ -54,25 +57,42 @@ def kiosk(request):
 @require_GET
 def dashboard(request):
     """Public dashboard showing who is currently in the library."""
+    # Taken before the logs are read, so the feed replays anything newer
+    feed_last_event_id = occupancy_feed.last_event_id()
     live_logs = (
         LibraryLog.objects
         .filter(exit_time__isnull=True)
         .select_related('student')
         .order_by('-entry_time')
     )
-    total_visits = LibraryLog.objects.count()
-    
-    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_visits = LibraryLog.objects.filter(entry_time__gte=today_start).count()
-    
+    total_visits, today_visits = visit_totals()
+
     context = {
         'live_logs': live_logs,
         'total_visits': total_visits,
         'today_visits': today_visits,
+        'feed_last_event_id': feed_last_event_id,
     }
     return render(request, 'management/dashboard.html', context)
 
 
+@require_GET
+def dashboard_feed(request):
+    """Server-Sent Events stream of check-ins/check-outs for the dashboard."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id', '')
+    if not occupancy_feed.open_stream():
+        # Every stream slot is taken; the page falls back to reloading
+        return HttpResponse("Too many live dashboards.", status=503, headers={'Retry-After': '60'})
+
+    response = StreamingHttpResponse(
+        FeedStream(occupancy_feed, last_event_id, settings.LIVE_FEED_STREAM_SECONDS),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 from .models import Transaction, RenewRequest
 
 @require_http_methods(["GET", "POST"])
@@ -142,18 +162,18 @@ def issue_book_manual(request):
             return render(request, "management/issue_book.html", {"enrollment_id": enrollment_id, "access_code": access_code})
             
         try:
-            book = Book.objects.get(access_code=access_code)
+            # Availability is on the book row itself (kept by circulation.py)
+            book = Book.objects.select_related('current_holder').get(access_code=access_code)
         except Book.DoesNotExist:
             messages.error(request, f"Book with Accession Code '{access_code}' not found.")
             return render(request, "management/issue_book.html", {"enrollment_id": enrollment_id, "access_code": access_code})
 
         # ── CASE 1: This exact student already holds this exact book ────────
         # → Suggest renewal instead of issuing again
-        own_active_issue = Transaction.objects.filter(
-            student=student, book=book, returned=False
-        ).select_related('student', 'book').first()
-
-        if own_active_issue:
+        if book.status == 'Issued' and book.current_holder_id == student.pk:
+            own_active_issue = Transaction.objects.filter(
+                student=student, book=book, returned=False
+            ).select_related('student', 'book').first()
             return render(request, "management/issue_book.html", {
                 "enrollment_id": enrollment_id,
                 "access_code": access_code,
@@ -161,13 +181,13 @@ def issue_book_manual(request):
             })
 
         # ── CASE 2: Book is issued to a DIFFERENT student ────────────────────
-        other_active_issue = Transaction.objects.filter(book=book, returned=False).first()
-        if other_active_issue:
+        if book.status == 'Issued':
+            holder = book.current_holder
             messages.error(
                 request,
                 f"This book is currently issued to "
-                f"{other_active_issue.student.name} "
-                f"(Enrollment: {other_active_issue.student.enrollment_id}). "
+                f"{holder.name if holder else 'another student'} "
+                f"(Enrollment: {holder.enrollment_id if holder else '-'}). "
                 f"It must be returned before it can be issued again."
             )
             return render(request, "management/issue_book.html", {
@@ -176,7 +196,15 @@ def issue_book_manual(request):
             })
             
         # ── CASE 3: Book is free — issue it ─────────────────────────────────
-        Transaction.objects.create(student=student, book=book)
+        try:
+            issue_book(student, book)
+        except BookUnavailable:
+            # Another desk issued the same book between our check and insert
+            messages.error(request, "This book was just issued at another desk. Please check again.")
+            return render(request, "management/issue_book.html", {
+                "enrollment_id": enrollment_id,
+                "access_code": access_code,
+            })
         messages.success(request, f"Book '{book.title}' successfully issued to {student.name}.")
         return redirect('issue_book_manual')
 
@@ -184,9 +212,61 @@ def issue_book_manual(request):
 
 
 
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.conf import settings
+def split_access_codes(text):
+    """Access codes typed or scanned into one box, one per line or separated by commas or spaces."""
+    return [code for code in text.replace(',', ' ').split() if code]
+
+
+@staff_member_required(login_url='/admin/login/')
+@require_http_methods(["GET", "POST"])
+def bulk_circulation(request):
+    """Issue or return several books for one student in one go."""
+    if request.method != "POST":
+        return render(request, "management/bulk_circulation.html", {"max_books": MAX_BULK_BOOKS})
+
+    enrollment_id = request.POST.get("enrollment_id", "").strip()
+    action = request.POST.get("action", "issue")
+    access_codes = split_access_codes(request.POST.get("access_codes", ""))
+    context = {
+        "enrollment_id": enrollment_id,
+        "access_codes": "\n".join(access_codes),
+        "action": action,
+        "max_books": MAX_BULK_BOOKS,
+    }
+
+    if not enrollment_id or not access_codes or action not in ("issue", "return"):
+        messages.error(request, "Please provide the Enrollment No. and at least one Book Accession Code.")
+        return render(request, "management/bulk_circulation.html", context)
+    if len(access_codes) > MAX_BULK_BOOKS:
+        messages.error(request, f"At most {MAX_BULK_BOOKS} books at a time.")
+        return render(request, "management/bulk_circulation.html", context)
+    try:
+        student = Student.objects.get(enrollment_id=enrollment_id)
+    except Student.DoesNotExist:
+        messages.error(request, f"Student with Enrollment No. '{enrollment_id}' not found.")
+        return render(request, "management/bulk_circulation.html", context)
+
+    try:
+        if action == "issue":
+            results = issue_books(student, access_codes)
+        else:
+            results = return_books(student, access_codes)
+    except BookUnavailable:
+        messages.error(request, "One of these books was just issued at another desk. Nothing was issued; please try again.")
+        return render(request, "management/bulk_circulation.html", context)
+
+    done = sum(result["result"] in ("issued", "returned") for result in results)
+    if done:
+        verb = "issued to" if action == "issue" else "returned by"
+        messages.success(request, f"{done} book(s) {verb} {student.name}.")
+    context.update({"student": student, "results": results})
+    if done == len(results):
+        # Everything went through; leave the form empty for the next student
+        context.update({"enrollment_id": "", "access_codes": ""})
+    return render(request, "management/bulk_circulation.html", context)
+
+
+from .reminders import reminder_email, send_emails
 
 @staff_member_required(login_url='/admin/login/')
 @require_http_methods(["GET", "POST"])
@@ -211,39 +291,12 @@ def admin_manual_reminder(request):
             messages.error(request, f"Student with Enrollment No. '{enrollment_id}' not found.")
             return render(request, "admin/manual_reminder.html", context)
 
-        active_txs = Transaction.objects.filter(student=student, returned=False).select_related('book')
+        active_txs = Transaction.objects.filter(student=student, returned=False).select_related('student', 'book')
         if not active_txs.exists():
             messages.warning(request, f"{student.name} has no pending books to return.")
             return render(request, "admin/manual_reminder.html", context)
 
-        sent_count = 0
-        for tx in active_txs:
-            # Build template context
-            email_context = {
-                'student_name': tx.student.name,
-                'enrollment_id': tx.student.enrollment_id,
-                'book_title': tx.book.title,
-                'access_code': tx.book.access_code,
-                'shelf_location': tx.book.shelf_location,
-                'issue_date': tx.issue_date.strftime('%d %b, %Y'),
-                'due_date': tx.due_date.strftime('%d %b, %Y'),
-            }
-            subject = f"📚 Library Reminder: Return '{tx.book.title}'"
-            text_body = render_to_string('management/email/reminder.txt', email_context)
-            html_body = render_to_string('management/email/reminder.html', email_context)
-
-            try:
-                email = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_body,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[tx.student.email],
-                )
-                email.attach_alternative(html_body, 'text/html')
-                email.send(fail_silently=False)
-                sent_count += 1
-            except Exception as e:
-                logger.error("Failed to send manual email to %s: %s", tx.student.email, e)
+        sent_count, _ = send_emails(reminder_email(tx) for tx in active_txs)
 
         if sent_count > 0:
             messages.success(request, f"Successfully sent {sent_count} reminder(s) to {student.name} ({student.email}).")
@@ -255,22 +308,51 @@ def admin_manual_reminder(request):
     return render(request, 'admin/manual_reminder.html', context)
 
 
+def _run_book_search(query, after, before):
+    """One results page plus counts for `query` (see search_cache.cached_search)."""
+    books = Book.objects.all()
+    corrected_query = None
+    if query:
+        books = search_books(query)
+        if not books.exists():
+            # Nothing found: try again with misspelt words corrected
+            corrected_query = correct_query(query)
+            if corrected_query:
+                books = search_books(corrected_query)
+
+    # Ranked full-text results page by rank, everything else alphabetically
+    keys = ('search_rank', 'access_code') if 'search_rank' in books.query.annotations else ('title', 'access_code')
+    page = keyset_page(books, keys, settings.BOOK_SEARCH_PAGE_SIZE, after=after, before=before)
+
+    counts = books.aggregate(
+        total=Count('pk'),
+        available=Count('pk', filter=Q(status='Available')),
+    )
+    return {
+        'page': page,
+        'corrected_query': corrected_query,
+        'total_books': counts['total'],
+        'available_books': counts['available'],
+    }
+
+
+def _count_available(query, results):
+    """Available books among a cached search's matches (see search_cache.cached_search)."""
+    books = search_books(results['corrected_query'] or query) if query else Book.objects.all()
+    return books.filter(status='Available').count()
+
+
 @require_GET
 def book_search(request):
-    """Public search page for books by ISBN or Title."""
+    """Public search page for books by title, author or ISBN, best matches first."""
     query = request.GET.get('q', '').strip()
-    
-    books = Book.objects.all()
-    if query:
-        books = books.filter(Q(title__icontains=query) | Q(isbn_no__icontains=query))
-        
-    total_books = books.count()
-    available_books = books.filter(status='Available').count()
-    
+    results = cached_search(
+        query, request.GET.get('after'), request.GET.get('before'), _run_book_search, _count_available
+    )
+
     context = {
         'query': query,
-        'books': books,
-        'total_books': total_books,
-        'available_books': available_books,
+        'books': results['page'].object_list,
+        **results,
     }
     return render(request, 'management/search.html', context)
@@ -0,0 +1,71 @@
+"""
+Visit counters for the public dashboard.
+
+Every new LibraryLog adds one visit to the VisitCounter row of its local
+entry date and the student's department (see signals.py). The dashboard
+then sums a handful of counter rows instead of counting the whole log
+history on every refresh.
+
+Counters only move forward: logs deleted or re-dated in the admin are
+picked up by `manage.py reconcile_visit_counters`, which rebuilds the table
+from the logs.
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import LibraryLog, VisitCounter
+
+# Visits before today only change on reconcile, so their sum is cached
+HISTORY_CACHE_TTL = 5 * 60
+
+
+def record_visit(department, day):
+    """Add one visit to the (day, department) counter."""
+    department = department or ''
+    counters = VisitCounter.objects.filter(day=day, department=department)
+    if counters.update(visits=F('visits') + 1):
+        return
+    try:
+        with transaction.atomic():
+            VisitCounter.objects.create(day=day, department=department, visits=1)
+    except IntegrityError:
+        # Another scan created the row first
+        counters.update(visits=F('visits') + 1)
+
+
+def visit_totals():
+    """Return (total_visits, today_visits) from the counters."""
+    today = timezone.localdate()
+    today_visits = (
+        VisitCounter.objects.filter(day=today).aggregate(total=Sum('visits'))['total'] or 0
+    )
+    history_key = f'visit-history:{today.isoformat()}'
+    history = cache.get(history_key)
+    if history is None:
+        history = (
+            VisitCounter.objects.filter(day__lt=today).aggregate(total=Sum('visits'))['total'] or 0
+        )
+        cache.set(history_key, history, timeout=HISTORY_CACHE_TTL)
+    return history + today_visits, today_visits
+
+
+def rebuild_counters():
+    """Recount every (day, department) bucket from the logs. Returns the number of rows."""
+    buckets = (
+        LibraryLog.objects
+        .annotate(day=TruncDate('entry_time'))
+        .values('day', 'student__department')
+        .annotate(visits=Count('pk'))
+        .order_by()
+    )
+    counters = [
+        VisitCounter(day=row['day'], department=row['student__department'] or '', visits=row['visits'])
+        for row in buckets
+    ]
+    with transaction.atomic():
+        VisitCounter.objects.all().delete()
+        VisitCounter.objects.bulk_create(counters, batch_size=1000)
+    cache.delete(f'visit-history:{timezone.localdate().isoformat()}')
+    return len(counters)
@@ -11,6 +11,19 @@ if __name__ == '__main__':
     print("Starting server on port 800.")
     
     try:
+        # Load who is currently inside so the first kiosk scans don't have to
+        from management.occupancy import occupancy_index
+        occupancy_index.reload()
+        # Build the search indexes now rather than on the first keystroke
+        from management.suggest_index import suggest_index
+        suggest_index.reload()
+        from management.fuzzy_search import fuzzy_index
+        fuzzy_index.reload()
+        # Scheduled jobs (occupancy rollup, renewal auto-approval, purges).
+        # apps.py only starts them under runserver, where RUN_MAIN is set.
+        from management import scheduler
+        scheduler.start()
+
         # host='0.0.0.0' makes it accessible to the local network
         # port=800 is the standard web port (no need to type :8000)
         serve(application, host='0.0.0.0', port=800, threads=8)